@@ -1,14 +1,54 @@
-﻿from flask import Flask, jsonify, render_template, send_from_directory, request, redirect, url_for
+﻿from flask import Flask, jsonify, render_template, send_from_directory, request, redirect, url_for, make_response, has_request_context, g
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+import atexit
 import re
 import json
 import os
+import functools
+import hashlib
+import heapq
+import secrets
+import threading
+import time
+import numpy as np
 import requests
 from requests.exceptions import RequestException
 from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+import cache
+import cube
+import dismissals
+import form
+import ingest_log
+import intervals
+import limits
+import metrics
+import records
+import rules
+import schema
+import selection
+import similarity
+import simulate
+import stats
+import store
 
-# Initialize Flask app
-app = Flask(__name__, static_folder='static', template_folder='templates')
-DATA_DIR = 'data'
+# Initialize Flask app. Static files are served by send_static below (not
+# Flask's built-in handler) so fingerprinted assets can get immutable headers.
+app = Flask(__name__, static_folder=None, template_folder='templates')
+
+class RecordJSONProvider(DefaultJSONProvider):
+    # compact records (records.py) serialise like the dicts they replace
+    @staticmethod
+    def default(o):
+        if isinstance(o, records.Record):
+            return dict(o)
+        return DefaultJSONProvider.default(o)
+
+app.json = RecordJSONProvider(app)
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 
 def load_json(fname):
     with open(os.path.join(DATA_DIR, fname), 'r', encoding='utf-8') as f:
@@ -23,59 +63,71 @@ def search_data(query):
     
     import difflib
     query_norm = re.sub(r'[^a-z0-9]', '', query.lower())
+    if db_pool is not None:
+        # full-text search over names; fuzzy matching below only runs when
+        # no token matched, e.g. a misspelt name
+        for p in store.search_players(db_pool, query):
+            results['players'].append(p)
+            results['teams'].add(p.get('team', ''))
+        candidates = [] if results['players'] else store.player_infos(db_pool)
+        team_names = store.teams(db_pool)
+    else:
+        candidates = player_info_json
+        team_names = list(set([p.get('team', '') for p in player_info_json]))
     # Prepare lists for fuzzy matching
-    player_names = [p.get('name', '') for p in player_info_json]
+    player_names = [p.get('name', '') for p in candidates]
     player_names_norm = [re.sub(r'[^a-z0-9]', '', n.lower()) for n in player_names]
-    team_names = list(set([p.get('team', '') for p in player_info_json]))
     team_names_norm = [re.sub(r'[^a-z0-9]', '', t.lower()) for t in team_names]
     # Fuzzy match players
     close_players = difflib.get_close_matches(query_norm, player_names_norm, n=5, cutoff=0.6)
     for idx, norm_name in enumerate(player_names_norm):
         if norm_name in close_players:
-            results['players'].append(player_info_json[idx])
-            results['teams'].add(player_info_json[idx].get('team', ''))
+            results['players'].append(candidates[idx])
+            results['teams'].add(candidates[idx].get('team', ''))
     # Fuzzy match teams
     close_teams = difflib.get_close_matches(query_norm, team_names_norm, n=3, cutoff=0.6)
     for idx, norm_team in enumerate(team_names_norm):
         if norm_team in close_teams:
             results['teams'].add(team_names[idx])
+    if db_pool is not None and not results['players'] and not results['teams']:
+        # nothing by name: look for the words in the biographies
+        for p in store.search_players(db_pool, query, names_only=False):
+            results['players'].append(p)
+            results['teams'].add(p.get('team', ''))
     # Fuzzy match categories
-    categories = ['power', 'anchor', 'finisher', 'allrounder', 'fast']
+    categories = list(CATEGORY_RULES)
     close_categories = difflib.get_close_matches(query_norm, categories, n=3, cutoff=0.6)
     for cat in close_categories:
         results['categories'].append(cat)
     return results
 
-def aggregate_batting(batting_json):
-    # batting_json structure: list of { "battingSummary": [ ... ] }
-    agg = defaultdict(lambda: {'runs':0, 'balls':0, '4s':0, '6s':0, 'innings':0, 'positions':[], 'name':None, 'team':None})
-    for block in batting_json:
-        for r in block.get('battingSummary', []):
-            name = r.get('batsmanName','').strip()
-            if not name: 
-                continue
-            # convert values; handle '-' for SR etc
-            runs = int(r.get('runs','0')) if r.get('runs','0').isdigit() else 0
-            balls = int(r.get('balls','0')) if str(r.get('balls','0')).isdigit() else 0
-            _4s = int(r.get('4s','0')) if str(r.get('4s','0')).isdigit() else 0
-            _6s = int(r.get('6s','0')) if str(r.get('6s','0')).isdigit() else 0
-            pos = r.get('battingPos', None)
-            teamInnings = r.get('teamInnings','')
-            agg[name]['name'] = name
-            agg[name]['team'] = teamInnings or agg[name].get('team')
-            agg[name]['runs'] += runs
-            agg[name]['balls'] += balls
-            agg[name]['4s'] += _4s
-            agg[name]['6s'] += _6s
-            if balls > 0 or runs>0:
-                agg[name]['innings'] += 1
-            if pos is not None:
-                try:
-                    agg[name]['positions'].append(int(pos))
-                except:
-                    pass
-    # compute derived
-    for p,d in agg.items():
+# Aggregates are built row by row so one pass over the scorecards can feed
+# batting, bowling, dismissals and fielding together (see ingest_scorecards).
+def new_batting_agg():
+    return defaultdict(lambda: {'runs':0, 'balls':0, '4s':0, '6s':0, 'innings':0, 'positions':[], 'name':None, 'team':None})
+
+def add_batting_row(agg, t):
+    # t: a row parsed by schema.parse_batting
+    name = t['name']
+    if not name:
+        return
+    runs = t['runs']
+    balls = t['balls']
+    agg[name]['name'] = name
+    agg[name]['team'] = t['team'] or agg[name].get('team')
+    agg[name]['runs'] += runs
+    agg[name]['balls'] += balls
+    agg[name]['4s'] += t['4s']
+    agg[name]['6s'] += t['6s']
+    if balls > 0 or runs>0:
+        agg[name]['innings'] += 1
+    if t['position'] is not None:
+        agg[name]['positions'].append(t['position'])
+    return {'name': name, 'runs': runs, 'balls': balls, 'outs': int(bool(t['dismissal'].strip()))}
+
+def finish_batting(agg, names=None):
+    # compute derived (for `names` only after an incremental ingest)
+    for d in (agg.values() if names is None else [agg[n] for n in names if n in agg]):
         d['strike_rate'] = round((d['runs']/d['balls']*100) if d['balls']>0 else 0,2)
         d['bat_avg'] = round((d['runs']/d['innings']) if d['innings']>0 else 0,2)
         # boundary %
@@ -85,38 +137,44 @@ def aggregate_batting(batting_json):
         d['batting_position'] = min(d['positions']) if d['positions'] else None
     return agg
 
-def aggregate_bowling(bowling_json):
-    agg = defaultdict(lambda: {'runs_conceded':0, 'wickets':0, 'balls':0, 'maiden':0, 'overs':0.0, 'dot_balls':0, 'name':None, 'team':None})
-    def overs_to_balls(overs_str):
-        try:
-            if '.' in overs_str:
-                o,s = overs_str.split('.')
-                return int(o)*6 + int(s)
-            return int(float(overs_str))*6
-        except:
-            return 0
-    for block in bowling_json:
-        for r in block.get('bowlingSummary', []):
-            name = r.get('bowlerName','').strip()
-            if not name:
-                continue
-            runs = int(r.get('runs','0')) if str(r.get('runs','0')).isdigit() else 0
-            wickets = int(r.get('wickets','0')) if str(r.get('wickets','0')).isdigit() else 0
-            overs_str = r.get('overs','0')
-            balls = overs_to_balls(overs_str)
-            maiden = int(r.get('maiden','0')) if str(r.get('maiden','0')).isdigit() else 0
-            zeros = int(r.get('0s','0')) if str(r.get('0s','0')).isdigit() else 0
-            team = r.get('bowlingTeam','')
-            agg[name]['name'] = name
-            agg[name]['team'] = team or agg[name].get('team')
-            agg[name]['runs_conceded'] += runs
-            agg[name]['wickets'] += wickets
-            agg[name]['balls'] += balls
-            agg[name]['maiden'] += maiden
-            agg[name]['dot_balls'] += zeros
-            if balls > 0:
-                agg[name]['innings'] = agg[name].get('innings', 0) + 1
-    for p,d in agg.items():
+def aggregate_batting(batting_json):
+    # batting_json structure: list of { "battingSummary": [ ... ] }
+    agg = new_batting_agg()
+    errors = []
+    for b, block in enumerate(batting_json):
+        for t in schema.parse_batting(block.get('battingSummary', []), errors, {'block': b}):
+            add_batting_row(agg, t)
+    return finish_batting(agg)
+
+def balls_to_overs(balls):
+    # 118 -> "19.4", 120 -> "20"
+    return f"{balls // 6}.{balls % 6}" if balls % 6 else str(balls // 6)
+
+def new_bowling_agg():
+    return defaultdict(lambda: {'runs_conceded':0, 'wickets':0, 'balls':0, 'maiden':0, 'overs':0.0, 'dot_balls':0, 'name':None, 'team':None})
+
+def add_bowling_row(agg, t):
+    # t: a row parsed by schema.parse_bowling
+    name = t['name']
+    if not name:
+        return
+    runs = t['runs']
+    wickets = t['wickets']
+    balls = t['balls']
+    agg[name]['name'] = name
+    agg[name]['team'] = t['team'] or agg[name].get('team')
+    agg[name]['runs_conceded'] += runs
+    agg[name]['wickets'] += wickets
+    agg[name]['balls'] += balls
+    agg[name]['maiden'] += t['maiden']
+    agg[name]['dot_balls'] += t['dot_balls']
+    if balls > 0:
+        agg[name]['innings'] = agg[name].get('innings', 0) + 1
+    agg[name]['max_spell_balls'] = max(agg[name].get('max_spell_balls', 0), balls)
+    return {'name': name, 'balls': balls, 'runs': runs, 'wickets': wickets}
+
+def finish_bowling(agg, names=None):
+    for d in (agg.values() if names is None else [agg[n] for n in names if n in agg]):
         d['overs'] = round(d['balls']/6,2) if d['balls']>0 else 0
         d['economy'] = round((d['runs_conceded']/d['overs']) if d['overs']>0 else 0,2)
         d['bowling_sr'] = round((d['balls']/d['wickets']) if d['wickets']>0 else 999.0,2)
@@ -124,27 +182,321 @@ def aggregate_bowling(bowling_json):
         d['dot_pct'] = round((d['dot_balls']/d['balls']*100) if d['balls']>0 else 0,2)
     return agg
 
-def merge_player_info(player_info_json, batting_agg, bowling_agg):
-    players = {}
-    for p in player_info_json:
-        name = p.get('name','').strip()
-        players[name] = {
-            'name': name,
-            'team': p.get('team',''),
-            'battingStyle': p.get('battingStyle',''),
-            'bowlingStyle': p.get('bowlingStyle',''),
-            'playingRole': p.get('playingRole',''),
-            'description': p.get('description',''),
-            'runs': 0, 'balls':0, '4s':0, '6s':0, 'innings':0,
-            'strike_rate':0, 'bat_avg':0, 'boundary_pct':0, 'avg_ball_faced':0, 'batting_position': None,
-            'runs_conceded':0, 'wickets':0, 'economy':None, 'bowling_sr':None, 'bowling_avg':None, 'dot_pct':None
-        }
-    for name, d in batting_agg.items():
-        if name not in players:
-            players[name] = {'name':name, 'team':d.get('team',''), 'battingStyle':'', 'bowlingStyle':'', 'playingRole':'', 'description':'',
-                             'runs':0,'balls':0,'4s':0,'6s':0,'innings':0,'strike_rate':0,'bat_avg':0,'boundary_pct':0,'avg_ball_faced':0,'batting_position':None,
-                             'runs_conceded':0,'wickets':0,'economy':None,'bowling_sr':None,'bowling_avg':None,'dot_pct':None}
-        players[name].update({
+def aggregate_bowling(bowling_json):
+    agg = new_bowling_agg()
+    errors = []
+    for b, block in enumerate(bowling_json):
+        for t in schema.parse_bowling(block.get('bowlingSummary', []), errors, {'block': b}):
+            add_bowling_row(agg, t)
+    return finish_bowling(agg)
+
+FIELDING_STATS = ['fielding_dismissals', 'catches', 'stumpings', 'run_outs']
+
+def new_fielding_agg():
+    return defaultdict(lambda: {'catches':0, 'stumpings':0, 'run_outs':0, 'fielding_dismissals':0})
+
+def add_fielding_record(agg, record):
+    # record: a parsed dismissal from dismissals.finish_match. Every resolved
+    # fielder named in a run out gets the run out.
+    for f in record['fielders']:
+        name = f.get('player')
+        if not name:
+            continue
+        if record['type'] in ('caught', 'caught_and_bowled'):
+            agg[name]['catches'] += 1
+        elif record['type'] == 'stumped':
+            agg[name]['stumpings'] += 1
+        elif record['type'] == 'run_out':
+            agg[name]['run_outs'] += 1
+        else:
+            continue
+        agg[name]['fielding_dismissals'] += 1
+
+# Match index: every entry of t20_wc_match_results.json joined with the
+# batting / bowling blocks at the same position, keyed by the scorecard
+# number ("T20I # 1823" -> "1823"), with secondary indexes for /api/matches.
+SCORECARD_RE = re.compile(r'#\s*(\S+)')
+
+def match_id_for(summary, position):
+    m = SCORECARD_RE.search(summary.get('scorecard', '') or '')
+    return m.group(1) if m else str(position + 1)
+
+def parse_match_date(text):
+    # "Oct 16, 2022" or "2022-10-16" -> "2022-10-16"
+    text = (text or '').strip()
+    for fmt in ('%b %d, %Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            pass
+    return None
+
+def innings_total(team, rows, spells):
+    # rows / spells: parsed rows. Runs come from the bowling card (off the
+    # bat + wides + no balls); the source has no byes / leg byes, so a total
+    # can be a run or two short.
+    balls = sum(s['balls'] for s in spells)
+    runs = sum(s['runs'] for s in spells)
+    batter_runs = sum(r['runs'] for r in rows)
+    return {
+        'team': team,
+        'runs': runs,
+        'wickets': sum(1 for r in rows if r['dismissal'].strip()),
+        'overs': balls_to_overs(balls),
+        'balls': balls,
+        'batter_runs': batter_runs,
+        'extras': max(runs - batter_runs, 0)
+    }
+
+def new_match_indexes():
+    return {'matches': {}, 'ids': [], 'by_team': defaultdict(list), 'by_ground': defaultdict(list), 'by_date': defaultdict(list)}
+
+def add_match(indexes, position, summary, batting_by_team, spells_by_team):
+    # batting_by_team: {team: parsed rows} in batting order; spells_by_team:
+    # {bowling team: parsed rows}. The entry keeps the source rows.
+    mid = match_id_for(summary, position)
+    teams = list(batting_by_team) + [t for t in (summary.get('team1',''), summary.get('team2','')) if t not in batting_by_team]
+    innings = []
+    for team in batting_by_team:
+        fielding = [t for t in teams if t != team]
+        spells = spells_by_team.get(fielding[0], []) if fielding else []
+        total = innings_total(team, batting_by_team[team], spells)
+        innings.append(dict(total, batting=[t['row'] for t in batting_by_team[team]], bowling=[t['row'] for t in spells]))
+    entry = {
+        'id': mid,
+        'team1': summary.get('team1',''),
+        'team2': summary.get('team2',''),
+        'winner': summary.get('winner',''),
+        'margin': summary.get('margin',''),
+        'ground': summary.get('ground',''),
+        'matchDate': summary.get('matchDate',''),
+        'date': parse_match_date(summary.get('matchDate')),
+        'scorecard': summary.get('scorecard',''),
+        'innings': innings
+    }
+    # compact form for listings: innings totals without the scorecard rows
+    entry['summary'] = dict({k: v for k, v in entry.items() if k != 'innings'},
+                            innings=[{k: v for k, v in i.items() if k not in ('batting', 'bowling')} for i in innings])
+    indexes['matches'][mid] = entry
+    indexes['ids'].append(mid)
+    for team in {entry['team1'], entry['team2']}:
+        indexes['by_team'][team.lower()].append(mid)
+    indexes['by_ground'][entry['ground'].lower()].append(mid)
+    indexes['by_date'][entry['date']].append(mid)
+    return entry
+
+# Team aggregates and the points table. Each ingested match adds its result
+# and innings totals to both sides; standings are re-sorted from the
+# aggregates (one row per team) rather than recomputed from the scorecards.
+POINTS_WIN = 2
+POINTS_NO_RESULT = 1
+INNINGS_BALLS = 120
+
+def new_team_aggs():
+    return {}
+
+def team_agg(aggs, team):
+    key = team.lower()
+    if key not in aggs:
+        aggs[key] = {'team': team, 'played': 0, 'won': 0, 'lost': 0, 'no_result': 0, 'points': 0,
+                     'runs_for': 0, 'balls_faced': 0, 'runs_against': 0, 'balls_bowled': 0,
+                     'wickets_lost': 0, 'wickets_taken': 0, 'batting_first': {'played': 0, 'won': 0},
+                     'chasing': {'played': 0, 'won': 0}, 'highest_total': None, 'lowest_total': None,
+                     'matches': [], 'nrr': None}
+    return aggs[key]
+
+def add_team_result(aggs, entry):
+    # NRR uses the innings of completed matches only, and a side bowled out
+    # is charged its full 20 overs.
+    sides = [t for t in (entry['team1'], entry['team2']) if t]
+    decided = entry['winner'] in sides
+    by_team = {i['team']: i for i in entry['innings']}
+    for team in sides:
+        t = team_agg(aggs, team)
+        t['played'] += 1
+        t['matches'].append(entry['id'])
+        if not decided:
+            t['no_result'] += 1
+            t['points'] += POINTS_NO_RESULT
+            continue
+        won = entry['winner'] == team
+        t['won' if won else 'lost'] += 1
+        t['points'] += POINTS_WIN if won else 0
+        first = entry['innings'] and entry['innings'][0]['team'] == team
+        side = t['batting_first' if first else 'chasing']
+        side['played'] += 1
+        side['won'] += int(won)
+        bat = by_team.get(team)
+        bowl = next((i for i in entry['innings'] if i['team'] != team), None)
+        if bat:
+            t['runs_for'] += bat['runs']
+            t['balls_faced'] += INNINGS_BALLS if bat['wickets'] >= 10 else bat['balls']
+            t['wickets_lost'] += bat['wickets']
+            total = {'runs': bat['runs'], 'wickets': bat['wickets'], 'match_id': entry['id']}
+            if t['highest_total'] is None or bat['runs'] > t['highest_total']['runs']:
+                t['highest_total'] = total
+            if t['lowest_total'] is None or bat['runs'] < t['lowest_total']['runs']:
+                t['lowest_total'] = total
+        if bowl:
+            t['runs_against'] += bowl['runs']
+            t['balls_bowled'] += INNINGS_BALLS if bowl['wickets'] >= 10 else bowl['balls']
+            t['wickets_taken'] += bowl['wickets']
+        if t['balls_faced'] and t['balls_bowled']:
+            t['nrr'] = round(t['runs_for'] * 6 / t['balls_faced'] - t['runs_against'] * 6 / t['balls_bowled'], 3)
+
+def build_standings(aggs):
+    table = sorted(aggs.values(), key=lambda t: (-t['points'], -(t['nrr'] if t['nrr'] is not None else -99), t['team']))
+    return [{'position': i, 'team': t['team'], 'played': t['played'], 'won': t['won'], 'lost': t['lost'],
+             'no_result': t['no_result'], 'points': t['points'], 'nrr': t['nrr']}
+            for i, t in enumerate(table, start=1)]
+
+# Venue group-bys: per ground, first / second innings totals, chasing record
+# and bowling split by pace / spin and by bowlingStyle; per player, batting and
+# bowling by ground. Filled row by row in ingest_block.
+def bowling_type(style):
+    # primary (first listed) style: "Right arm Medium, Legbreak" -> pace
+    primary = (style or '').split(',')[0].lower()
+    if 'fast' in primary or 'medium' in primary:
+        return 'pace'
+    if any(w in primary for w in ('break', 'orthodox', 'spin', 'googly')):
+        return 'spin'
+    return 'unknown'
+
+def new_bowling_split():
+    return {'balls': 0, 'runs': 0, 'wickets': 0}
+
+def venue_agg(venues, ground):
+    key = ground.lower()
+    if key not in venues:
+        venues[key] = {'ground': ground, 'matches': [], 'decided': 0,
+                       'first_innings': {'innings': 0, 'runs': 0}, 'second_innings': {'innings': 0, 'runs': 0},
+                       'chasing_won': 0, 'by_type': defaultdict(new_bowling_split), 'by_style': defaultdict(new_bowling_split)}
+    return venues[key]
+
+def add_venue_result(venues, entry):
+    # Innings averages and the chasing record only use decided matches
+    v = venue_agg(venues, entry['ground'])
+    v['matches'].append(entry['id'])
+    if entry['winner'] not in (entry['team1'], entry['team2']) or len(entry['innings']) < 2:
+        return
+    v['decided'] += 1
+    for i, key in ((0, 'first_innings'), (1, 'second_innings')):
+        v[key]['innings'] += 1
+        v[key]['runs'] += entry['innings'][i]['runs']
+    v['chasing_won'] += int(entry['winner'] == entry['innings'][1]['team'])
+
+def add_player_venue(player_venues, name, ground, discipline, values):
+    by_ground = player_venues.setdefault(name, {})
+    g = by_ground.setdefault(ground, {})
+    totals = g.setdefault(discipline, dict.fromkeys(values, 0))
+    for k in totals:
+        totals[k] += values[k]
+
+def new_ingest_state(bowling_styles=None):
+    return {
+        'batting': new_batting_agg(),
+        'bowling': new_bowling_agg(),
+        'fielding': new_fielding_agg(),
+        'dismissals': dismissals.new_index(),
+        'matches': new_match_indexes(),
+        'teams': new_team_aggs(),
+        'form': {},
+        'venues': {},
+        'player_venues': {},
+        'bowling_styles': bowling_styles or {},
+        'ids': records.new_ids(),
+        'errors': []
+    }
+
+def add_form(form_index, name, discipline, order_key, match_id, date, opponent, values):
+    series = form_index.setdefault(name, {})
+    if discipline not in series:
+        series[discipline] = form.new_series(form.BATTING_FIELDS if discipline == 'batting' else form.BOWLING_FIELDS)
+    form.add_entry(series[discipline], order_key, match_id, date, opponent, values)
+
+def ingest_block(state, position, summary, batting_rows, bowling_rows, alias_index):
+    # Feeds one match into every aggregate in a single pass over its rows.
+    # Returns the match entry and the names of the players it touched.
+    mid = match_id_for(summary, position)
+    # the rows are swapped for compact records in place, so batting_json /
+    # bowling_json keep the records rather than the parsed dicts
+    batting_rows[:] = [records.batting_row(r, state['ids'], mid) for r in batting_rows]
+    bowling_rows[:] = [records.bowling_row(r, state['ids'], mid) for r in bowling_rows]
+    records.assign_id(state['ids']['match'], mid)
+    date = parse_match_date(summary.get('matchDate')) or ''
+    match = dismissals.new_match(position, mid)
+    ground = summary.get('ground', '')
+    venue = venue_agg(state['venues'], ground)
+    batting_by_team = defaultdict(list)
+    spells_by_team = defaultdict(list)
+    touched = set()
+    for r in schema.parse_bowling(bowling_rows, state['errors'], {'block': position, 'match_id': mid}):
+        spell = add_bowling_row(state['bowling'], r)
+        if spell and spell['balls'] > 0:
+            add_form(state['form'], spell['name'], 'bowling', (date, position), mid, date,
+                     dismissals.other_team(r['match'], r['team']), spell)
+            add_player_venue(state['player_venues'], spell['name'], ground, 'bowling',
+                             {k: spell[k] for k in form.BOWLING_FIELDS})
+            style = state['bowling_styles'].get(spell['name'], '')
+            for split in (venue['by_type'][bowling_type(style)], venue['by_style'][style or 'unknown']):
+                for k in split:
+                    split[k] += spell[k]
+        dismissals.add_spell(match, r)
+        spells_by_team[r['team']].append(r)
+        touched.add(r['name'])
+    for r in schema.parse_batting(batting_rows, state['errors'], {'block': position, 'match_id': mid}):
+        innings = add_batting_row(state['batting'], r)
+        if innings and (innings['balls'] > 0 or innings['runs'] > 0 or innings['outs']):
+            add_form(state['form'], innings['name'], 'batting', (date, position), mid, date,
+                     dismissals.other_team(r['match'], r['team']), innings)
+            add_player_venue(state['player_venues'], innings['name'], ground, 'batting',
+                             dict({k: innings[k] for k in form.BATTING_FIELDS}, innings=1))
+        dismissals.add_batting_row(match, r)
+        batting_by_team[r['team']].append(r)
+        touched.add(r['name'])
+    for record in dismissals.finish_match(state['dismissals'], match, alias_index):
+        add_fielding_record(state['fielding'], record)
+        touched.update(f['player'] for f in record['fielders'] if f.get('player'))
+    entry = add_match(state['matches'], position, summary, batting_by_team, spells_by_team)
+    add_team_result(state['teams'], entry)
+    add_venue_result(state['venues'], entry)
+    touched.discard('')
+    return entry, touched
+
+def ingest_scorecards(batting_json, bowling_json, match_summaries, alias_index, bowling_styles=None):
+    # Startup ingest: every match goes through ingest_block once, so the
+    # batting, bowling, fielding, dismissal, match and team aggregates are
+    # all built from one pass over the rows. Blocks line up with
+    # match_summaries by position.
+    state = new_ingest_state(bowling_styles)
+    for position in range(max(len(batting_json), len(bowling_json), len(match_summaries))):
+        summary = match_summaries[position] if position < len(match_summaries) else {}
+        batting_rows = batting_json[position].get('battingSummary', []) if position < len(batting_json) else []
+        bowling_rows = bowling_json[position].get('bowlingSummary', []) if position < len(bowling_json) else []
+        ingest_block(state, position, summary, batting_rows, bowling_rows, alias_index)
+    finish_batting(state['batting'])
+    finish_bowling(state['bowling'])
+    return state
+
+def new_player_record(name, info=None, team=''):
+    info = info or {}
+    return records.PlayerRecord({
+        'name': name,
+        'team': info.get('team', team),
+        'battingStyle': info.get('battingStyle',''),
+        'bowlingStyle': info.get('bowlingStyle',''),
+        'playingRole': info.get('playingRole',''),
+        'description': info.get('description',''),
+        'runs': 0, 'balls':0, '4s':0, '6s':0, 'innings':0,
+        'strike_rate':0, 'bat_avg':0, 'boundary_pct':0, 'avg_ball_faced':0, 'batting_position': None,
+        'runs_conceded':0, 'wickets':0, 'economy':None, 'bowling_sr':None, 'bowling_avg':None, 'dot_pct':None
+    })
+
+def apply_player_stats(p, batting_agg, bowling_agg, fielding_agg=None):
+    name = p['name']
+    if name in batting_agg:
+        d = batting_agg[name]
+        p.update({
             'runs': d.get('runs',0),
             'balls': d.get('balls',0),
             '4s': d.get('4s',0),
@@ -156,12 +508,9 @@ def merge_player_info(player_info_json, batting_agg, bowling_agg):
             'avg_ball_faced': d.get('avg_ball_faced',0),
             'batting_position': d.get('batting_position', None)
         })
-    for name, d in bowling_agg.items():
-        if name not in players:
-            players[name] = {'name':name, 'team':d.get('team',''), 'battingStyle':'', 'bowlingStyle':'', 'playingRole':'', 'description':'',
-                             'runs':0,'balls':0,'4s':0,'6s':0,'innings':0,'strike_rate':0,'bat_avg':0,'boundary_pct':0,'avg_ball_faced':0,'batting_position':None,
-                             'runs_conceded':0,'wickets':0,'economy':None,'bowling_sr':None,'bowling_avg':None,'dot_pct':None}
-        players[name].update({
+    if name in bowling_agg:
+        d = bowling_agg[name]
+        p.update({
             'runs_conceded': d.get('runs_conceded',0),
             'wickets': d.get('wickets',0),
             'economy': d.get('economy', None),
@@ -171,53 +520,61 @@ def merge_player_info(player_info_json, batting_agg, bowling_agg):
             'balls_bowled': d.get('balls',0),
             'innings_bowled': d.get('innings',0),
             'overs': d.get('overs',0),
-            'maiden': d.get('maiden',0)
+            'maiden': d.get('maiden',0),
+            'dot_balls': d.get('dot_balls',0),
+            'max_spell_balls': d.get('max_spell_balls',0)
         })
+    d = (fielding_agg or {}).get(name, {})
+    p.update({s: d.get(s, 0) for s in FIELDING_STATS})
+
+def merge_player_info(player_info_json, batting_agg, bowling_agg, fielding_agg=None):
+    players = {}
+    for p in player_info_json:
+        name = p.get('name','').strip()
+        players[name] = new_player_record(name, p)
+    for agg in (batting_agg, bowling_agg):
+        for name, d in agg.items():
+            if name not in players:
+                players[name] = new_player_record(name, team=d.get('team',''))
+    for p in players.values():
+        apply_player_stats(p, batting_agg, bowling_agg, fielding_agg)
     return players
 
-def is_power_hitter(p):
-    return (p.get('bat_avg',0) > 30 and p.get('strike_rate',0) > 140 and p.get('innings',0) > 3 and p.get('boundary_pct',0) > 50.0 and (p.get('batting_position') is not None and p.get('batting_position') <= 3))
-
-def is_anchor(p):
-    return (p.get('bat_avg',0) > 40 and p.get('strike_rate',0) > 125 and p.get('innings',0) > 3 and p.get('avg_ball_faced',0) > 20 and (p.get('batting_position') is not None and p.get('batting_position') > 2))
-
-def is_finisher(p):
-    return (p.get('bat_avg',0) > 25 and p.get('strike_rate',0) > 130 and p.get('innings',0) > 3 and p.get('avg_ball_faced',0) > 12 and (p.get('batting_position') is not None and p.get('batting_position') > 4) and p.get('innings',0) > 1)
-
-def is_allrounder(p):
-    econ = p.get('economy')
-    return (p.get('bat_avg',0) > 15 and p.get('strike_rate',0) > 140 and p.get('innings',0) > 2 and (p.get('batting_position') is not None and p.get('batting_position') > 4) and p.get('innings',0) > 2 and (econ is not None and econ < 7) and (p.get('bowling_sr') is not None and p.get('bowling_sr') < 20.0))
-
-def is_specialist_fast(p):
-    econ = p.get('economy')
-    bs = (p.get('bowlingStyle') or '').lower()
-    return (
-        (p.get('innings_bowled', 0) > 4)
-        and (econ is not None and econ != '' and float(econ) < 7.0)
-        and (p.get('bowling_sr') is not None and p.get('bowling_sr') < 16.0)
-        and ('fast' in bs)
-        and (p.get('bowling_avg') is not None and p.get('bowling_avg') < 20)
-        and (p.get('dot_pct', 0) > 40.0)
-    )
-
-CATEGORY_FUNCS = {
-    'power': is_power_hitter,
-    'anchor': is_anchor,
-    'finisher': is_finisher,
-    'allrounder': is_allrounder,
-    'fast': is_specialist_fast
-}
+# Category definitions (stat / operator / threshold) live in a data file and
+# are compiled into vectorized predicates; see rules.py.
+CATEGORY_RULES_PATH = os.path.join(DATA_DIR, 'category_rules.json')
+CATEGORY_RULES = rules.load_category_rules(CATEGORY_RULES_PATH)
 
 # Load and aggregate data once
 print("Loading data...")
 batting_json = load_json('t20_wc_batting_summary.json')
 bowling_json = load_json('t20_wc_bowling_summary.json')
 player_info_json = load_json('t20_wc_player_info.json')
+match_results_json = load_json('t20_wc_match_results.json')
+match_summaries = [m for block in match_results_json for m in block.get('matchSummary', [])]
 
 print("Aggregating data...")
-bat_agg = aggregate_batting(batting_json)
-bowl_agg = aggregate_bowling(bowling_json)
-players = merge_player_info(player_info_json, bat_agg, bowl_agg)
+# Dismissal strings are parsed in the same pass into (batter, bowler,
+# fielders, type) records, with short scorecard names resolved to full
+# player names through the alias index.
+alias_index = dismissals.build_alias_index(player_info_json)
+bowling_styles = {p.get('name','').strip(): p.get('bowlingStyle','') for p in player_info_json}
+ingest_state = ingest_scorecards(batting_json, bowling_json, match_summaries, alias_index, bowling_styles)
+bat_agg, bowl_agg, field_agg = ingest_state['batting'], ingest_state['bowling'], ingest_state['fielding']
+players = merge_player_info(player_info_json, bat_agg, bowl_agg, field_agg)
+dismissal_index = dismissals.finish_index(ingest_state['dismissals'])
+match_indexes = ingest_state['matches']
+team_aggs = ingest_state['teams']
+form_index = ingest_state['form']
+venue_aggs = ingest_state['venues']
+player_venues = ingest_state['player_venues']
+standings = build_standings(team_aggs)
+if dismissal_index['unresolved']:
+    print(f"Dismissals: {dismissal_index['unresolved']} scorecard names could not be resolved")
+if ingest_state['errors']:
+    print(f"Scorecards: {len(ingest_state['errors'])} invalid values, treated as missing")
+    for e in ingest_state['errors']:
+        print("  " + schema.format_error(e))
 
 # Load player image mapping from CSV (optional file) and resolve missing extensions
 IMAGE_MAP_PATH = os.path.join(DATA_DIR, 'player_image_map.csv')
@@ -279,23 +636,1236 @@ for pname, pobj in players.items():
         pobj['img_name'] = assigned
 print("Data loaded and processed.")
 
+# The loaded records are shared by every request and thread, so from here on
+# they are read-only (records.freeze): handlers build request-scoped views
+# such as dict(record, ...), and only ingest_match, holding ingest_lock,
+# changes them.
+RECORD_TYPES = (records.PlayerRecord, records.BattingRow, records.BowlingRow)
+records.freeze(*RECORD_TYPES)
+ingest_lock = threading.Lock()
+
+# In-process query layer. Routes (and /api/batch) answer from these shared
+# indexes instead of rescanning `players` or calling each other's views.
+ROLE_ORDER = {'Batter': 1, 'Opening Batter': 1, 'Top Order Batter': 1,
+              'Allrounder': 2, 'Bowling Allrounder': 2,
+              'Bowler': 3, 'Opening Bowler': 3}
+
+def role_sort_key(p):
+    return (ROLE_ORDER.get(p.get('playingRole', ''), 4), p.get('name', ''))
+
+# Stats where a smaller number ranks higher on a leaderboard
+LOWER_IS_BETTER = {'economy', 'bowling_sr', 'bowling_avg', 'batting_position',
+                   'economy_ci_lo', 'economy_ci_hi', 'bowling_sr_ci_lo', 'bowling_sr_ci_hi'}
+
+def build_sort_orders(columns):
+    # One permutation per numeric stat and direction, computed once per
+    # snapshot. Players without a value for the stat are left out.
+    orders = {}
+    for stat, col in columns['numeric'].items():
+        present = np.flatnonzero(~np.isnan(col))
+        orders[(stat, 'desc')] = present[np.argsort(-col[present], kind='stable')]
+        orders[(stat, 'asc')] = present[np.argsort(col[present], kind='stable')]
+    return orders
+
+# Stats produced by aggregate_batting / aggregate_bowling, and the count a
+# player needs to be ranked on them.
+BATTING_STATS = ['runs', 'balls', '4s', '6s', 'innings', 'strike_rate', 'bat_avg', 'boundary_pct',
+                 'avg_ball_faced', 'batting_position']
+BOWLING_STATS = ['runs_conceded', 'wickets', 'balls_bowled', 'innings_bowled', 'overs', 'maiden', 'dot_balls',
+                 'economy', 'bowling_sr', 'bowling_avg', 'dot_pct']
+STAT_QUALIFIERS = dict([(s, 'innings') for s in BATTING_STATS] + [(s, 'balls_bowled') for s in BOWLING_STATS])
+
+def build_percentile_table(rows, columns):
+    groupings = {
+        'overall': np.zeros(len(rows), dtype=np.int32),
+        'role': stats.group_codes([selection.role_bucket(p.get('playingRole')) for p in rows]),
+        'team': stats.group_codes([p.get('team') or '' for p in rows])
+    }
+    return stats.build_percentiles(columns, groupings, BATTING_STATS + BOWLING_STATS,
+                                   lower_is_better=LOWER_IS_BETTER, qualifiers=STAT_QUALIFIERS)
+
+# With DATA_BACKEND=sqlite the name and team lookups, the leaderboard sort
+# orders and the percentile table are served by the store and not built.
+DATA_BACKEND = os.environ.get('DATA_BACKEND', 'memory')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(DATA_DIR, 't20.db'))
+
+def team_rosters(rows):
+    by_team = defaultdict(list)
+    for p in rows:
+        by_team[(p.get('team') or '').lower()].append(p)
+    for plist in by_team.values():
+        plist.sort(key=role_sort_key)
+    return dict(by_team)
+
+def build_query_indexes(players):
+    rows = list(players.values())
+    columns = rules.build_columns(rows)
+    # bootstrap CI bounds (strike_rate_ci_lo, ...) are columns like any other
+    # stat, so category rules, /api/query and leaderboards can use them
+    interval_table = intervals.build_intervals(rows, form_index)
+    columns['numeric'].update(intervals.ci_columns(interval_table))
+    indexes = {
+        'rows': rows,
+        'row_index': {p['name']: i for i, p in enumerate(rows)},
+        'columns': columns,
+        'similarity': similarity.build_neighbour_index(similarity.build_feature_matrix(rows)),
+        'categories': {},
+        'selection_pool': selection.build_candidate_pool(players),
+        'best11': {},
+        'cube': cube.build_cube(rows),
+        'intervals': interval_table
+    }
+    if DATA_BACKEND != 'sqlite':
+        indexes.update({
+            'sort_orders': build_sort_orders(columns),
+            'percentiles': build_percentile_table(rows, columns),
+            'by_team': team_rosters(rows),
+            'by_name': {p['name'].lower(): p for p in rows},
+            'teams': sorted(set(p.get('team', '') for p in rows))
+        })
+    return indexes
+
+query_indexes = build_query_indexes(players)
+
+# Biographies for the player pages (full_players_json.json), read on first
+# use and kept by lower-cased full name
+player_bios = None
+
+def query_bio(name):
+    global player_bios
+    if player_bios is None:
+        bios = {}
+        try:
+            for fp in load_json('full_players_json.json'):
+                bios.setdefault(fp.get('full_name', '').lower(), fp)
+        except Exception as e:
+            print(f"Error loading full_players_json.json: {e}")
+        player_bios = bios
+    return player_bios.get(name.lower())
+
+# Optional SQLite backend for the team, player, category, search,
+# leaderboard, percentile and interval queries (store.py). The database is a
+# snapshot of the records above; an ingest is applied to it in place and
+# anything else that changes them rebuilds it. It is synced once the ingest
+# log has been replayed (see below), so a worker that starts late finds the
+# file already up to date. Its version is the cache version (code, templates
+# and data files, then each ingested match).
+db_pool = None
+store_version = None
+
+def store_snapshot():
+    rows = query_indexes['rows']
+    bios = load_json('full_players_json.json')
+    info = {p.get('name'): p for p in player_info_json}
+    return {
+        'rows': rows,
+        'columns': query_indexes['columns'],
+        'role_groups': [selection.role_bucket(p.get('playingRole')) for p in rows],
+        'intervals': query_indexes['intervals'],
+        'team_order': {p['name']: i for plist in team_rosters(rows).values() for i, p in enumerate(plist)},
+        'info': info,
+        'bios': bios,
+        'batting': batting_json,
+        'bowling': bowling_json,
+        'matches': [match_indexes['matches'][mid] for mid in match_indexes['ids']],
+        'version': f'{store.STORE_VERSION}:{cache_version}'
+    }
+
+def sync_store(ids=None, blocks=None):
+    # ids / blocks: the player rows and scorecard blocks an ingest changed
+    global db_pool, store_version
+    snapshot = store_snapshot()
+    applied = ids is not None and store_version is not None and \
+        store.update_db(SQLITE_PATH, store_version, snapshot, ids, blocks)
+    if not applied and store.db_version(SQLITE_PATH) != snapshot['version']:
+        store.build_db(SQLITE_PATH, snapshot)
+        print(f"Built {SQLITE_PATH}")
+    store_version = snapshot['version']
+    if db_pool is None:
+        db_pool = store.new_pool(SQLITE_PATH)
+    else:
+        store.reset_pool(db_pool)
+
+def query_teams():
+    if db_pool is not None:
+        return store.teams(db_pool)
+    return query_indexes['teams']
+
+def query_team(team):
+    if db_pool is not None:
+        return store.team(db_pool, team)
+    return query_indexes['by_team'].get((team or '').lower(), [])
+
+def query_player(name):
+    if db_pool is not None:
+        return store.player(db_pool, name)
+    return query_indexes['by_name'].get((name or '').strip().lower())
+
+def query_percentiles(name):
+    if db_pool is not None:
+        return store.percentiles(db_pool, name, BATTING_STATS + BOWLING_STATS, LOWER_IS_BETTER, STAT_QUALIFIERS)
+    p = query_player(name)
+    if p is None:
+        return {}
+    return stats.player_percentiles(query_indexes['percentiles'], query_indexes['row_index'][p['name']])
+
+def query_intervals(name):
+    p = query_player(name)
+    if p is None:
+        return None
+    if db_pool is not None:
+        found = store.intervals(db_pool, p['name'])
+    else:
+        found = intervals.player_intervals(query_indexes['intervals'], query_indexes['row_index'][p['name']])
+    return {'name': p['name'], 'level': intervals.LEVEL, 'samples': intervals.BOOTSTRAP_SAMPLES, 'stats': found}
+
+def query_similar(name, k=10):
+    p = query_player(name)
+    if p is None:
+        return None
+    k = max(0, min(int(k), similarity.K_MAX))
+    ids, dists = similarity.similar(similarity_index(), query_indexes['row_index'][p['name']], k)
+    rows = query_indexes['rows']
+    return [{'name': rows[i]['name'], 'team': rows[i].get('team', ''), 'playingRole': rows[i].get('playingRole', ''),
+             'distance': round(d, 3)} for i, d in zip(ids, dists)]
+
+# Player fields an ingest can change (see apply_player_stats)
+INGEST_STATS = BATTING_STATS + BOWLING_STATS + FIELDING_STATS + ['max_spell_balls']
+
+def update_stat_cells(names):
+    # Writes the ingest stats of `names` into their cells of the numeric
+    # columns. Returns the stats where a value changed.
+    rows = query_indexes['rows']
+    numeric = query_indexes['columns']['numeric']
+    ids = [query_indexes['row_index'][n] for n in names]
+    changed = []
+    for stat in INGEST_STATS:
+        values = [rows[i].get(stat) for i in ids]
+        col = numeric.get(stat)
+        if col is None:
+            # no player had a value for it yet
+            if any(v is not None and v != '' for v in values):
+                numeric.update(rules.build_columns(rows, keys=[stat])['numeric'])
+                query_indexes['columns']['text'].pop(stat, None)
+                changed.append(stat)
+            continue
+        new = np.array([np.nan if v is None or v == '' else float(v) for v in values])
+        old = col[ids]
+        if not np.array_equal(old, new, equal_nan=True):
+            col[ids] = new
+            changed.append(stat)
+    return changed
+
+def similarity_index():
+    # Built again on first use after an ingest changed its inputs: every
+    # vector is z-scored over all players, so it can't be patched per row.
+    index = query_indexes['similarity']
+    if index is None:
+        index = similarity.build_neighbour_index(similarity.build_feature_matrix(query_indexes['rows']))
+        query_indexes['similarity'] = index
+    return index
+
+def refresh_stats(names):
+    # Incremental refresh after the records of `names` changed in place: only
+    # their cells are rewritten, and only the columns where a value changed
+    # get new sort orders and percentiles. The Best XI pool, the cube and
+    # the intervals are updated for those players only.
+    rows = query_indexes['rows']
+    columns = query_indexes['columns']
+    ids = [query_indexes['row_index'][n] for n in names]
+    changed = update_stat_cells(names)
+    # a qualifier column changing moves every stat that depends on it
+    affected = set(changed) | {s for s, q in STAT_QUALIFIERS.items() if q in changed}
+    if 'percentiles' in query_indexes:
+        stats.update_percentiles(query_indexes['percentiles'], columns, sorted(affected))
+    if similarity.INPUTS & set(changed):
+        query_indexes['similarity'] = None
+    selection.update_candidate_pool(query_indexes['selection_pool'], players, names)
+    if not cube.update_rows(query_indexes['cube'], rows, ids):
+        query_indexes['cube'] = cube.build_cube(rows)
+    # the ci columns are views of the interval table, so this updates them too
+    changed += intervals.update_intervals(query_indexes['intervals'], rows, form_index, ids)
+    if 'sort_orders' in query_indexes:
+        query_indexes['sort_orders'].update(build_sort_orders({'numeric': {s: columns['numeric'][s] for s in changed}}))
+    query_indexes['categories'].clear()
+    query_indexes['best11'].clear()
+
+def query_h2h(batter, bowler):
+    # Head to head from the sparse batter x bowler dismissal matrix. `innings`
+    # counts innings where the batter batted and the bowler bowled.
+    b, w = query_player(batter), query_player(bowler)
+    if b is None or w is None:
+        return None
+    key = (b['name'], w['name'])
+    recs = dismissal_index['pairs'].get(key, [])
+    return {
+        'batter': b['name'],
+        'bowler': w['name'],
+        'innings': dismissal_index['met'].get(key, 0),
+        'dismissals': len(recs),
+        'records': [{'match_id': r['match_id'], 'match': r['match'], 'type': r['type'], 'dismissal': r['raw']} for r in recs]
+    }
+
+def query_dismissals(name):
+    p = query_player(name)
+    if p is None:
+        return None
+    return {
+        'name': p['name'],
+        'dismissed_by': dismissal_index['dismissed_by'].get(p['name'], []),
+        'dismissals_of': dismissal_index['dismissals_of'].get(p['name'], [])
+    }
+
+def query_match(match_id):
+    return match_indexes['matches'].get((match_id or '').strip())
+
+def query_matches(team=None, ground=None, date=None):
+    # Intersect the secondary indexes for the given filters; results keep
+    # tournament order. `date` accepts "2022-10-16" or "Oct 16, 2022".
+    lists = []
+    if team:
+        lists.append(match_indexes['by_team'].get(team.strip().lower(), []))
+    if ground:
+        lists.append(match_indexes['by_ground'].get(ground.strip().lower(), []))
+    if date:
+        iso = parse_match_date(date)
+        if iso is None:
+            raise ValueError('date must look like 2022-10-16 or Oct 16, 2022')
+        lists.append(match_indexes['by_date'].get(iso, []))
+    if not lists:
+        ids = match_indexes['ids']
+    else:
+        lists.sort(key=len)
+        rest = [set(l) for l in lists[1:]]
+        ids = [mid for mid in lists[0] if all(mid in r for r in rest)]
+    return [match_indexes['matches'][mid]['summary'] for mid in ids]
+
+def query_standings():
+    return standings
+
+def query_team_summary(team):
+    t = team_aggs.get((team or '').strip().lower())
+    if t is None:
+        return None
+    position = next((r['position'] for r in standings if r['team'] == t['team']), None)
+    leaders = {stat: query_leaderboard(stat, limit=3, team=t['team']) for stat in ('runs', 'wickets', 'fielding_dismissals')}
+    return dict(t, position=position, leaders=leaders)
+
+# Monte Carlo simulation (simulate.py) from the per-player innings and
+# bowling figures. The model is rebuilt whenever a match is ingested; the
+# last SIMULATION_CACHE_SIZE seeded results are memoized until then (an
+# unseeded run is never asked for twice). A request (or a whole batch)
+# plays at most SIMULATION_MAX_MATCHES matches, n times the matches of one
+# run: about two seconds of the pool.
+SIMULATION_DEFAULT_N = 10000
+SIMULATION_MAX_N = 1000000
+SIMULATION_MAX_MATCHES = 1000000
+SIMULATION_CACHE_SIZE = 256
+simulation_cache = {}
+simulation_lock = threading.Lock()
+
+def simulation_player(name):
+    bat, bowl = bat_agg.get(name), bowl_agg.get(name)
+    series = form_index.get(name, {})
+    batting, bowling = series.get('batting'), series.get('bowling')
+    seen = set(batting['match_id'] if batting else []) | set(bowling['match_id'] if bowling else [])
+    last = [s['order'][-1] for s in (batting, bowling) if s and s['order']]
+    positions = sorted(bat['positions']) if bat else []
+    return {
+        'name': name,
+        'team': (bat or bowl)['team'] or '',
+        'appearances': max(len(seen), len(positions)),
+        'last_seen': max(last) if last else ('', -1),
+        'position': positions[len(positions) // 2] if positions else simulate.XI,
+        'runs': list(batting['runs']) if batting else [],
+        'balls': list(batting['balls']) if batting else [],
+        'bowl_balls': bowl['balls'] if bowl else 0,
+        'bowl_runs': bowl['runs_conceded'] if bowl else 0,
+        'wickets': bowl['wickets'] if bowl else 0
+    }
+
+def build_simulation_model():
+    innings = [i for m in match_indexes['matches'].values() for i in m['innings']]
+    balls = sum(i['balls'] for i in innings)
+    fixtures = [{'match': k, 'id': m['id'], 'team1': m['team1'], 'team2': m['team2'], 'winner': m['winner'],
+                 'ground': m['ground'], 'date': m['date']}
+                for k, m in enumerate((match_indexes['matches'][mid] for mid in match_indexes['ids']), start=1)]
+    return simulate.build_model([simulation_player(name) for name in sorted(set(bat_agg) | set(bowl_agg))],
+                                fixtures, sum(i['extras'] for i in innings) / balls if balls else 0.0)
+
+simulation_model = build_simulation_model()
+simulate.start_pool(int(os.environ.get('SIM_WORKERS', min(4, os.cpu_count() or 1))))
+
+def parse_xis(xis):
+    # {team: [names]}, or "India:Rohit Sharma|Virat Kohli" strings (one per team)
+    if isinstance(xis, dict):
+        return {team: list(names) for team, names in xis.items()}
+    out = {}
+    for text in xis or []:
+        team, _, names = text.partition(':')
+        out[team] = [n for n in names.split('|') if n.strip()]
+    return out
+
+def simulated_matches(result):
+    # matches a query_simulate result played
+    if result['mode'] == 'tournament':
+        return result['n'] * (len(simulation_model['fixtures']) - result['from'] + 1)
+    return result['n'] * (len(result['bracket']) - 1)
+
+def query_simulate(teams=None, n=SIMULATION_DEFAULT_N, seed=None, xis=None, start=None,
+                   max_matches=SIMULATION_MAX_MATCHES):
+    # teams: bracket in playing order ("India,England" is one match; four
+    # teams are two semi-finals and a final). Defaults to the top four of the
+    # standings as 1 v 4, 2 v 3. With `start` the fixtures of
+    # t20_wc_match_results.json are played from that match number on instead.
+    # xis overrides the likely XIs. Raises ValueError on bad input, or when
+    # n times the matches of a run is over max_matches.
+    if isinstance(teams, str):
+        teams = [t for t in teams.split(',') if t.strip()]
+    if not teams:
+        top = [r['team'] for r in standings[:4]]
+        teams = [top[0], top[3], top[1], top[2]]
+    n = int(n)
+    if not 1 <= n <= SIMULATION_MAX_N:
+        raise ValueError(f'n must be between 1 and {SIMULATION_MAX_N}')
+    xis = parse_xis(xis)
+    start = None if start in (None, '') else int(start)
+    fixtures = len(simulation_model['fixtures'])
+    if start is not None and not 1 <= start <= fixtures:
+        raise ValueError(f'from must be between 1 and {fixtures}')
+    per_run = fixtures - start + 1 if start is not None else len(teams) - 1
+    if n * per_run > max_matches:
+        raise ValueError(f'n x {per_run} matches per run must be at most {max_matches} simulated matches')
+    seeded = seed not in (None, '')
+    seed = int(seed) if seeded else secrets.randbits(32)
+    key = (tuple(t.strip().lower() for t in teams) if start is None else start, n, seed,
+           tuple(sorted((team.strip().lower(), tuple(names)) for team, names in xis.items())))
+    with simulation_lock:
+        cached = simulation_cache.pop(key, None)
+        if cached is not None:
+            simulation_cache[key] = cached
+            return cached
+    started = time.perf_counter()
+    model = simulation_model
+    if start is None:
+        result = {
+            'mode': 'match' if len(teams) == 2 else 'knockout',
+            'bracket': [t.strip() for t in teams],
+            'n': n,
+            'seed': seed,
+            'teams': simulate.simulate_bracket(model, teams, n, seed, xis)
+        }
+    else:
+        result = dict({'mode': 'tournament', 'from': start, 'n': n, 'seed': seed},
+                      **simulate.simulate_fixtures(model, start, n, seed, xis, points_win=POINTS_WIN,
+                                                   points_no_result=POINTS_NO_RESULT))
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    if seeded:
+        with simulation_lock:
+            if model is simulation_model:
+                simulation_cache[key] = result
+                while len(simulation_cache) > SIMULATION_CACHE_SIZE:
+                    simulation_cache.pop(next(iter(simulation_cache)))
+    return result
+
+def ingest_match(summary, batting_rows, bowling_rows):
+    # Adds one match to the loaded snapshot. It goes through the same
+    # ingest_block as the startup pass; afterwards only the players it touched,
+    # the affected stat columns and the standings are refreshed. One ingest
+    # runs at a time. Raises ValueError for a match that is already loaded.
+    global dismissal_index, standings, query_indexes, simulation_model, cache_version
+    with ingest_lock, records.writable(*RECORD_TYPES):
+        mid = match_id_for(summary, len(match_summaries))
+        if mid in match_indexes['matches']:
+            raise ValueError(f'match {mid} is already loaded')
+        cache_version = next_cache_version(cache_version, [summary, batting_rows, bowling_rows])
+        position = len(match_summaries)
+        match_summaries.append(summary)
+        batting_json.append({'battingSummary': batting_rows})
+        bowling_json.append({'bowlingSummary': bowling_rows})
+        seen_errors = len(ingest_state['errors'])
+        entry, touched = ingest_block(ingest_state, position, summary, batting_rows, bowling_rows, alias_index)
+        for e in ingest_state['errors'][seen_errors:]:
+            print("Invalid scorecard value: " + schema.format_error(e))
+        finish_batting(bat_agg, touched)
+        finish_bowling(bowl_agg, touched)
+        dismissals.refresh_index(dismissal_index, ingest_state['dismissals'], touched)
+        standings = build_standings(team_aggs)
+        simulation_model = build_simulation_model()
+        with simulation_lock:
+            simulation_cache.clear()
+        new_names = [n for n in touched if n not in players]
+        for name in new_names:
+            d = bat_agg[name] if name in bat_agg else bowl_agg[name]
+            players[name] = new_player_record(name, team=d.get('team',''))
+        for name in touched:
+            apply_player_stats(players[name], bat_agg, bowl_agg, field_agg)
+        if new_names:
+            # a new row changes the shape of every column
+            query_indexes = build_query_indexes(players)
+        else:
+            refresh_stats(touched)
+        if db_pool is not None:
+            sync_store(None if new_names else [query_indexes['row_index'][n] for n in sorted(touched)], [position])
+        return entry
+
+def bowling_split_summary(split):
+    return {
+        'overs': balls_to_overs(split['balls']),
+        'runs': split['runs'],
+        'wickets': split['wickets'],
+        'economy': round(6 * split['runs'] / split['balls'], 2) if split['balls'] else None,
+        'average': round(split['runs'] / split['wickets'], 2) if split['wickets'] else None
+    }
+
+def query_venues():
+    return sorted(v['ground'] for v in venue_aggs.values())
+
+def query_venue(ground):
+    v = venue_aggs.get((ground or '').strip().lower())
+    if v is None:
+        return None
+    first, second = v['first_innings'], v['second_innings']
+    return {
+        'ground': v['ground'],
+        'matches': v['matches'],
+        'decided': v['decided'],
+        'avg_first_innings': round(first['runs'] / first['innings'], 1) if first['innings'] else None,
+        'avg_second_innings': round(second['runs'] / second['innings'], 1) if second['innings'] else None,
+        'chasing': {'won': v['chasing_won'], 'played': v['decided'],
+                    'pct': round(100 * v['chasing_won'] / v['decided'], 1) if v['decided'] else None},
+        'bowling_by_type': {k: bowling_split_summary(s) for k, s in sorted(v['by_type'].items())},
+        'bowling_by_style': {k: bowling_split_summary(s) for k, s in sorted(v['by_style'].items())}
+    }
+
+def query_player_venues(name):
+    p = query_player(name)
+    if p is None:
+        return None
+    out = []
+    for ground, g in sorted(player_venues.get(p['name'], {}).items()):
+        entry = {'ground': ground}
+        bat = g.get('batting')
+        if bat:
+            entry['batting'] = dict(bat, strike_rate=round(100 * bat['runs'] / bat['balls'], 2) if bat['balls'] else None,
+                                    average=round(bat['runs'] / bat['outs'], 2) if bat['outs'] else None)
+        if g.get('bowling'):
+            entry['bowling'] = bowling_split_summary(g['bowling'])
+        out.append(entry)
+    return {'name': p['name'], 'venues': out}
+
+FORM_MAX_WINDOW = 20
+
+def query_form(name, window=None):
+    # Innings-by-innings series in match date order as parallel arrays, with
+    # rolling sums / rates over the last `window` innings (form.WINDOW is
+    # maintained at ingest; other windows are summed on request).
+    p = query_player(name)
+    if p is None:
+        return None
+    window = form.WINDOW if window in (None, '') else int(window)
+    if not 1 <= window <= FORM_MAX_WINDOW:
+        raise ValueError(f'window must be between 1 and {FORM_MAX_WINDOW}')
+    def rolled(series, f):
+        return series['rolling_' + f] if window == form.WINDOW else form.rolling_sums(series[f], window)
+    out = {'name': p['name'], 'window': window}
+    series = form_index.get(p['name'], {})
+    bat = series.get('batting')
+    if bat:
+        runs, balls, outs = rolled(bat, 'runs'), rolled(bat, 'balls'), rolled(bat, 'outs')
+        out['batting'] = dict({k: bat[k] for k in ('match_id', 'date', 'opponent') + form.BATTING_FIELDS},
+                              rolling_runs=runs,
+                              rolling_sr=[round(100 * r / b, 2) if b else None for r, b in zip(runs, balls)],
+                              rolling_avg=[round(r / o, 2) if o else None for r, o in zip(runs, outs)])
+    bowl = series.get('bowling')
+    if bowl:
+        balls, runs, wickets = rolled(bowl, 'balls'), rolled(bowl, 'runs'), rolled(bowl, 'wickets')
+        out['bowling'] = dict({k: bowl[k] for k in ('match_id', 'date', 'opponent') + form.BOWLING_FIELDS},
+                              rolling_wickets=wickets,
+                              rolling_economy=[round(6 * r / b, 2) if b else None for r, b in zip(runs, balls)])
+    return out
+
+CUBE_DEFAULT_MEASURES = ['players', 'runs', 'strike_rate', 'wickets', 'economy']
+
+def query_cube(dims=None, measures=None, filters=None):
+    # dims / measures as lists or "team,battingStyle" strings; see cube.py
+    if isinstance(dims, str):
+        dims = [d.strip() for d in dims.split(',') if d.strip()]
+    if isinstance(measures, str):
+        measures = [m.strip() for m in measures.split(',') if m.strip()]
+    return cube.query_cube(query_indexes['cube'], dims or [], measures or CUBE_DEFAULT_MEASURES, filters)
+
+def query_players(names):
+    return [p for p in (query_player(n) for n in names) if p is not None]
+
+def run_rules(predicate, sort=None, limit=None):
+    cols = query_indexes['columns']
+    order = rules.sort_order(cols, predicate(cols), sort)
+    if limit is not None:
+        order = order[:limit]
+    rows = query_indexes['rows']
+    return [rows[i] for i in order]
+
+def run_rules_sql(conditions, sort=None, limit=None):
+    # run_rules against the SQLite backend, from the uncompiled conditions
+    cols = query_indexes['columns']
+    where, params = rules.compile_sql_rules(conditions, cols['numeric'], cols['text'])
+    order, order_params = rules.sql_order(sort, cols['numeric'], cols['text'])
+    return store.select(db_pool, where, params, order, order_params, limit)
+
+def query_category(cat):
+    # Returns None for an unknown category; results are memoized because the
+    # underlying player records only change when the data is reloaded.
+    rule = CATEGORY_RULES.get(cat)
+    if not rule:
+        return None
+    cached = query_indexes['categories'].get(cat)
+    if cached is not None:
+        return cached
+    if db_pool is not None:
+        matched = run_rules_sql(rule['rules'], rule['sort'])
+        if not matched and rule['fallback_rules']:
+            matched = run_rules_sql(rule['fallback_rules'], rule['sort'])
+    else:
+        matched = run_rules(rule['match'], rule['sort'])
+        if not matched and rule['fallback']:
+            matched = run_rules(rule['fallback'], rule['sort'])
+    query_indexes['categories'][cat] = matched
+    return matched
+
+QUERY_MAX_LIMIT = 500
+
+def query_where(where, sort=None, limit=100):
+    # Ad-hoc filter, e.g. where="strike_rate>140,innings>3", sort="-runs".
+    # Raises ValueError for unknown fields or unparsable conditions.
+    conditions = rules.parse_where(where)
+    limit = max(0, min(int(limit), QUERY_MAX_LIMIT))
+    if db_pool is not None:
+        return run_rules_sql(conditions, sort or None, limit)
+    return run_rules(rules.compile_rules(conditions), sort or None, limit)
+
+LEADERBOARD_MAX_LIMIT = 200
+
+def query_leaderboard(stat, limit=10, order=None, minimums=None, team=None):
+    # Top-k players by `stat`. minimums: {"overs": 10} keeps players with
+    # overs >= 10. Unfiltered boards slice the precomputed permutation;
+    # filtered ones run a heap-based top-k over the qualifying players.
+    cols = query_indexes['columns']
+    col = cols['numeric'].get(stat)
+    if col is None:
+        raise ValueError(f'unknown stat: {stat}')
+    order = order or ('asc' if stat in LOWER_IS_BETTER else 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+    limit = max(0, min(int(limit), LEADERBOARD_MAX_LIMIT))
+    minimums = minimums or {}
+    for field in minimums:
+        if field not in cols['numeric']:
+            raise ValueError(f'unknown stat: {field}')
+    if db_pool is not None:
+        hits = store.leaderboard(db_pool, stat, order, limit, minimums, team)
+    else:
+        if not minimums and not team:
+            idx = query_indexes['sort_orders'][(stat, order)][:limit]
+        else:
+            mask = ~np.isnan(col)
+            for field, minimum in minimums.items():
+                with np.errstate(invalid='ignore'):
+                    mask &= cols['numeric'][field] >= float(minimum)
+            if team:
+                mask &= cols['text']['team'] == team.lower()
+            candidates = np.flatnonzero(mask).tolist()
+            if order == 'desc':
+                idx = heapq.nlargest(limit, candidates, key=lambda i: col[i])
+            else:
+                idx = heapq.nsmallest(limit, candidates, key=lambda i: col[i])
+        rows = query_indexes['rows']
+        hits = [(rows[i], col[i]) for i in idx]
+    board = []
+    for rank, (p, value) in enumerate(hits, start=1):
+        entry = {'rank': rank, 'name': p['name'], 'team': p.get('team', ''),
+                 stat: p.get(stat) if stat in p else (round(float(value), 2) if np.isfinite(value) else None)}
+        for field in minimums:
+            entry[field] = p.get(field)
+        board.append(entry)
+    return board
+
+def query_fielding_leaderboard(limit=10, team=None):
+    # Catches + stumpings + run outs, with the breakdown on each entry
+    board = query_leaderboard('fielding_dismissals', limit=limit, team=team)
+    for entry in board:
+        p = query_player(entry['name'])
+        entry.update({s: p.get(s, 0) for s in FIELDING_STATS})
+    return board
+
+BEST11_MAX_WEIGHT = 1e6
+BEST11_CACHE_SIZE = 256
+best11_lock = threading.Lock()
+
+def parse_best11_options(weights, constraints):
+    # Validates user supplied weights/constraints; raises ValueError on bad input.
+    # weights: {"runs": 1, "wickets": 20} or "runs:1,wickets:20"
+    if isinstance(weights, str):
+        parsed = {}
+        for part in weights.split(','):
+            if not part.strip():
+                continue
+            stat, _, w = part.partition(':')
+            parsed[stat.strip()] = w
+        weights = parsed
+    clean_weights = {}
+    for stat, w in (weights or {}).items():
+        if str(stat) not in query_indexes['columns']['numeric']:
+            raise ValueError(f'unknown stat: {stat}')
+        w = float(w)
+        # bounded so a weighted sum of stats stays finite
+        if not abs(w) <= BEST11_MAX_WEIGHT:
+            raise ValueError(f'weights must be between -{BEST11_MAX_WEIGHT:g} and {BEST11_MAX_WEIGHT:g}')
+        clean_weights[str(stat)] = w
+    clean_cons = {}
+    for key, v in (constraints or {}).items():
+        if key not in selection.DEFAULT_CONSTRAINTS:
+            raise ValueError(f'unknown constraint: {key}')
+        if key == 'team':
+            clean_cons[key] = v or None
+        elif key == 'min_bowling_overs':
+            clean_cons[key] = float(v)
+        else:
+            clean_cons[key] = int(v)
+    selection.check_constraints(selection.effective_constraints(clean_cons))
+    return clean_weights or None, clean_cons
+
+def query_best11(weights=None, constraints=None):
+    # Memoized per data snapshot (query_indexes is rebuilt on reload) and per
+    # weights/constraints combination, for the last BEST11_CACHE_SIZE of them.
+    weights, constraints = parse_best11_options(weights, constraints)
+    key = (tuple(sorted((weights or {}).items())), tuple(sorted(constraints.items())))
+    memo = query_indexes['best11']
+    with best11_lock:
+        result = memo.pop(key, None)
+        if result is not None:
+            memo[key] = result
+    if result is None:
+        result = selection.select_xi(query_indexes['selection_pool'], weights, constraints)
+        with best11_lock:
+            memo[key] = result
+            while len(memo) > BEST11_CACHE_SIZE:
+                memo.pop(next(iter(memo)))
+    return result
+
+BATCH_MAX_QUERIES = 50
+# each of these costs the batch a 'heavy' rate limit token
+BATCH_HEAVY_TYPES = ('simulate', 'best11')
+# fields that must be strings (or absent / null) and objects (or absent /
+# null) whichever query they appear in
+BATCH_TEXT_FIELDS = ('team', 'cat', 'name', 'batter', 'bowler', 'ground', 'date', 'stat', 'order', 'where', 'sort')
+BATCH_OBJECT_FIELDS = ('filters', 'minimums', 'constraints')
+
+def batch_field_error(q):
+    for field in BATCH_TEXT_FIELDS:
+        if q.get(field) is not None and not isinstance(q[field], str):
+            return f'{field} must be a string'
+    for field in BATCH_OBJECT_FIELDS:
+        if q.get(field) is not None and not isinstance(q[field], dict):
+            return f'{field} must be an object'
+    if q.get('names') is not None and not (isinstance(q['names'], list) and all(isinstance(n, str) for n in q['names'])):
+        return 'names must be a list of strings'
+    if q.get('weights') is not None and not isinstance(q['weights'], (str, dict)):
+        return 'weights must be an object or a string'
+    return None
+
+def run_batch_query(q, budget):
+    # budget: {'matches': simulated matches left for this batch}
+    if not isinstance(q, dict):
+        return {'error': 'query must be an object'}
+    error = batch_field_error(q)
+    if error:
+        return {'error': error}
+    qtype = q.get('type')
+    if qtype == 'teams':
+        return {'data': query_teams()}
+    if qtype == 'team':
+        return {'data': query_team(q.get('team', ''))}
+    if qtype == 'category':
+        matched = query_category(q.get('cat', ''))
+        if matched is None:
+            return {'error': 'unknown category'}
+        return {'data': matched}
+    if qtype == 'players':
+        return {'data': query_players(q.get('names') or [])}
+    if qtype == 'player':
+        p = query_player(q.get('name', ''))
+        if p is None:
+            return {'error': 'player not found'}
+        return {'data': p}
+    if qtype == 'leaderboard':
+        try:
+            return {'data': query_leaderboard(q.get('stat', 'runs'), limit=q.get('limit', 10), order=q.get('order'),
+                                              minimums=q.get('minimums'), team=q.get('team'))}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+    if qtype == 'fielding':
+        try:
+            return {'data': query_fielding_leaderboard(limit=q.get('limit', 10), team=q.get('team'))}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+    if qtype == 'similar':
+        try:
+            matched = query_similar(q.get('name', ''), q.get('k', 10))
+        except (TypeError, ValueError):
+            return {'error': 'k must be an integer'}
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'h2h':
+        matched = query_h2h(q.get('batter', ''), q.get('bowler', ''))
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'dismissals':
+        matched = query_dismissals(q.get('name', ''))
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'match':
+        matched = query_match(str(q.get('id', '')))
+        if matched is None:
+            return {'error': 'match not found'}
+        return {'data': matched}
+    if qtype == 'matches':
+        try:
+            return {'data': query_matches(q.get('team'), q.get('ground'), q.get('date'))}
+        except ValueError as e:
+            return {'error': str(e)}
+    if qtype == 'standings':
+        return {'data': query_standings()}
+    if qtype == 'team_summary':
+        matched = query_team_summary(q.get('team', ''))
+        if matched is None:
+            return {'error': 'team not found'}
+        return {'data': matched}
+    if qtype == 'simulate':
+        try:
+            result = query_simulate(q.get('teams'), q.get('n', SIMULATION_DEFAULT_N), q.get('seed'),
+                                    q.get('xi'), q.get('from'), budget['matches'])
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+        budget['matches'] -= simulated_matches(result)
+        return {'data': result}
+    if qtype == 'form':
+        try:
+            matched = query_form(q.get('name', ''), q.get('window'))
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'venue':
+        matched = query_venue(q.get('ground', ''))
+        if matched is None:
+            return {'error': 'venue not found'}
+        return {'data': matched}
+    if qtype == 'player_venues':
+        matched = query_player_venues(q.get('name', ''))
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'cube':
+        try:
+            return {'data': query_cube(q.get('dims'), q.get('measures'), q.get('filters'))}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+    if qtype == 'intervals':
+        matched = query_intervals(q.get('name', ''))
+        if matched is None:
+            return {'error': 'player not found'}
+        return {'data': matched}
+    if qtype == 'query':
+        try:
+            return {'data': query_where(q.get('where', ''), q.get('sort'), q.get('limit', 100))}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+    if qtype == 'best11':
+        try:
+            return {'data': query_best11(q.get('weights'), q.get('constraints'))}
+        except (TypeError, ValueError) as e:
+            return {'error': str(e)}
+    return {'error': f'unknown query type: {qtype}'}
+
+# Content-hashed static assets, built by scripts/build_static_manifest.py.
+# Without a manifest asset_url() falls back to the plain /static/ path.
+STATIC_MANIFEST_PATH = os.path.join(STATIC_DIR, 'manifest.json')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+static_manifest = {}
+if os.path.exists(STATIC_MANIFEST_PATH):
+    try:
+        with open(STATIC_MANIFEST_PATH, 'r', encoding='utf-8') as f:
+            static_manifest = json.load(f)
+    except Exception as e:
+        print(f"Error loading static manifest: {e}")
+hashed_static = set(static_manifest.values())
+# the images part, inlined in base.html for URLs built in JS (assetUrl())
+static_images = {k: v for k, v in static_manifest.items() if k.startswith('images/')}
+
+def asset_url(path):
+    path = path.lstrip('/')
+    return '/static/' + static_manifest.get(path, path)
+
+@app.context_processor
+def inject_asset_url():
+    return {'asset_url': asset_url, 'static_images': static_images}
+
+# Shared cache (cache.py) for rendered pages, API responses and Wikipedia
+# summaries, so a page one worker has built is served by all of them. Page
+# and API keys include cache_version, a hash of the code, templates and data
+# files that ingest_match advances, so entries from an older deploy or from
+# before a new match are never served. Wikipedia summaries are keyed by
+# player name only.
+CACHE_URL = os.environ.get('CACHE_URL', 'sqlite:///' + os.path.join(DATA_DIR, 'cache.db'))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 3600))
+WIKI_CACHE_TTL = int(os.environ.get('WIKI_CACHE_TTL', 24 * 3600))
+WIKI_MISS_TTL = 600  # "no article" answers are retried sooner
+try:
+    response_cache = cache.from_url(CACHE_URL, int(os.environ.get('CACHE_MAX_BYTES', cache.DEFAULT_MAX_BYTES)),
+                                    int(os.environ.get('CACHE_MAX_ENTRIES', cache.DEFAULT_MAX_ENTRIES)))
+except ValueError as e:
+    print(f"Cache disabled: {e}")
+    response_cache = None
+
+def build_cache_version():
+    base = os.path.dirname(os.path.abspath(__file__))
+    templates = os.path.join(base, 'templates')
+    paths = [os.path.join(base, f) for f in os.listdir(base) if f.endswith('.py')]
+    paths += [os.path.join(templates, f) for f in os.listdir(templates)]
+    paths += [os.path.join(DATA_DIR, f) for f in os.listdir(DATA_DIR) if f.endswith(('.json', '.csv'))]
+    paths.append(STATIC_MANIFEST_PATH)
+    h = hashlib.sha1()
+    for path in sorted(paths, key=os.path.basename):
+        if os.path.isfile(path):
+            h.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()[:16]
+
+def next_cache_version(version, change):
+    # the same change on the same version gives the same next version, so
+    # workers that ingest the same match keep sharing entries
+    data = json.dumps(change, sort_keys=True, default=records.json_default)
+    return hashlib.sha1((version + data).encode('utf-8')).hexdigest()[:16]
+
+cache_version = build_cache_version()
+
+def cache_get(key):
+    # a cache that can't be read is a miss, never an error page
+    if response_cache is None:
+        return None
+    try:
+        return response_cache.get(key)
+    except Exception as e:
+        print(f"Cache read failed: {e}")
+        return None
+
+def cache_set(key, value, ttl):
+    if response_cache is None:
+        return
+    try:
+        response_cache.set(key, value, ex=ttl)
+    except Exception as e:
+        print(f"Cache write failed: {e}")
+
+def cached_response(view):
+    # Caches a GET view's 200 responses for CACHE_TTL, keyed by path and
+    # query string. Responses carry X-Cache: HIT or MISS.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if response_cache is None or request.method != 'GET':
+            return view(*args, **kwargs)
+        query = urlencode(sorted(request.args.items(multi=True)))
+        key = f"page:{cache_version}:{request.path}?{query}"
+        hit = cache_get(key)
+        count_metric('t20_cache_requests_total', cache='page', result='miss' if hit is None else 'hit')
+        if hit is not None:
+            head, body = hit.split(b'\n', 1)
+            status, content_type = head.decode('utf-8').split(' ', 1)
+            resp = app.response_class(body, status=int(status), content_type=content_type)
+            resp.headers['X-Cache'] = 'HIT'
+            return resp
+        resp = make_response(view(*args, **kwargs))
+        if resp.status_code == 200 and not resp.direct_passthrough:
+            cache_set(key, f"{resp.status_code} {resp.content_type}\n".encode('utf-8') + resp.get_data(), CACHE_TTL)
+        resp.headers['X-Cache'] = 'MISS'
+        return resp
+    return wrapper
+
+# The ASGI entry point (asgi.py) fetches the summary before the page runs
+# and passes it in the WSGI environ under this key ({name: summary}).
+WIKI_PREFETCH_KEY = 't20.wiki_summaries'
+
+def fetch_wiki_summary(name):
+    # Wikipedia summary for a player, or None; cached across workers
+    if has_request_context():
+        prefetched = request.environ.get(WIKI_PREFETCH_KEY) or {}
+        if name in prefetched:
+            return prefetched[name]
+    found, summary = cached_wiki_summary(name)
+    if found:
+        return summary
+    return request_wiki_summary(name)
+
+def cached_wiki_summary(name):
+    # (found, summary)
+    hit = cache_get('wiki:' + name)
+    count_metric('t20_cache_requests_total', cache='wiki', result='miss' if hit is None else 'hit')
+    return (True, hit.decode('utf-8') or None) if hit is not None else (False, None)
+
+def request_wiki_summary(name):
+    # the outbound call; blocks for up to the 5s timeout
+    wiki_summary = None
+    outcome = 'error'
+    start = time.perf_counter()
+    try:
+        # Clean the player name for Wikipedia API
+        wiki_name = name.replace(' ', '_')
+        wiki_api = f"https://en.wikipedia.org/api/rest_v1/page/summary/{wiki_name}"
+        
+        # Add timeout and user-agent
+        headers = {'User-Agent': 'T20Analytics/1.0'}
+        resp = requests.get(wiki_api, headers=headers, timeout=5)
+        outcome = str(resp.status_code)
+        
+        if resp.status_code == 200:
+            wiki_data = resp.json()
+            wiki_summary = wiki_data.get('extract')
+            cache_set('wiki:' + name, wiki_summary or '', WIKI_CACHE_TTL)
+        else:
+            print(f"Wikipedia API error: {resp.status_code}")
+            if resp.status_code == 404:
+                cache_set('wiki:' + name, '', WIKI_MISS_TTL)
+    except RequestException as e:
+        print(f"Wikipedia request failed: {str(e)}")
+    except Exception as e:
+        print(f"Error fetching Wikipedia data: {str(e)}")
+    observe_outbound('wikipedia', outcome, time.perf_counter() - start)
+    return wiki_summary
+
+# Request metrics (metrics.py), served at /metrics in the Prometheus text
+# format: latency and response size histograms and status codes per route,
+# cache hits and misses, Wikipedia call timings and refused requests. The
+# workers add their counts to METRICS_URL, so a scrape of any one of them
+# covers all of them. Requests slower than SLOW_REQUEST_MS are logged
+# (0 turns that off).
+METRICS_URL = os.environ.get('METRICS_URL', 'sqlite:///' + os.path.join(DATA_DIR, 'metrics.db'))
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', metrics.FLUSH_INTERVAL))
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 1000))
+try:
+    metrics_registry = metrics.from_url(METRICS_URL, METRICS_FLUSH_INTERVAL)
+except ValueError as e:
+    print(f"Metrics disabled: {e}")
+    metrics_registry = None
+# set in the WSGI environ by asgi.py: time.perf_counter() when the request
+# arrived, so the latency includes the prefetch
+REQUEST_START_KEY = 't20.request_start'
+
+def flush_metrics():
+    try:
+        metrics_registry.flush()
+    except Exception as e:
+        print(f"Could not write metrics: {e}")
+
+if metrics_registry is not None:
+    metrics_registry.describe('t20_http_requests_total', 'counter', 'Requests by route, method and status code.')
+    metrics_registry.describe('t20_http_request_duration_seconds', 'histogram', 'Request latency by route.')
+    metrics_registry.describe('t20_http_response_size_bytes', 'histogram', 'Response body size by route.')
+    metrics_registry.describe('t20_cache_requests_total', 'counter', 'Shared cache lookups by cache and result.')
+    metrics_registry.describe('t20_outbound_request_duration_seconds', 'histogram',
+                              'Outbound call latency by service and outcome (status code or error).')
+    atexit.register(flush_metrics)
+
+def count_metric(family, **labels):
+    if metrics_registry is not None:
+        metrics_registry.inc(family, **labels)
+
+def observe_outbound(service, outcome, seconds):
+    if metrics_registry is not None:
+        metrics_registry.observe('t20_outbound_request_duration_seconds', seconds, metrics.LATENCY_BUCKETS,
+                                 service=service, outcome=outcome)
+
+def route_label(path, method='GET'):
+    # the URL rule a path matches ('/player/<player_name>'), so there is one
+    # series per route rather than per URL
+    try:
+        rule, _ = app.url_map.bind('localhost').match(path, method, return_rule=True)
+        return rule.rule
+    except HTTPException:
+        return 'unmatched'
+
+def observe_request(method, route, path, status, size, seconds):
+    if metrics_registry is not None:
+        try:
+            metrics_registry.inc('t20_http_requests_total', route=route, method=method, status=str(status))
+            metrics_registry.observe('t20_http_request_duration_seconds', seconds, metrics.LATENCY_BUCKETS, route=route)
+            metrics_registry.observe('t20_http_response_size_bytes', size, metrics.SIZE_BUCKETS, route=route)
+            metrics_registry.maybe_flush()
+        except Exception as e:
+            print(f"Could not record metrics: {e}")
+    if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+        print(f"Slow request: {method} {path} -> {status}, {seconds * 1000:.0f}ms, {size} bytes")
+
+# registered before admission_control, so refused requests are timed too
+@app.before_request
+def start_request_timer():
+    g.request_start = request.environ.get(REQUEST_START_KEY) or time.perf_counter()
+
+@app.after_request
+def record_request_metrics(resp):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        observe_request(request.method, route, request.path, resp.status_code, resp.content_length or 0,
+                        time.perf_counter() - start)
+    return resp
+
+# Rate limiting and admission control (limits.py). Each client has a token
+# bucket per route class, shared by the workers through RATE_LIMIT_URL; a
+# worker runs at most MAX_IN_FLIGHT requests at once. Refused requests get
+# 429 (rate) or 503 (busy) with Retry-After and are counted for /api/limits.
+# A gthread worker hands a request to the app only once one of its
+# WEB_THREADS (gunicorn --threads in the Procfile and Dockerfile, 8) is free,
+# so the gate sits two below that: the spare threads answer 503 at once
+# while the others are busy, instead of requests queueing for a thread.
+# Behind a proxy PROXY_HOPS tells clients apart by X-Forwarded-For; Heroku
+# (DYNO) and Vercel (VERCEL) put one router in front of the app.
+RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL', 'sqlite:///' + os.path.join(DATA_DIR, 'limits.db'))
+RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('RATE_LIMIT_SYNC_INTERVAL', limits.SYNC_INTERVAL))
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+MAX_IN_FLIGHT = int(os.environ.get('MAX_IN_FLIGHT', max(1, WEB_THREADS - 2)))
+PROXY_HOPS = int(os.environ.get('PROXY_HOPS', 1 if os.environ.get('DYNO') or os.environ.get('VERCEL') else 0))
+try:
+    limiter = limits.from_url(RATE_LIMIT_URL, RATE_LIMIT_SYNC_INTERVAL)
+    route_limits = limits.parse_limits(os.environ.get('RATE_LIMITS'))
+except ValueError as e:
+    print(f"Rate limiting disabled: {e}")
+    limiter, route_limits = None, limits.DEFAULT_LIMITS
+shed_counter = limiter if limiter is not None else limits.MemoryLimiter()
+admission_gate = limits.Gate(MAX_IN_FLIGHT)
+# set in the WSGI environ by asgi.py, which calls admit() itself
+ADMITTED_KEY = 't20.admitted'
+
+def record_shed(route, reason):
+    try:
+        shed_counter.record_shed(route, reason)
+    except Exception as e:
+        print(f"Could not count a refused request: {e}")
+
+def bucket_key(route, remote_addr, forwarded_for):
+    return f"{route}:{limits.client_key(remote_addr, forwarded_for, PROXY_HOPS)}"
+
+def admit(path, remote_addr, forwarded_for=None):
+    # (refusal, entered): refusal is None or (status, retry_after, message).
+    # When entered is True the request holds a gate slot, which the caller
+    # gives back with admission_gate.leave().
+    route = limits.route_class(path)
+    if route is None:
+        return None, False
+    if limiter is not None:
+        rate, burst = route_limits[route]
+        try:
+            wait = limiter.take(bucket_key(route, remote_addr, forwarded_for), rate, burst)
+        except Exception as e:
+            # a limiter that can't be reached lets requests through
+            print(f"Rate limiter failed: {e}")
+            wait = 0
+        if wait:
+            record_shed(route, 'rate_limited')
+            return (429, limits.retry_after(wait), 'rate limited'), False
+    if not admission_gate.enter():
+        record_shed(route, 'overloaded')
+        return (503, 1, 'server busy'), False
+    return None, True
+
+def charge(route, cost, remote_addr, forwarded_for=None):
+    # takes `cost` more tokens from the client's bucket for `route` (a request
+    # that does the work of several) -> 0, or seconds until they are due
+    if limiter is None or cost <= 0:
+        return 0
+    rate, burst = route_limits[route]
+    try:
+        return limiter.take(bucket_key(route, remote_addr, forwarded_for), rate, burst, cost)
+    except Exception as e:
+        print(f"Rate limiter failed: {e}")
+        return 0
+
+def refusal_body(path, refusal):
+    # (content type, body)
+    status, wait, message = refusal
+    if path.startswith('/api/'):
+        return 'application/json', json.dumps({'error': message, 'retry_after': wait}).encode('utf-8')
+    return 'text/plain; charset=utf-8', f"Too many requests ({message}), retry in {wait}s".encode('utf-8')
+
+@app.before_request
+def admission_control():
+    if request.environ.get(ADMITTED_KEY):
+        return None
+    refusal, entered = admit(request.path, request.remote_addr, request.headers.get('X-Forwarded-For'))
+    if refusal is not None:
+        content_type, body = refusal_body(request.path, refusal)
+        resp = app.response_class(body, status=refusal[0], content_type=content_type)
+        resp.headers['Retry-After'] = str(refusal[1])
+        return resp
+    g.admission_entered = entered
+
+@app.teardown_request
+def admission_release(exc):
+    if g.pop('admission_entered', False):
+        admission_gate.leave()
+
+# Matches added after startup (ingest_log.py). Each worker replays the log
+# here and picks up lines appended since before its next request, so a
+# match posted to one worker reaches all of them. POST /api/ingest is off
+# unless INGEST_TOKEN is set.
+INGEST_LOG_PATH = os.environ.get('INGEST_LOG_PATH', os.path.join(DATA_DIR, 'ingested_matches.jsonl'))
+INGEST_TOKEN = os.environ.get('INGEST_TOKEN', '')
+ingest_log_offset = 0
+ingest_log_lock = threading.Lock()
+
+def catch_up_ingest_log():
+    # -> match entries ingested from the lines not read yet
+    global ingest_log_offset
+    with ingest_log_lock:
+        entries, ingest_log_offset = ingest_log.read_from(INGEST_LOG_PATH, ingest_log_offset)
+        ingested = []
+        for entry in entries:
+            try:
+                ingested.append(ingest_match(entry['summary'], entry['batting'], entry['bowling']))
+            except ValueError as e:
+                print(f"Skipping logged match: {e}")
+        return ingested
+
+if ingest_log.size(INGEST_LOG_PATH):
+    print(f"Replayed {len(catch_up_ingest_log())} matches from {INGEST_LOG_PATH}")
+
+if DATA_BACKEND == 'sqlite':
+    sync_store()
+
+@app.before_request
+def follow_ingest_log():
+    if ingest_log.size(INGEST_LOG_PATH) > ingest_log_offset:
+        catch_up_ingest_log()
+
 # Routes
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/player/<player>')
+@cached_response
 def player(player):
     # Input validation
     if not player or len(player.strip()) == 0:
         return "Invalid player name", 400
         
     # Find player info with case-insensitive match
-    player_obj = None
-    for p in players.values():
-        if p['name'].lower() == player.lower():
-            player_obj = p
-            break
+    player_obj = query_player(player)
             
     if not player_obj:
         return render_template('search.html', 
@@ -305,20 +1875,13 @@ def player(player):
                              categories=[],
                              error=f"Player '{player}' not found")
 
-    # Load full_players_json.json for biography/history
-    try:
-        with open(os.path.join(DATA_DIR, 'full_players_json.json'), 'r', encoding='utf-8') as f:
-            full_players = json.load(f)
-    except Exception as e:
-        print(f"Error loading full_players_json.json: {e}")
-        full_players = []
+    # The page works on its own copy; the shared record is never changed
+    player_obj = dict(player_obj)
 
-    # Find matching player in full_players_json.json (case-insensitive)
-    player_bio = None
-    for fp in full_players:
-        if fp.get('full_name', '').lower() == player_obj['name'].lower():
-            player_bio = fp
-            break
+    if db_pool is not None:
+        player_bio = store.bio(db_pool, player_obj['name'])
+    else:
+        player_bio = query_bio(player_obj['name'])
 
     # Add biography/history fields to player_obj for template
     if player_bio:
@@ -330,57 +1893,43 @@ def player(player):
         player_obj['country'] = player_bio.get('country', '')
                              
     # Get Wikipedia summary with proper error handling
-    wiki_summary = None
-    try:
-        # Clean the player name for Wikipedia API
-        wiki_name = player_obj['name'].replace(' ', '_')
-        wiki_api = f"https://en.wikipedia.org/api/rest_v1/page/summary/{wiki_name}"
-        
-        # Add timeout and user-agent
-        headers = {'User-Agent': 'T20Analytics/1.0'}
-        resp = requests.get(wiki_api, headers=headers, timeout=5)
-        
-        if resp.status_code == 200:
-            wiki_data = resp.json()
-            wiki_summary = wiki_data.get('extract')
-        else:
-            print(f"Wikipedia API error: {resp.status_code}")
-    except RequestException as e:
-        print(f"Wikipedia request failed: {str(e)}")
-    except Exception as e:
-        print(f"Error fetching Wikipedia data: {str(e)}")
+    wiki_summary = fetch_wiki_summary(player_obj['name'])
 
     # Get match records from batting and bowling data
     match_records = []
     try:
+        if db_pool is not None:
+            batting_rows, bowling_rows = store.scorecard_rows(db_pool, player_obj['name'])
+        else:
+            key = player_obj['name'].lower()
+            batting_rows = [innings for match in batting_json for innings in match.get('battingSummary', [])
+                            if innings.get('batsmanName', '').lower() == key]
+            bowling_rows = [spell for match in bowling_json for spell in match.get('bowlingSummary', [])
+                            if spell.get('bowlerName', '').lower() == key]
         # Get batting records
-        for match in batting_json:
-            for innings in match.get('battingSummary', []):
-                if innings.get('batsmanName', '').lower() == player_obj['name'].lower():
-                    record = {
-                        'type': 'batting',
-                        'runs': innings.get('runs', '0'),
-                        'balls': innings.get('balls', '0'),
-                        '4s': innings.get('4s', '0'),
-                        '6s': innings.get('6s', '0'),
-                        'sr': innings.get('strikeRate', '0'),
-                        'team': innings.get('teamInnings', '')
-                    }
-                    match_records.append(record)
-                    
+        for innings in batting_rows:
+            record = {
+                'type': 'batting',
+                'runs': innings.get('runs', '0'),
+                'balls': innings.get('balls', '0'),
+                '4s': innings.get('4s', '0'),
+                '6s': innings.get('6s', '0'),
+                'sr': innings.get('strikeRate', '0'),
+                'team': innings.get('teamInnings', '')
+            }
+            match_records.append(record)
+
         # Get bowling records
-        for match in bowling_json:
-            for spell in match.get('bowlingSummary', []):
-                if spell.get('bowlerName', '').lower() == player_obj['name'].lower():
-                    record = {
-                        'type': 'bowling',
-                        'overs': spell.get('overs', '0'),
-                        'wickets': spell.get('wickets', '0'),
-                        'runs': spell.get('runs', '0'),
-                        'economy': spell.get('economy', '0'),
-                        'team': spell.get('bowlingTeam', '')
-                    }
-                    match_records.append(record)
+        for spell in bowling_rows:
+            record = {
+                'type': 'bowling',
+                'overs': spell.get('overs', '0'),
+                'wickets': spell.get('wickets', '0'),
+                'runs': spell.get('runs', '0'),
+                'economy': spell.get('economy', '0'),
+                'team': spell.get('bowlingTeam', '')
+            }
+            match_records.append(record)
     except Exception as e:
         print(f"Error processing match records: {str(e)}")
         
@@ -391,9 +1940,11 @@ def player(player):
     return render_template('player.html', 
                          player=player_obj, 
                          wiki_summary=wiki_summary, 
-                         match_records=match_records)
+                         match_records=match_records,
+                         percentiles=query_percentiles(player_obj['name']))
 
 @app.route('/search')
+@cached_response
 def search():
     query = request.args.get('q', '').strip()
     if not query:
@@ -428,96 +1979,329 @@ def best11():
     return render_template('best11.html')
 
 @app.route('/team/<team>')
+@cached_response
 def team(team):
-    team_players = [p for p in players.values() if p.get('team','').lower() == team.lower()]
-    role_order = {'Batter': 1, 'Opening Batter': 1, 'Top Order Batter': 1,
-                  'Allrounder': 2, 'Bowling Allrounder': 2,
-                  'Bowler': 3, 'Opening Bowler': 3}
-    team_players.sort(key=lambda p: (role_order.get(p.get('playingRole', ''), 4), p.get('name', '')))
-    for p in team_players:
+    team_players = []
+    for p in query_team(team):
         name = (p.get('name') or '')
         img_name = re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
-        p['img_name'] = img_name
+        team_players.append(dict(p, img_name=img_name))
     return render_template('team.html', team=team, team_players=team_players)
 
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
+    # conditional=True gives ETag/304 and Range (206) handling; the file body is
+    # returned through wsgi.file_wrapper so gunicorn can use sendfile().
+    if path in hashed_static:
+        resp = send_from_directory(STATIC_DIR, path, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+        resp.headers['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return resp
+    return send_from_directory(STATIC_DIR, path, conditional=True)
 
 # API Routes
 @app.route('/api/teams')
+@cached_response
 def api_teams():
-    teams = set(p.get('team', '') for p in players.values())
-    return jsonify(sorted(list(teams)))
+    return jsonify(query_teams())
 
 @app.route('/api/team/<team>')
+@cached_response
 def api_team(team):
-    team_players = [p for p in players.values() if p.get('team', '').lower() == team.lower()]
-    role_order = {'Batter': 1, 'Opening Batter': 1, 'Top Order Batter': 1,
-                  'Allrounder': 2, 'Bowling Allrounder': 2,
-                  'Bowler': 3, 'Opening Bowler': 3}
-    team_players.sort(key=lambda p: (role_order.get(p.get('playingRole', ''), 4), p.get('name', '')))
-    return jsonify(team_players)
+    return jsonify(query_team(team))
+
+@app.route('/api/team/<team>/summary')
+@cached_response
+def api_team_summary(team):
+    summary = query_team_summary(team)
+    if summary is None:
+        return jsonify({'error': 'team not found'}), 404
+    return jsonify(summary)
+
+@app.route('/api/standings')
+@cached_response
+def api_standings():
+    return jsonify(query_standings())
+
+@app.route('/api/simulate')
+def api_simulate():
+    # /api/simulate?teams=India,England,Pakistan,New Zealand&n=100000&seed=7
+    # /api/simulate?from=40&xi=India:Rohit Sharma|Virat Kohli|...
+    try:
+        result = query_simulate(request.args.get('teams'), request.args.get('n', SIMULATION_DEFAULT_N),
+                                request.args.get('seed'), request.args.getlist('xi'), request.args.get('from'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(result)
+
+@app.route('/api/player/<name>')
+@cached_response
+def api_player(name):
+    p = query_player(name)
+    if p is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(dict(p, percentiles=query_percentiles(name)))
+
+@app.route('/api/player/<name>/similar')
+@cached_response
+def api_player_similar(name):
+    try:
+        matched = query_similar(name, request.args.get('k', 10))
+    except ValueError:
+        return jsonify({'error': 'k must be an integer'}), 400
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/player/<name>/dismissals')
+@cached_response
+def api_player_dismissals(name):
+    matched = query_dismissals(name)
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/h2h')
+@cached_response
+def api_h2h():
+    # /api/h2h?batter=Kusal Mendis†&bowler=Chris Woakes
+    matched = query_h2h(request.args.get('batter', ''), request.args.get('bowler', ''))
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/match/<match_id>')
+@cached_response
+def api_match(match_id):
+    m = query_match(match_id)
+    if m is None:
+        return jsonify({'error': 'match not found'}), 404
+    return jsonify({k: v for k, v in m.items() if k != 'summary'})
+
+@app.route('/api/matches')
+@cached_response
+def api_matches():
+    # /api/matches?team=India&ground=Melbourne&date=2022-10-23
+    try:
+        matched = query_matches(request.args.get('team'), request.args.get('ground'), request.args.get('date'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(matched)
+
+@app.route('/api/player/<name>/form')
+@cached_response
+def api_player_form(name):
+    # /api/player/Virat Kohli/form?window=3
+    try:
+        matched = query_form(name, request.args.get('window'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/player/<name>/venues')
+@cached_response
+def api_player_venues(name):
+    matched = query_player_venues(name)
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/venues')
+@cached_response
+def api_venues():
+    return jsonify(query_venues())
+
+@app.route('/api/venue/<ground>')
+@cached_response
+def api_venue(ground):
+    matched = query_venue(ground)
+    if matched is None:
+        return jsonify({'error': 'venue not found'}), 404
+    return jsonify(matched)
+
+@app.route('/api/player/<name>/intervals')
+@cached_response
+def api_player_intervals(name):
+    matched = query_intervals(name)
+    if matched is None:
+        return jsonify({'error': 'player not found'}), 404
+    return jsonify(matched)
 
 @app.route('/api/players')
+@cached_response
 def api_players():
     return jsonify(list(players.values()))
 
 @app.route('/api/category/<cat>')
+@cached_response
 def api_category(cat):
-    func = CATEGORY_FUNCS.get(cat)
-    if not func:
+    matched = query_category(cat)
+    if matched is None:
         return jsonify({'error':'unknown category'}), 400
-    matched = [p for p in players.values() if func(p)]
-    
-    if cat == 'fast' and not matched:
-        matched = [p for p in players.values() if ('fast' in (p.get('bowlingStyle') or '').lower() or 'pace' in (p.get('bowlingStyle') or '').lower()) and (p.get('wickets',0) > 2 or (p.get('economy') is not None and p.get('economy') < 9))]
-    
-    if cat == 'power':
-        matched.sort(key=lambda x: x.get('runs',0), reverse=True)
-    elif cat == 'anchor':
-        matched.sort(key=lambda x: x.get('bat_avg',0), reverse=True)
-    elif cat == 'finisher':
-        matched.sort(key=lambda x: x.get('strike_rate',0), reverse=True)
-    elif cat == 'allrounder':
-        matched.sort(key=lambda x: (x.get('wickets',0)+x.get('runs',0)/10), reverse=True)
-    elif cat == 'fast':
-        matched.sort(key=lambda x: x.get('wickets',0), reverse=True)
     return jsonify(matched)
 
 @app.route('/api/best11')
+@cached_response
 def api_best11():
-    picks = []
-    def pick(cat, n):
-        resp = api_category(cat).get_json()
-        if isinstance(resp, dict) and resp.get('error'):
-            return []
-        return resp[:n]
-    picks += pick('power',3)
-    picks += pick('anchor',2)
-    picks += pick('finisher',2)
-    picks += pick('allrounder',2)
-    picks += pick('fast',2)
-    
-    seen = set()
-    uniq = []
-    for p in picks:
-        if p['name'] not in seen:
-            seen.add(p['name'])
-            uniq.append(p)
-        if len(uniq) >= 11:
-            break
-    return jsonify(uniq)
+    # Optional: ?weights=runs:1,wickets:20&max_per_team=3&team=India&detail=1
+    constraints = {k: v for k, v in request.args.items() if k in selection.DEFAULT_CONSTRAINTS}
+    try:
+        result = query_best11(request.args.get('weights'), constraints)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if request.args.get('detail') == '1':
+        return jsonify(result)
+    return jsonify(result['players'])
 
-@app.route('/api/log', methods=['POST'])
-def api_log():
+@app.route('/api/leaderboard/<stat>')
+@cached_response
+def api_leaderboard(stat):
+    # /api/leaderboard/dot_pct?min_overs=10&limit=20 (order=asc|desc, team=...)
+    minimums = {k[4:]: v for k, v in request.args.items() if k.startswith('min_')}
     try:
-        data = json.loads(request.data.decode('utf-8')) if request.data else {}
+        board = query_leaderboard(stat, limit=request.args.get('limit', 10), order=request.args.get('order'),
+                                  minimums=minimums, team=request.args.get('team'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(board)
+
+@app.route('/api/leaderboard/fielding')
+@cached_response
+def api_leaderboard_fielding():
+    try:
+        board = query_fielding_leaderboard(limit=request.args.get('limit', 10), team=request.args.get('team'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(board)
+
+@app.route('/api/cube')
+@cached_response
+def api_cube():
+    # /api/cube?dims=team,battingStyle&measures=runs,strike_rate&team=India
+    filters = {k: v for k, v in request.args.items() if k in cube.DIMENSIONS}
+    try:
+        cells = query_cube(request.args.get('dims', ''), request.args.get('measures'), filters)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(cells)
+
+@app.route('/api/query')
+@cached_response
+def api_query():
+    # /api/query?where=strike_rate>140,innings>3&sort=-runs&limit=20
+    try:
+        matched = query_where(request.args.get('where', ''), request.args.get('sort'), request.args.get('limit', 100))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(matched)
+
+@app.route('/api/batch', methods=['POST'])
+def api_batch():
+    # Body: {"queries": [{"type": "team", "team": "India"}, {"type": "category", "cat": "power"}, ...]}
+    # Each result is {"data": ...} or {"error": ...} in the same order as the queries.
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list):
+        return jsonify({'error': 'expected {"queries": [...]}'}), 400
+    if len(queries) > BATCH_MAX_QUERIES:
+        return jsonify({'error': f'at most {BATCH_MAX_QUERIES} queries per batch'}), 400
+    # the request itself took one heavy token; the other heavy queries pay here
+    heavy = sum(1 for q in queries if isinstance(q, dict) and q.get('type') in BATCH_HEAVY_TYPES)
+    burst = route_limits['heavy'][1]
+    if heavy > burst:
+        return jsonify({'error': f'at most {burst} {"/".join(BATCH_HEAVY_TYPES)} queries per batch'}), 400
+    wait = charge('heavy', heavy - 1, request.remote_addr, request.headers.get('X-Forwarded-For'))
+    if wait:
+        record_shed('heavy', 'rate_limited')
+        resp = jsonify({'error': 'rate limited', 'retry_after': limits.retry_after(wait)})
+        resp.headers['Retry-After'] = str(limits.retry_after(wait))
+        return resp, 429
+    budget = {'matches': SIMULATION_MAX_MATCHES}
+    results = []
+    for q in queries:
+        try:
+            results.append(run_batch_query(q, budget))
+        except (TypeError, AttributeError) as e:
+            # a field of the wrong type that the checks above don't cover
+            results.append({'error': f'invalid query: {e}'})
+    return jsonify({'results': results})
+
+def parse_client_log(body):
+    try:
+        return json.loads(body.decode('utf-8')) if body else {}
     except Exception:
-        data = {}
+        return {}
+
+def write_client_log(data):
     os.makedirs('logs', exist_ok=True)
     with open(os.path.join('logs','client_errors.log'), 'a', encoding='utf-8') as f:
         f.write(json.dumps(data, ensure_ascii=False) + "\n")
+
+@app.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    # Body: {"summary": {...}, "batting": [...], "bowling": [...]} in the
+    # source format, with "Authorization: Bearer <INGEST_TOKEN>"
+    if not INGEST_TOKEN:
+        return jsonify({'error': 'ingest is not enabled'}), 404
+    if not secrets.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + INGEST_TOKEN):
+        return jsonify({'error': 'unauthorized'}), 401
+    entry = request.get_json(silent=True)
+    try:
+        ingest_log.validate(entry)
+        mid = match_id_for(entry['summary'], len(match_summaries))
+        if mid in match_indexes['matches']:
+            return jsonify({'error': f'match {mid} is already loaded'}), 409
+        ingest_log.append(INGEST_LOG_PATH, entry)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    catch_up_ingest_log()
+    match = query_match(mid)
+    return jsonify({'match': match['summary'] if match else None, 'cache_version': cache_version}), 201
+
+@app.route('/api/limits')
+def api_limits():
+    # configured limits, this worker's load, refused requests (all workers)
+    try:
+        shed = shed_counter.shed_counts()
+    except Exception as e:
+        print(f"Could not read refused request counts: {e}")
+        shed = {}
+    return jsonify({
+        'limits': {c: {'rate': r, 'burst': b} for c, (r, b) in route_limits.items()},
+        'shared': limiter is not None,
+        'in_flight': admission_gate.in_flight,
+        'max_in_flight': MAX_IN_FLIGHT,
+        'shed': [{'route_class': c, 'reason': r, 'count': n} for (c, r), n in sorted(shed.items())]
+    })
+
+@app.route('/metrics')
+def metrics_page():
+    # Prometheus text format, all workers
+    if metrics_registry is None:
+        return ('Metrics are off\n', 404, {'Content-Type': 'text/plain; charset=utf-8'})
+    try:
+        samples = metrics_registry.samples()
+        shed = shed_counter.shed_counts()
+    except Exception as e:
+        print(f"Could not read metrics: {e}")
+        return ('Metrics unavailable\n', 503, {'Content-Type': 'text/plain; charset=utf-8'})
+    lookups = defaultdict(lambda: [0, 0])
+    for family, _, labels, value in samples:
+        if family == 't20_cache_requests_total':
+            labels = dict(labels)
+            lookups[labels['cache']][labels['result'] == 'hit'] += value
+    extra = [
+        ('t20_cache_hit_ratio', 'gauge', 'Share of shared cache lookups that were hits.',
+         [('t20_cache_hit_ratio', (('cache', c),), hits / (hits + misses)) for c, (misses, hits) in sorted(lookups.items())]),
+        ('t20_requests_shed_total', 'counter', 'Requests refused by rate limiting or admission control.',
+         [('t20_requests_shed_total', (('reason', r), ('route_class', c)), n) for (c, r), n in sorted(shed.items())])
+    ]
+    return app.response_class(metrics_registry.render(samples, extra), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/log', methods=['POST'])
+def api_log():
+    write_client_log(parse_client_log(request.data))
     return ('', 204)
 
 if __name__ == "__main__":
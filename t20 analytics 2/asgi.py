@@ -0,0 +1,172 @@
+import asyncio
+import io
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as wsgi
+
+# ASGI entry point, next to the WSGI app:app:
+#
+#   uvicorn asgi:app --workers 4
+#   gunicorn -w 4 -k uvicorn.workers.UvicornWorker asgi:app
+#
+# Requests still run through the Flask app (the same routes, cache and
+# templates), on a fixed pool of page threads per worker. The slow I/O runs
+# on the event loop instead of holding one of those threads:
+# - /player/<name>: the Wikipedia summary is awaited before the page runs
+#   and handed to it through the WSGI environ (app.WIKI_PREFETCH_KEY), so a
+#   page thread never waits on Wikipedia.
+# - POST /api/log: answered here; the file append is awaited.
+# Rate limiting and the admission gate (app.admit) run before either, so a
+# refused request never waits on I/O. Request metrics are timed from here
+# (app.REQUEST_START_KEY); the responses answered here are recorded here.
+# A worker then has as many slow requests in flight as there are clients,
+# while PAGE_THREADS bounds only the CPU-bound part. There is no async HTTP
+# client in the dependencies, so blocking calls are awaited on a separate
+# pool of OUTBOUND_THREADS.
+
+PAGE_THREADS = int(os.environ.get('ASYNC_PAGE_THREADS', 8))
+OUTBOUND_THREADS = int(os.environ.get('ASYNC_OUTBOUND_THREADS', 64))
+PLAYER_PAGE_RE = re.compile(r'^/player/([^/]+)$')
+
+# Here a request is admitted before it takes a page thread and holds its
+# gate slot while it waits on outbound calls, so unless MAX_IN_FLIGHT is set
+# the gate is sized from both pools rather than from WEB_THREADS.
+if 'MAX_IN_FLIGHT' not in os.environ:
+    wsgi.MAX_IN_FLIGHT = wsgi.admission_gate.limit = PAGE_THREADS + OUTBOUND_THREADS
+
+page_pool = ThreadPoolExecutor(PAGE_THREADS, thread_name_prefix='page')
+outbound_pool = ThreadPoolExecutor(OUTBOUND_THREADS, thread_name_prefix='outbound')
+
+def run_page(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(page_pool, fn, *args)
+
+def run_outbound(fn, *args):
+    return asyncio.get_running_loop().run_in_executor(outbound_pool, fn, *args)
+
+def wsgi_environ(scope, body):
+    # PEP 3333 strings are latin-1 decoded bytes; ASGI gives the path decoded
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False
+    }
+    for name, value in scope.get('headers', []):
+        key = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = 'HTTP_' + key
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+def call_wsgi(environ):
+    # runs on a page thread; returns (status, headers, body)
+    response = {}
+    chunks = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+        return chunks.append
+
+    result = wsgi.app(environ, start_response)
+    try:
+        for chunk in result:
+            chunks.append(chunk)
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return response['status'], response['headers'], b''.join(chunks)
+
+async def read_body(receive):
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(body)
+
+async def send_response(send, status, headers, body):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def fetch_wiki_summary(name):
+    found, summary = await run_outbound(wsgi.cached_wiki_summary, name)
+    if found:
+        return summary
+    return await run_outbound(wsgi.request_wiki_summary, name)
+
+async def prefetch(environ, path):
+    # Outbound calls the page will make, awaited here
+    m = PLAYER_PAGE_RE.match(path)
+    if m is None:
+        return
+    player = await run_page(wsgi.query_player, m.group(1))
+    if player:
+        environ[wsgi.WIKI_PREFETCH_KEY] = {player['name']: await fetch_wiki_summary(player['name'])}
+
+async def respond(send, scope, start, status, headers, body):
+    # a response that doesn't go through the Flask app
+    await send_response(send, status, headers, body)
+    await run_outbound(wsgi.observe_request, scope['method'], wsgi.route_label(scope['path'], scope['method']),
+                       scope['path'], status, len(body), time.perf_counter() - start)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            page_pool.shutdown(wait=False)
+            outbound_pool.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        raise ValueError(f"unsupported ASGI scope: {scope['type']}")
+    start = time.perf_counter()
+    body = await read_body(receive)
+    environ = wsgi_environ(scope, body)
+    environ[wsgi.REQUEST_START_KEY] = start
+    # admission first, so a refused request costs no outbound call
+    refusal, entered = await run_outbound(wsgi.admit, scope['path'], environ['REMOTE_ADDR'],
+                                          environ.get('HTTP_X_FORWARDED_FOR'))
+    if refusal is not None:
+        content_type, text = wsgi.refusal_body(scope['path'], refusal)
+        return await respond(send, scope, start, refusal[0], [('Content-Type', content_type),
+                                                             ('Retry-After', str(refusal[1]))], text)
+    environ[wsgi.ADMITTED_KEY] = True
+    try:
+        if scope['method'] == 'POST' and scope['path'] == '/api/log':
+            await run_outbound(wsgi.write_client_log, wsgi.parse_client_log(body))
+            return await respond(send, scope, start, 204, [], b'')
+        if scope['method'] == 'GET':
+            await prefetch(environ, scope['path'])
+        status, headers, body = await run_page(call_wsgi, environ)
+        await send_response(send, status, headers, body)
+    finally:
+        if entered:
+            wsgi.admission_gate.leave()
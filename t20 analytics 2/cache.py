@@ -0,0 +1,238 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Response cache shared by the gunicorn workers. The backends all provide
+# the subset of the redis-py client the app uses, get(name), set(name, value,
+# ex=seconds), delete(*names), exists(*names), ttl(name), dbsize() and
+# flushdb(), with values stored and returned as bytes, so a Redis server can
+# replace the local backend without changes to the callers:
+#
+#   sqlite:///data/cache.db  one SQLite file (WAL mode) that every worker on
+#                            the host reads and writes (default)
+#   memory://                a per-process LRU, not shared
+#   redis://host:6379/0      a Redis server (needs the redis package)
+#
+# The local backends expire entries by TTL and evict the least recently
+# used ones when the cache is over max_entries or max_bytes. A Redis server
+# does the same through its own maxmemory settings.
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 20000
+# A read refreshes an entry's LRU time at most this often (seconds), so hits
+# rarely need a write
+ACCESS_RESOLUTION = 30
+# Sets between size checks in each process; eviction goes down to
+# EVICT_TARGET of the limits so it doesn't run on every set
+EVICT_EVERY = 100
+EVICT_TARGET = 0.9
+
+def _bytes(value):
+    # as redis-py encodes values
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return value.encode('utf-8')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return repr(value).encode('utf-8')
+    raise TypeError(f'cannot store a value of type {type(value).__name__}')
+
+def _key(name):
+    return name.decode('utf-8') if isinstance(name, bytes) else str(name)
+
+class SQLiteCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+
+    def _conn(self):
+        # one connection per thread; a connection inherited across fork() is
+        # not reused
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, size INTEGER, '
+                     'expires REAL, accessed REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache (accessed)')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, name):
+        key = _key(name)
+        conn = self._conn()
+        row = conn.execute('SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires, accessed = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return None
+        if accessed < now - ACCESS_RESOLUTION:
+            conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return bytes(value)
+
+    def set(self, name, value, ex=None):
+        value = _bytes(value)
+        if len(value) > self.max_bytes // 4:
+            # one entry may not push out a quarter of the cache
+            return False
+        now = time.time()
+        expires = now + ex if ex is not None else None
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)', (_key(name), value, len(value), expires, now))
+        self._sets += 1
+        if self._sets >= EVICT_EVERY:
+            self._sets = 0
+            self.evict()
+        return True
+
+    def delete(self, *names):
+        conn = self._conn()
+        return sum(conn.execute('DELETE FROM cache WHERE key = ?', (_key(n),)).rowcount for n in names)
+
+    def exists(self, *names):
+        return sum(1 for n in names if self.get(n) is not None)
+
+    def ttl(self, name):
+        # seconds left; -1 with no expiry and -2 if missing, as in Redis
+        row = self._conn().execute('SELECT expires FROM cache WHERE key = ?', (_key(name),)).fetchone()
+        if row is None:
+            return -2
+        if row[0] is None:
+            return -1
+        left = row[0] - time.time()
+        return int(left + 0.5) if left > 0 else -2
+
+    def dbsize(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def flushdb(self):
+        self._conn().execute('DELETE FROM cache')
+        return True
+
+    def evict(self):
+        # drop expired entries, then least recently used ones until the cache
+        # is back under EVICT_TARGET of its limits
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+            if count > self.max_entries or size > self.max_bytes:
+                conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+                count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache').fetchone()
+                drop = []
+                max_count, max_size = self.max_entries * EVICT_TARGET, self.max_bytes * EVICT_TARGET
+                for key, entry_size in conn.execute('SELECT key, size FROM cache ORDER BY accessed'):
+                    if count <= max_count and size <= max_size:
+                        break
+                    drop.append((key,))
+                    count -= 1
+                    size -= entry_size
+                conn.executemany('DELETE FROM cache WHERE key = ?', drop)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+class MemoryCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires), oldest first
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self._drop(key)
+            return None
+        return entry
+
+    def _drop(self, key):
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+    def get(self, name):
+        key = _key(name)
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, name, value, ex=None):
+        value = _bytes(value)
+        if len(value) > self.max_bytes // 4:
+            return False
+        key = _key(name)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (value, time.time() + ex if ex is not None else None)
+            self._size += len(value)
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            found = [k for k in map(_key, names) if k in self._entries]
+            for k in found:
+                self._drop(k)
+        return len(found)
+
+    def exists(self, *names):
+        with self._lock:
+            return sum(1 for n in names if self._live(_key(n)) is not None)
+
+    def ttl(self, name):
+        with self._lock:
+            entry = self._live(_key(name))
+        if entry is None:
+            return -2
+        if entry[1] is None:
+            return -1
+        return int(entry[1] - time.time() + 0.5)
+
+    def dbsize(self):
+        with self._lock:
+            return len(self._entries)
+
+    def flushdb(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        return True
+
+def from_url(url, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES):
+    # None for '' / 'off'. sqlite:///relative/path, sqlite:////absolute/path
+    # as in SQLAlchemy URLs. Raises ValueError for anything else.
+    url = (url or '').strip()
+    if url.lower() in ('', 'off', 'none'):
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteCache(url[len('sqlite:///'):], max_bytes, max_entries)
+    if url.startswith('memory://'):
+        return MemoryCache(max_bytes, max_entries)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError(f'{url} needs the redis package (pip install redis)') from None
+        return redis.Redis.from_url(url)
+    raise ValueError(f'unsupported cache URL: {url}')
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import the app modules from this folder and, like the app and the
+# scripts, read data/ relative to it.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
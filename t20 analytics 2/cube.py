@@ -0,0 +1,128 @@
+import numpy as np
+
+# Pre-aggregated cube over player attributes for /api/cube. Players are
+# grouped once into a base cuboid over every dimension; each of the 2^d
+# coarser cuboids is rolled up from the base with a bincount per measure.
+# Only additive measures are stored; rates such as strike_rate are derived
+# from the summed numerators and denominators of a cell, so they stay exact
+# at every level of the cube. After an ingest, update_rows moves the touched
+# players' measures between cells instead of rebuilding.
+
+DIMENSIONS = ['team', 'battingStyle', 'bowlingStyle', 'playingRole', 'batting_position']
+
+ADDITIVE = ['players', 'runs', 'balls', '4s', '6s', 'innings', 'wickets', 'runs_conceded', 'balls_bowled',
+            'dot_balls', 'maiden', 'catches', 'stumpings', 'run_outs', 'fielding_dismissals']
+
+def _ratio(num, den, scale=1.0):
+    return round(scale * num / den, 2) if den else None
+
+# same formulas as aggregate_batting / aggregate_bowling
+DERIVED = {
+    'strike_rate': lambda m: _ratio(m['runs'], m['balls'], 100),
+    'bat_avg': lambda m: _ratio(m['runs'], m['innings']),
+    'boundary_pct': lambda m: _ratio((m['4s'] + m['6s']) * 4, m['runs'], 100),
+    'avg_ball_faced': lambda m: _ratio(m['balls'], m['innings']),
+    'economy': lambda m: _ratio(m['runs_conceded'], m['balls_bowled'], 6),
+    'bowling_sr': lambda m: _ratio(m['balls_bowled'], m['wickets']),
+    'bowling_avg': lambda m: _ratio(m['runs_conceded'], m['wickets']),
+    'dot_pct': lambda m: _ratio(m['dot_balls'], m['balls_bowled'], 100)
+}
+
+def _label_key(v):
+    return (v is None, v if v is not None else '')
+
+def _measures(rows):
+    return {m: np.array([1.0 if m == 'players' else float(p.get(m) or 0) for p in rows]) for m in ADDITIVE}
+
+def build_cube(rows):
+    labels = {}
+    codes = np.zeros((len(rows), len(DIMENSIONS)), dtype=np.int64)
+    for j, dim in enumerate(DIMENSIONS):
+        values = [p.get(dim) for p in rows]
+        labels[dim] = sorted(set(values), key=_label_key)
+        lookup = {v: i for i, v in enumerate(labels[dim])}
+        codes[:, j] = [lookup[v] for v in values]
+    measures = _measures(rows)
+    base_keys, inverse = np.unique(codes, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    base = {m: np.bincount(inverse, weights=v, minlength=len(base_keys)) for m, v in measures.items()}
+    cuboids = {}
+    for mask in range(1 << len(DIMENSIONS)):
+        cols = [j for j in range(len(DIMENSIONS)) if mask >> j & 1]
+        if cols:
+            keys, inv = np.unique(base_keys[:, cols], axis=0, return_inverse=True)
+            inv = inv.ravel()
+        else:
+            keys, inv = np.zeros((1, 0), dtype=np.int64), np.zeros(len(base_keys), dtype=np.int64)
+        cuboids[tuple(DIMENSIONS[j] for j in cols)] = {
+            'keys': keys,
+            'cols': cols,
+            'cells': {tuple(k): i for i, k in enumerate(keys.tolist())},
+            'sums': {m: np.bincount(inv, weights=v, minlength=len(keys)) for m, v in base.items()}
+        }
+    # per player, to take their old contribution out on update_rows
+    return {'labels': labels, 'cuboids': cuboids, 'codes': codes, 'measures': measures}
+
+def update_rows(cube, rows, row_ids):
+    # Moves the measures of rows[i] (i in row_ids) from the cells they were
+    # counted in to the cells they belong in now. Returns False, changing
+    # nothing, when a row needs a label or cell the cube doesn't have; the
+    # caller then rebuilds.
+    row_ids = list(row_ids)
+    lookups = {dim: {v: i for i, v in enumerate(cube['labels'][dim])} for dim in DIMENSIONS}
+    new_codes = []
+    for i in row_ids:
+        values = [rows[i].get(dim) for dim in DIMENSIONS]
+        if any(v not in lookups[dim] for dim, v in zip(DIMENSIONS, values)):
+            return False
+        new_codes.append([lookups[dim][v] for dim, v in zip(DIMENSIONS, values)])
+    new_codes = np.array(new_codes, dtype=np.int64).reshape(len(row_ids), len(DIMENSIONS))
+    moves = []
+    for cuboid in cube['cuboids'].values():
+        cols = cuboid['cols']
+        old = [cuboid['cells'][tuple(k)] for k in cube['codes'][row_ids][:, cols].tolist()]
+        new = [cuboid['cells'].get(tuple(k)) for k in new_codes[:, cols].tolist()]
+        if None in new:
+            return False
+        moves.append((cuboid, old, new))
+    new_measures = _measures([rows[i] for i in row_ids])
+    for cuboid, old, new in moves:
+        for m, sums in cuboid['sums'].items():
+            np.subtract.at(sums, old, cube['measures'][m][row_ids])
+            np.add.at(sums, new, new_measures[m])
+    cube['codes'][row_ids] = new_codes
+    for m, values in new_measures.items():
+        cube['measures'][m][row_ids] = values
+    return True
+
+def query_cube(cube, dims, measures, filters=None):
+    # dims: ["team", "battingStyle"]; measures: ["runs", "strike_rate"];
+    # filters: {"team": "india"} keeps matching cells. Raises ValueError.
+    for d in dims:
+        if d not in DIMENSIONS:
+            raise ValueError(f'unknown dimension: {d}')
+    if len(set(dims)) != len(dims):
+        raise ValueError('a dimension appears twice')
+    for m in measures:
+        if m not in ADDITIVE and m not in DERIVED:
+            raise ValueError(f'unknown measure: {m}')
+    filters = {k: str(v).lower() for k, v in (filters or {}).items()}
+    for d in filters:
+        if d not in dims:
+            raise ValueError(f'filter on {d} needs it in dims')
+    canonical = tuple(d for d in DIMENSIONS if d in dims)
+    cuboid = cube['cuboids'][canonical]
+    cells = []
+    for i, key in enumerate(cuboid['keys']):
+        cell = {d: cube['labels'][d][key[canonical.index(d)]] for d in dims}
+        if any(str(cell[d] if cell[d] is not None else '').lower() != v for d, v in filters.items()):
+            continue
+        sums = {m: int(cuboid['sums'][m][i]) for m in ADDITIVE}
+        if not sums['players']:
+            # emptied by update_rows
+            continue
+        for m in measures:
+            cell[m] = DERIVED[m](sums) if m in DERIVED else sums[m]
+        cells.append(cell)
+    cells.sort(key=lambda c: [_label_key(c[d]) for d in dims])
+    return cells
@@ -0,0 +1,216 @@
+import re
+from collections import defaultdict
+
+# Dismissal parsing for the batting scorecards. Each `dismissal` string
+# ("c Pramod Madushan b Chameera", "run out (sub [KNA Bandara]/†Mendis)") is
+# parsed once at load into a structured record, and the short scorecard names
+# are resolved to full player names through an alias index scoped by team.
+
+DISMISSAL_PATTERNS = [
+    ('caught_and_bowled', re.compile(r'^c\s*&\s*b\s+(?P<bowler>.+)$')),
+    ('caught', re.compile(r'^c\s+(?P<fielder>.+?)\s+b\s+(?P<bowler>.+)$')),
+    ('stumped', re.compile(r'^st\s+(?P<fielder>.+?)\s+b\s+(?P<bowler>.+)$')),
+    ('lbw', re.compile(r'^lbw\s+b\s+(?P<bowler>.+)$')),
+    ('hit_wicket', re.compile(r'^hit wicket\s+b\s+(?P<bowler>.+)$')),
+    ('bowled', re.compile(r'^b\s+(?P<bowler>.+)$')),
+    ('run_out', re.compile(r'^run out\s*\((?P<fielders>.*)\)$'))
+]
+# Dismissals credited to the bowler
+BOWLER_TYPES = {'caught_and_bowled', 'caught', 'stumped', 'lbw', 'hit_wicket', 'bowled'}
+
+SUB_RE = re.compile(r'^sub\s*[\[(](?P<name>[^\])]*)[\])]$')
+INITIALS_RE = re.compile(r'^[A-Z]{1,4}$')
+
+def clean_name(name):
+    # "Jos Buttler(c)†" -> "jos buttler"
+    name = (name or '').replace('†', '').replace('(c)', '')
+    return ' '.join(name.lower().split())
+
+def parse_fielder(text):
+    # "†Mendis" -> ("Mendis", keeper, not sub); "sub (DJ Hooda)" -> ("DJ Hooda", sub)
+    text = text.strip()
+    sub = SUB_RE.match(text)
+    name = sub.group('name') if sub else text
+    return {'name': name.replace('†', '').strip(), 'keeper': '†' in text, 'sub': bool(sub)}
+
+def parse_dismissal(text):
+    # Returns None for not out, otherwise {"type", "bowler", "fielders"} with
+    # the names still in scorecard form.
+    text = (text or '').strip()
+    if not text:
+        return None
+    for kind, pattern in DISMISSAL_PATTERNS:
+        m = pattern.match(text)
+        if not m:
+            continue
+        groups = m.groupdict()
+        if kind == 'run_out':
+            fielders = [parse_fielder(f) for f in groups['fielders'].split('/') if f.strip()]
+            return {'type': kind, 'bowler': None, 'fielders': fielders}
+        bowler = groups['bowler'].strip()
+        if kind == 'caught_and_bowled':
+            fielders = [{'name': bowler, 'keeper': False, 'sub': False}]
+        elif groups.get('fielder'):
+            fielders = [parse_fielder(groups['fielder'])]
+        else:
+            fielders = []
+        return {'type': kind, 'bowler': bowler, 'fielders': fielders}
+    return {'type': 'other', 'bowler': None, 'fielders': []}
+
+def build_alias_index(player_list):
+    # {team: {alias: [full names]}} where the aliases of "Dushmantha Chameera"
+    # are every contiguous run of its tokens ("chameera", "dushmantha", ...).
+    index = defaultdict(lambda: defaultdict(list))
+    for p in player_list:
+        name = (p.get('name') or '').strip()
+        team = (p.get('team') or '').lower()
+        tokens = clean_name(name).split()
+        aliases = {' '.join(tokens[i:j]) for i in range(len(tokens)) for j in range(i + 1, len(tokens) + 1)}
+        for alias in aliases:
+            index[team][alias].append(name)
+    return {team: dict(aliases) for team, aliases in index.items()}
+
+def resolve_name(alias_index, short, team, prefer=()):
+    # Map a scorecard name to a full player name within `team`. Ambiguous
+    # aliases are narrowed to `prefer` (players who took part in the match);
+    # returns None when the name can't be pinned to one player.
+    aliases = alias_index.get((team or '').lower(), {})
+    key = clean_name(short)
+    tokens = short.replace('†', '').split()
+    if len(tokens) > 1 and INITIALS_RE.match(tokens[0]) and key not in aliases:
+        # "PWH de Silva": surname lookup, and the initials must cover every
+        # given name ("Wanindu Hasaranga de Silva" -> W, H)
+        initials = set(tokens[0].lower())
+        key = clean_name(' '.join(tokens[1:]))
+        cands = []
+        for n in aliases.get(key, []):
+            given = clean_name(n)[:-len(key)].split()
+            if given and all(g[0] in initials for g in given):
+                cands.append(n)
+    else:
+        cands = aliases.get(key, [])
+    if len(cands) > 1:
+        cands = [n for n in cands if n in prefer] or cands
+    if len(cands) > 1:
+        # full name beats surname ("Mitchell" is Daryl Mitchell, not Mitchell
+        # Santner), which beats any other part of the name
+        tier = lambda n: 2 if clean_name(n) == key else 1 if clean_name(n).endswith(' ' + key) else 0
+        best = max(tier(n) for n in cands)
+        cands = [n for n in cands if tier(n) == best]
+    if len({clean_name(n) for n in cands}) == 1:
+        # "Dasun Shanaka" and "Dasun Shanaka(c)" are the same player
+        return cands[0]
+    return None
+
+def other_team(match, team):
+    # "Namibia Vs Sri Lanka", "Namibia" -> "Sri Lanka"
+    sides = [s.strip() for s in (match or '').split(' Vs ')]
+    rest = [s for s in sides if s != team]
+    return rest[0] if len(sides) == 2 and rest else ''
+
+# The index is filled during the single ingest pass over the scorecards:
+# new_match() per match, add_spell() / add_batting_row() per parsed row
+# (schema.parse_bowling / parse_batting), then
+# finish_match() resolves the match's dismissals once every participant is
+# known, and finish_index() builds the per-player lists.
+
+def new_index():
+    return {'records': [], 'pairs': defaultdict(list), 'met': defaultdict(int), 'unresolved': 0}
+
+def new_match(match_index, match_id=None):
+    return {'match_index': match_index, 'match_id': match_id, 'bowlers': defaultdict(set), 'appeared': defaultdict(set), 'pending': []}
+
+def add_spell(match, s):
+    match['bowlers'][s['team']].add(s['name'])
+    match['appeared'][s['team']].add(s['name'])
+
+def add_batting_row(match, r):
+    batter = r['name']
+    if not batter:
+        return
+    batting_team = r['team']
+    match['appeared'][batting_team].add(batter)
+    match['pending'].append((r, batter, batting_team, parse_dismissal(r['dismissal'])))
+
+def finish_match(index, match, alias_index):
+    # Resolve the match's dismissals and record batter x bowler meetings.
+    # Returns the new records (for the fielding aggregate).
+    added = []
+    for r, batter, batting_team, parsed in match['pending']:
+        bowling_team = other_team(r['match'], batting_team)
+        innings_bowlers = match['bowlers'].get(bowling_team, set())
+        for b in innings_bowlers:
+            index['met'][(batter, b)] += 1
+        if parsed is None:
+            continue
+        bowler = None
+        if parsed['bowler']:
+            bowler = resolve_name(alias_index, parsed['bowler'], bowling_team, innings_bowlers)
+            index['unresolved'] += bowler is None
+        fielders = []
+        for f in parsed['fielders']:
+            name = resolve_name(alias_index, f['name'], bowling_team, match['appeared'].get(bowling_team, set()))
+            index['unresolved'] += name is None
+            fielders.append(dict(f, player=name))
+        record = {
+            'match_index': match['match_index'],
+            'match_id': match['match_id'],
+            'match': r['match'],
+            'batter': batter,
+            'batting_team': batting_team,
+            'bowling_team': bowling_team,
+            'type': parsed['type'],
+            'bowler': bowler,
+            'fielders': fielders,
+            'raw': r['dismissal'].strip()
+        }
+        added.append(record)
+        if bowler and parsed['type'] in BOWLER_TYPES:
+            index['pairs'][(batter, bowler)].append(record)
+    index['records'].extend(added)
+    return added
+
+def _player_lists(pairs, met, names=None):
+    # "dismissed by" / "dismissals of" lists, for `names` only when given
+    dismissed_by = defaultdict(list)
+    dismissals_of = defaultdict(list)
+    for (batter, bowler), recs in pairs.items():
+        if names is None or batter in names:
+            dismissed_by[batter].append({'bowler': bowler, 'count': len(recs), 'innings': met.get((batter, bowler), 0)})
+        if names is None or bowler in names:
+            dismissals_of[bowler].append({'batter': batter, 'count': len(recs), 'innings': met.get((batter, bowler), 0)})
+    for lists in (dismissed_by, dismissals_of):
+        for entries in lists.values():
+            entries.sort(key=lambda e: (-e['count'], e.get('bowler') or e.get('batter')))
+    return dismissed_by, dismissals_of
+
+def finish_index(index):
+    # Sparse batter x bowler matrix ({(batter, bowler): [record, ...]}), how
+    # often each pair met (batter batted in an innings the bowler bowled in)
+    # and per player "dismissed by" / "dismissals of" counts.
+    pairs, met = index['pairs'], index['met']
+    dismissed_by, dismissals_of = _player_lists(pairs, met)
+    return {
+        'records': index['records'],
+        'pairs': dict(pairs),
+        'met': dict(met),
+        'dismissed_by': dict(dismissed_by),
+        'dismissals_of': dict(dismissals_of),
+        'unresolved': index['unresolved']
+    }
+
+def refresh_index(finished, index, names):
+    # finish_index for one more match, in place: only pairs with a player
+    # of the match (`names`) can have changed, so only their entries and
+    # the lists of those players are rebuilt.
+    names = set(names)
+    for key, n in index['met'].items():
+        if key[0] in names or key[1] in names:
+            finished['met'][key] = n
+    for key, recs in index['pairs'].items():
+        if key[0] in names or key[1] in names:
+            finished['pairs'][key] = recs
+    dismissed_by, dismissals_of = _player_lists(finished['pairs'], finished['met'], names)
+    finished['dismissed_by'].update(dismissed_by)
+    finished['dismissals_of'].update(dismissals_of)
+    finished['unresolved'] = index['unresolved']
@@ -0,0 +1,46 @@
+from bisect import bisect_right
+
+# Per-player form: one series per player and discipline, ordered by match
+# date, stored as parallel lists (the shape /api/player/<name>/form returns).
+# Rolling sums over the last WINDOW entries are kept up to date as entries
+# arrive: appending is O(1), an out-of-order insert only recomputes the
+# WINDOW entries whose window covers it.
+
+WINDOW = 5
+BATTING_FIELDS = ('runs', 'balls', 'outs')
+BOWLING_FIELDS = ('balls', 'runs', 'wickets')
+
+def new_series(fields):
+    series = {'order': [], 'match_id': [], 'date': [], 'opponent': [], 'fields': fields}
+    for f in fields:
+        series[f] = []
+        series['rolling_' + f] = []
+    return series
+
+def add_entry(series, order_key, match_id, date, opponent, values, window=WINDOW):
+    # order_key: (iso date, ingest position) so same-day matches keep their order
+    pos = bisect_right(series['order'], order_key)
+    series['order'].insert(pos, order_key)
+    series['match_id'].insert(pos, match_id)
+    series['date'].insert(pos, date)
+    series['opponent'].insert(pos, opponent)
+    n = len(series['order'])
+    for f in series['fields']:
+        col = series[f]
+        rolling = series['rolling_' + f]
+        col.insert(pos, values.get(f, 0))
+        if pos == n - 1:
+            dropped = col[pos - window] if pos >= window else 0
+            rolling.append((rolling[-1] if rolling else 0) + col[pos] - dropped)
+            continue
+        # later entries shift right; only the next `window` windows change
+        rolling.insert(pos, 0)
+        for j in range(pos, min(n, pos + window)):
+            rolling[j] = sum(col[max(0, j - window + 1):j + 1])
+
+def rolling_sums(col, window):
+    # Rolling sums for an arbitrary window (query time), via a prefix sum
+    prefix = [0]
+    for v in col:
+        prefix.append(prefix[-1] + v)
+    return [prefix[j + 1] - prefix[max(0, j - window + 1)] for j in range(len(col))]
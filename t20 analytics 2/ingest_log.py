@@ -0,0 +1,55 @@
+import json
+import os
+
+# Matches added after the data files were built, one JSON object per line:
+#   {"summary": {...matchSummary entry...}, "batting": [...battingSummary
+#    rows...], "bowling": [...bowlingSummary rows...]}
+# POST /api/ingest and scripts/ingest_match.py append to the file; every app
+# worker replays it at startup and reads what was appended since before its
+# next request, so all workers ingest the same matches in the same order.
+
+SUMMARY_FIELDS = ('team1', 'team2', 'winner', 'margin', 'ground', 'matchDate', 'scorecard')
+
+def validate(entry):
+    # Raises ValueError unless entry has the shape above
+    if not isinstance(entry, dict):
+        raise ValueError('expected {"summary": {...}, "batting": [...], "bowling": [...]}')
+    summary = entry.get('summary')
+    if not isinstance(summary, dict) or not all(isinstance(summary.get(k), str) for k in ('team1', 'team2')):
+        raise ValueError('summary needs team1 and team2')
+    for k in SUMMARY_FIELDS:
+        if not isinstance(summary.get(k, ''), str):
+            raise ValueError(f'summary.{k} must be a string')
+    for key in ('batting', 'bowling'):
+        rows = entry.get(key)
+        if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+            raise ValueError(f'{key} must be a non-empty list of scorecard rows')
+    return entry
+
+def append(path, entry):
+    # one write per line, so lines appended by several processes never mix
+    line = json.dumps(validate(entry), ensure_ascii=False) + '\n'
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'ab') as f:
+        f.write(line.encode('utf-8'))
+
+def size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def read_from(path, offset):
+    # -> (entries appended after byte `offset`, new offset); a line still
+    # being written is left for the next read
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = data.rfind(b'\n') + 1
+    entries = [json.loads(line) for line in data[:end].decode('utf-8').splitlines() if line.strip()]
+    return entries, offset + end
@@ -0,0 +1,141 @@
+import zlib
+
+import numpy as np
+
+# Confidence intervals for per-player rate stats from their innings-by-innings
+# record (the form series). Every stat is a ratio of sums over innings, e.g.
+# strike rate = 100 * sum(runs) / sum(balls). The analytic interval uses the
+# delta-method variance of a ratio estimator; the bootstrap resamples whole
+# innings for many players at once as one (players x resamples x innings)
+# array. Each player's resamples come from a generator seeded by the seed,
+# the stat and the player's name, so update_intervals can recompute the
+# players an ingest touched and get what a full build would.
+
+# stat: (discipline, numerator, denominator, scale), matching the aggregates
+RATIO_STATS = {
+    'strike_rate': ('batting', 'runs', 'balls', 100.0),
+    'bat_avg': ('batting', 'runs', 'innings', 1.0),
+    'economy': ('bowling', 'runs', 'balls', 6.0),
+    'bowling_sr': ('bowling', 'balls', 'wickets', 1.0)
+}
+BOOTSTRAP_SAMPLES = 1000
+BOOTSTRAP_SEED = 0
+LEVEL = 0.95
+Z = 1.959964
+MAX_CELLS = 4000000  # players x samples x innings per bootstrap block
+
+def _padded(rows, form_index, discipline, field):
+    # (players, max innings) matrix, zero padded, plus innings counts
+    series = [form_index.get(p['name'], {}).get(discipline) for p in rows]
+    counts = np.array([len(s['order']) if s else 0 for s in series], dtype=np.int64)
+    out = np.zeros((len(rows), max(1, int(counts.max()) if len(counts) else 1)))
+    for i, s in enumerate(series):
+        if not s:
+            continue
+        if field == 'innings':
+            # innings that count towards bat_avg (faced a ball or scored)
+            out[i, :counts[i]] = [1.0 if b > 0 or r > 0 else 0.0 for b, r in zip(s['balls'], s['runs'])]
+        else:
+            out[i, :counts[i]] = s[field]
+    return out, counts
+
+def _ratio(num, den, scale):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, scale * num / np.where(den > 0, den, 1),
+                        np.where(num > 0, np.inf, np.nan))
+
+def analytic_interval(x, y, counts, scale, z=Z):
+    X, Y = x.sum(1), y.sum(1)
+    r = _ratio(X, Y, 1.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        resid = ((x - np.nan_to_num(r, posinf=0.0)[:, None] * y) ** 2).sum(1)
+        var = counts / np.maximum(counts - 1, 1) * resid / np.where(Y > 0, Y * Y, np.nan)
+    se = scale * np.sqrt(var)
+    value = scale * r
+    ok = (counts >= 2) & np.isfinite(value)
+    lo = np.where(ok, np.maximum(value - z * se, 0.0), np.nan)
+    hi = np.where(ok, value + z * se, np.nan)
+    return value, lo, hi
+
+def row_seed(seed, stat, name):
+    return [seed, zlib.crc32(stat.encode('utf-8')), zlib.crc32(name.encode('utf-8'))]
+
+def bootstrap_interval(x, y, counts, scale, seeds, samples=BOOTSTRAP_SAMPLES, level=LEVEL):
+    # seeds: one generator seed per player (row_seed)
+    n, m = x.shape
+    lo = np.full(n, np.nan)
+    hi = np.full(n, np.nan)
+    block = max(1, MAX_CELLS // (samples * m))
+    tail = 100 * (1 - level) / 2
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        c = counts[start:stop]
+        # innings index per (player, sample, slot); slots past a player's
+        # innings count are masked out
+        idx = np.zeros((stop - start, samples, m), dtype=np.int64)
+        for i in range(start, stop):
+            if counts[i]:
+                draws = np.random.default_rng(seeds[i]).random((samples, counts[i]))
+                idx[i - start, :, :counts[i]] = (draws * counts[i]).astype(np.int64)
+        live = np.arange(m)[None, None, :] < c[:, None, None]
+        xs = np.where(live, np.take_along_axis(x[start:stop, None, :], idx, axis=2), 0.0).sum(2)
+        ys = np.where(live, np.take_along_axis(y[start:stop, None, :], idx, axis=2), 0.0).sum(2)
+        stats = _ratio(xs, ys, scale)
+        # no interpolation: bounds may be inf (no wickets in a resample)
+        with np.errstate(invalid='ignore'):
+            blo = np.percentile(stats, tail, axis=1, method='lower')
+            bhi = np.percentile(stats, 100 - tail, axis=1, method='higher')
+        ok = c >= 2
+        lo[start:stop] = np.where(ok, blo, np.nan)
+        hi[start:stop] = np.where(ok, bhi, np.nan)
+    return lo, hi
+
+def build_intervals(rows, form_index, samples=BOOTSTRAP_SAMPLES, seed=BOOTSTRAP_SEED):
+    table = {}
+    for stat, (discipline, num, den, scale) in RATIO_STATS.items():
+        x, counts = _padded(rows, form_index, discipline, num)
+        y, _ = _padded(rows, form_index, discipline, den)
+        value, alo, ahi = analytic_interval(x, y, counts, scale)
+        blo, bhi = bootstrap_interval(x, y, counts, scale, [row_seed(seed, stat, p['name']) for p in rows], samples)
+        table[stat] = {'value': value, 'analytic_lo': alo, 'analytic_hi': ahi,
+                       'boot_lo': blo, 'boot_hi': bhi, 'n': counts}
+    return table
+
+def update_intervals(table, rows, form_index, row_ids, samples=BOOTSTRAP_SAMPLES, seed=BOOTSTRAP_SEED):
+    # Recomputes the rows in row_ids in place (the arrays are shared with the
+    # ci_columns). Returns the ci column names where a value changed.
+    row_ids = list(row_ids)
+    if not row_ids:
+        return []
+    subset = build_intervals([rows[i] for i in row_ids], form_index, samples, seed)
+    changed = []
+    for stat, t in subset.items():
+        for field, values in t.items():
+            target = table[stat][field]
+            if not np.array_equal(target[row_ids], values, equal_nan=True):
+                target[row_ids] = values
+                if field in ('boot_lo', 'boot_hi'):
+                    changed.append(f"{stat}_ci_{field[5:]}")
+    return changed
+
+def ci_columns(table):
+    # Numeric columns for the rule engine / leaderboards: strike_rate_ci_lo, ...
+    cols = {}
+    for stat, t in table.items():
+        cols[f'{stat}_ci_lo'] = t['boot_lo']
+        cols[f'{stat}_ci_hi'] = t['boot_hi']
+    return cols
+
+def _num(v):
+    return round(float(v), 2) if np.isfinite(v) else None
+
+def player_intervals(table, row):
+    out = {}
+    for stat, t in table.items():
+        out[stat] = {
+            'value': _num(t['value'][row]),
+            'innings': int(t['n'][row]),
+            'bootstrap': [_num(t['boot_lo'][row]), _num(t['boot_hi'][row])],
+            'analytic': [_num(t['analytic_lo'][row]), _num(t['analytic_hi'][row])]
+        }
+    return out
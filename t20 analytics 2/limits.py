@@ -0,0 +1,266 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Rate limiting and admission control. Every request path falls in a route
+# class (route_class); each client gets a token bucket per class, refilled
+# at `rate` tokens a second up to `burst`, and a request takes one token or
+# is refused with 429 and Retry-After. The buckets are shared by the
+# workers (a SQLite file by default), so a client gets the same budget
+# whichever worker serves it. Separately, Gate caps the requests a worker
+# runs at once; past that the app answers 503 instead of queueing. Refused
+# requests are counted per class and reason in the same backend.
+#
+# With the SQLite backend a request is decided in memory while the client
+# has more than LOCAL_SHARE of its burst left. Each worker keeps its own copy
+# of the buckets of the clients it served since its last sync and every
+# SYNC_INTERVAL takes what it spent off the shared buckets and reads back
+# their balance (as metrics.Registry flushes). A client nearer its limit is
+# decided in a transaction on the shared buckets, so it is held to its rate
+# across workers; until the workers sync, it can get up to LOCAL_SHARE of
+# its burst more from each of them.
+
+# class: (tokens per second, burst)
+DEFAULT_LIMITS = {
+    'search': (1.0, 10),   # difflib over every name
+    'page': (5.0, 30),     # player/team pages: disk read, outbound call
+    'heavy': (0.5, 5),     # simulation, batches, best XI search
+    'api': (20.0, 100)
+}
+HEAVY_PATHS = ('/api/simulate', '/api/batch', '/api/best11')
+EXEMPT_PATHS = ('/health', '/metrics')
+# buckets idle this long are full again, so their rows can go
+PRUNE_AFTER = 3600
+PRUNE_EVERY = 1000
+SYNC_INTERVAL = 1.0
+LOCAL_SHARE = 0.5
+
+def route_class(path):
+    # None for requests that are never limited
+    if path.startswith('/static/') or path in EXEMPT_PATHS:
+        return None
+    if path == '/search':
+        return 'search'
+    if path.startswith(HEAVY_PATHS):
+        return 'heavy'
+    if path.startswith('/api/'):
+        return 'api'
+    return 'page'
+
+def parse_limits(text, defaults=DEFAULT_LIMITS):
+    # "search=2/20,page=10/50" -> defaults with those classes replaced
+    # (rate/burst). Raises ValueError.
+    out = dict(defaults)
+    for part in filter(None, (p.strip() for p in (text or '').split(','))):
+        name, _, value = part.partition('=')
+        rate, _, burst = value.partition('/')
+        if name.strip() not in out:
+            raise ValueError(f'unknown route class: {name.strip()}')
+        out[name.strip()] = (float(rate), int(burst or max(1, math.ceil(float(rate)))))
+    return out
+
+def client_key(remote_addr, forwarded_for=None, proxy_hops=0):
+    # Behind `proxy_hops` trusted proxies the client is that many entries
+    # from the right of X-Forwarded-For (as werkzeug's ProxyFix)
+    if proxy_hops and forwarded_for:
+        hops = [h.strip() for h in forwarded_for.split(',') if h.strip()]
+        if len(hops) >= proxy_hops:
+            return hops[-proxy_hops]
+    return remote_addr or ''
+
+def retry_after(wait):
+    return max(1, math.ceil(wait))
+
+class SQLiteLimiter:
+    def __init__(self, path, sync_interval=SYNC_INTERVAL):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._buckets = {}  # key -> (tokens, updated), this worker's view
+        self._spent = {}    # key -> (tokens taken since the last sync, rate, burst)
+        self._shed = {}     # (route_class, reason) -> refusals since the last sync
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._synced_at = time.monotonic()
+        self._syncs = 0
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS shed (route_class TEXT, reason TEXT, count INTEGER, '
+                     'PRIMARY KEY (route_class, reason))')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def take(self, key, rate, burst, cost=1):
+        # 0 when the request may go ahead, else seconds until `cost` tokens
+        # are due (cost <= burst)
+        if time.monotonic() - self._synced_at >= self.sync_interval:
+            self.sync()
+        now = time.time()
+        row = None
+        if key not in self._buckets:
+            # a client new to this worker starts from the shared balance
+            # (a read, which doesn't wait for writers)
+            row = self._conn().execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        with self._lock:
+            tokens, updated = self._buckets.get(key) or row or (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            if tokens - cost >= burst * LOCAL_SHARE:
+                spent = self._spent.get(key, (0, rate, burst))[0]
+                self._spent[key] = (spent + cost, rate, burst)
+                self._buckets[key] = (tokens - cost, now)
+                return 0.0
+        return self._take_shared(key, rate, burst, cost)
+
+    def _take_shared(self, key, rate, burst, cost):
+        # the take on the shared bucket, with what this worker took for the
+        # client since its last sync
+        with self._lock:
+            spent = self._spent.pop(key, (0,))[0]
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+            tokens = max(0.0, tokens - spent)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (key, tokens, now))
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            with self._lock:
+                self._spent[key] = (self._spent.get(key, (0,))[0] + spent, rate, burst)
+            raise
+        with self._lock:
+            self._buckets[key] = (tokens - self._spent.get(key, (0,))[0], now)
+        return wait
+
+    def sync(self):
+        with self._lock:
+            spent, self._spent = self._spent, {}
+            shed, self._shed = self._shed, {}
+            self._synced_at = time.monotonic()
+            self._syncs += 1
+            prune = self._syncs % PRUNE_EVERY == 0
+        now = time.time()
+        balances = {}
+        if spent or shed or prune:
+            try:
+                balances = self._write(spent, shed, prune, now)
+            except BaseException:
+                # keep the counts for the next sync
+                with self._lock:
+                    for key, (n, rate, burst) in spent.items():
+                        self._spent[key] = (self._spent.get(key, (0,))[0] + n, rate, burst)
+                    for k, n in shed.items():
+                        self._shed[k] = self._shed.get(k, 0) + n
+                raise
+        with self._lock:
+            # the shared balance, less what was taken here while syncing.
+            # Clients with nothing taken since the last sync are dropped and
+            # read again from the shared buckets on their next request.
+            buckets = {key: (tokens - self._spent.get(key, (0,))[0], now) for key, tokens in balances.items()}
+            for key in self._spent:
+                buckets.setdefault(key, self._buckets[key])
+            self._buckets = buckets
+
+    def _write(self, spent, shed, prune, now):
+        # spent tokens and refusals into the shared file, in one transaction
+        # -> {key: shared balance after the spend}
+        balances = {}
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for key, (n, rate, burst) in spent.items():
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                balances[key] = max(0.0, tokens - n)
+                conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)', (key, balances[key], now))
+            conn.executemany('INSERT INTO shed VALUES (?, ?, ?) ON CONFLICT (route_class, reason) '
+                             'DO UPDATE SET count = count + excluded.count',
+                             [(c, r, n) for (c, r), n in shed.items()])
+            if prune:
+                conn.execute('DELETE FROM buckets WHERE updated < ?', (now - PRUNE_AFTER,))
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        return balances
+
+    def record_shed(self, route_class, reason):
+        with self._lock:
+            self._shed[(route_class, reason)] = self._shed.get((route_class, reason), 0) + 1
+
+    def shed_counts(self):
+        # {(route_class, reason): count}, all workers
+        self.sync()
+        return {(c, r): n for c, r, n in self._conn().execute('SELECT route_class, reason, count FROM shed')}
+
+class MemoryLimiter:
+    # the same, per process
+    def __init__(self):
+        self._buckets = {}
+        self._shed = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            self._buckets[key] = (tokens - cost if not wait else tokens, now)
+        return wait
+
+    def record_shed(self, route_class, reason):
+        with self._lock:
+            self._shed[(route_class, reason)] = self._shed.get((route_class, reason), 0) + 1
+
+    def shed_counts(self):
+        with self._lock:
+            return dict(self._shed)
+
+def from_url(url, sync_interval=SYNC_INTERVAL):
+    # None for '' / 'off'; sqlite:///path or memory:// as in cache.from_url
+    url = (url or '').strip()
+    if url.lower() in ('', 'off', 'none'):
+        return None
+    if url.startswith('sqlite:///'):
+        return SQLiteLimiter(url[len('sqlite:///'):], sync_interval)
+    if url.startswith('memory://'):
+        return MemoryLimiter()
+    raise ValueError(f'unsupported rate limit URL: {url}')
+
+class Gate:
+    # At most `limit` requests in flight in this worker; enter() does not
+    # wait, it says no
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def enter(self):
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
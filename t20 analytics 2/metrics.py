@@ -0,0 +1,151 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Request metrics in the Prometheus text format. Each worker counts into its
+# own Registry (counters, and histograms as cumulative bucket counters) and
+# every FLUSH_INTERVAL adds what it counted since the last flush to a SQLite
+# file the workers share. A scrape of /metrics on any worker flushes that
+# worker and reads the file, so it reports the totals of all workers; a
+# worker that exits loses at most its last unflushed second. Without a file
+# (memory://) the registry covers its own process only.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+FLUSH_INTERVAL = 1.0
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+def format_value(v):
+    if v == math.inf:
+        return '+Inf'
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+def _le_key(labels):
+    # a histogram's buckets in ascending order, then its _count and _sum
+    le = dict(labels).get('le')
+    return ([p for p in labels if p[0] != 'le'], float(le) if le and le != '+Inf' else math.inf)
+
+class Registry:
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._families = {}  # family -> (type, help), in the order described
+        self._pending = {}   # (family, sample, labels) -> value not yet flushed
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        self._local = threading.local()
+        self._bounds = {}  # buckets -> ((le, le label), ...)
+
+    def describe(self, family, kind, help_text):
+        self._families[family] = (kind, help_text)
+
+    def _add(self, key, value):
+        self._pending[key] = self._pending.get(key, 0) + value
+
+    def inc(self, family, value=1, **labels):
+        with self._lock:
+            self._add((family, family, tuple(sorted(labels.items()))), value)
+
+    def observe(self, family, value, buckets, **labels):
+        labels = tuple(sorted(labels.items()))
+        bounds = self._bounds.get(buckets)
+        if bounds is None:
+            bounds = self._bounds[buckets] = tuple((le, ('le', format_value(le))) for le in buckets + (math.inf,))
+        bucket = family + '_bucket'
+        with self._lock:
+            # every bucket is written, with 0 where the value is above it, so
+            # each label set has the full bucket series
+            for le, label in bounds:
+                self._add((family, bucket, labels + (label,)), 1 if value <= le else 0)
+            self._add((family, family + '_sum', labels), value)
+            self._add((family, family + '_count', labels), 1)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS samples (family TEXT, name TEXT, labels TEXT, value REAL, '
+                     'PRIMARY KEY (name, labels))')
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        rows = [(family, name, json.dumps(labels), value) for (family, name, labels), value in pending.items()]
+        conn = self._conn()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.executemany('INSERT INTO samples VALUES (?, ?, ?, ?) ON CONFLICT (name, labels) '
+                             'DO UPDATE SET value = value + excluded.value', rows)
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            # keep the counts for the next flush
+            with self._lock:
+                for key, value in pending.items():
+                    self._add(key, value)
+            raise
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def samples(self):
+        # [(family, sample, labels, value)], all workers
+        if self.path is None:
+            with self._lock:
+                return [k + (v,) for k, v in self._pending.items()]
+        self.flush()
+        return [(family, name, tuple(tuple(p) for p in json.loads(labels)), value)
+                for family, name, labels, value in self._conn().execute('SELECT family, name, labels, value FROM samples')]
+
+    def render(self, samples, extra=()):
+        # samples from samples(); extra: [(family, type, help, [(sample, labels, value)])]
+        by_family = {}
+        for family, name, labels, value in samples:
+            by_family.setdefault(family, []).append((name, labels, value))
+        families = [(f, kind, help_text, by_family.get(f, [])) for f, (kind, help_text) in self._families.items()]
+        lines = []
+        for family, kind, help_text, rows in families + list(extra):
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for name, labels, value in sorted(rows, key=lambda r: (_le_key(r[1]), r[0])):
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+def from_url(url, flush_interval=FLUSH_INTERVAL):
+    # None for '' / 'off'; sqlite:///path (shared) or memory:// (this process)
+    url = (url or '').strip()
+    if url.lower() in ('', 'off', 'none'):
+        return None
+    if url.startswith('sqlite:///'):
+        return Registry(url[len('sqlite:///'):], flush_interval)
+    if url.startswith('memory://'):
+        return Registry(None, flush_interval)
+    raise ValueError(f'unsupported metrics URL: {url}')
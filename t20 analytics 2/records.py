@@ -0,0 +1,180 @@
+import sys
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from operator import attrgetter
+
+# Compact in-memory records for the scorecard rows and the player records.
+# They are read and written through the same mapping interface as the dicts
+# they replace (r.get('runs'), p['name'] = ..., dict(p), ...), but keep their
+# values in __slots__ rather than a per-record dict: each known field has a
+# slot, and any other key goes to an overflow dict that is only created when
+# needed. String values are interned, so names, teams and match strings
+# repeated across thousands of rows are stored once.
+#
+# Ingest also numbers players, teams and matches (new_ids / assign_id). A
+# row carries its ids as attributes (row.player_id, ...), not as mapping
+# keys, so the JSON it serialises to is unchanged.
+#
+# Once loaded, the records are shared by every request (and thread), so the
+# app freezes their types: setting or deleting a key raises TypeError.
+# Handlers build views instead (dict(record, extra=...)); the ingest path
+# changes records inside writable().
+
+class Record(MutableMapping):
+    __slots__ = ('_extra',)
+    _fields = {}  # field -> slot descriptor, filled in by record_type()
+    _frozen = False  # per type, see freeze()
+
+    def __init__(self, data=()):
+        self._extra = None
+        for k, v in (data.items() if hasattr(data, 'items') else data):
+            self[k] = v
+
+    def __getitem__(self, key):
+        slot = self._fields.get(key)
+        if slot is not None:
+            try:
+                return slot.__get__(self)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        slot = self._fields.get(key)
+        if slot is not None:
+            try:
+                return slot.__get__(self)
+            except AttributeError:
+                return default
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key):
+        slot = self._fields.get(key)
+        if slot is not None:
+            try:
+                slot.__get__(self)
+                return True
+            except AttributeError:
+                return False
+        return self._extra is not None and key in self._extra
+
+    def _read_only(self):
+        raise TypeError(f'{type(self).__name__} is read-only; build a view with dict(record, ...)')
+
+    def __setitem__(self, key, value):
+        if self._frozen:
+            self._read_only()
+        if type(value) is str:
+            value = sys.intern(value)
+        slot = self._fields.get(key)
+        if slot is not None:
+            slot.__set__(self, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if self._frozen:
+            self._read_only()
+        slot = self._fields.get(key)
+        if slot is not None:
+            try:
+                slot.__delete__(self)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key, slot in self._fields.items():
+            try:
+                slot.__get__(self)
+            except AttributeError:
+                continue
+            yield key
+        if self._extra is not None:
+            yield from list(self._extra)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self)!r})'
+
+def record_type(name, fields, attrs=()):
+    # A Record subclass with one slot per field (field names such as '4s'
+    # are not identifiers, so slots are numbered) plus plain attributes.
+    slots = [f'_f{i}' for i in range(len(fields))]
+    cls = type(name, (Record,), {'__slots__': tuple(slots) + tuple(attrs), '__module__': __name__})
+    cls._fields = {f: getattr(cls, s) for f, s in zip(fields, slots)}
+    return cls
+
+def field_getter(cls, fields):
+    # getter(record) -> tuple of those fields, read from the slots without a
+    # call per field; raises AttributeError if one isn't set
+    return attrgetter(*[cls._fields[f].__name__ for f in fields])
+
+def freeze(*types):
+    for cls in types:
+        cls._frozen = True
+
+@contextmanager
+def writable(*types):
+    # Lifts freeze() for the block. The flag is per type, not per thread, so
+    # the caller must be the only writer (the app holds its ingest lock).
+    frozen = [cls for cls in types if cls._frozen]
+    for cls in frozen:
+        cls._frozen = False
+    try:
+        yield
+    finally:
+        for cls in frozen:
+            cls._frozen = True
+
+ID_ATTRS = ('player_id', 'team_id', 'match_id')
+
+BattingRow = record_type('BattingRow', ('match', 'teamInnings', 'battingPos', 'batsmanName', 'dismissal',
+                                        'runs', 'balls', '4s', '6s', 'SR'), ID_ATTRS)
+BowlingRow = record_type('BowlingRow', ('match', 'bowlingTeam', 'bowlerName', 'overs', 'maiden', 'runs',
+                                        'wickets', 'economy', '0s', '4s', '6s', 'wides', 'noBalls'), ID_ATTRS)
+PlayerRecord = record_type('PlayerRecord', (
+    'name', 'team', 'battingStyle', 'bowlingStyle', 'playingRole', 'description',
+    'runs', 'balls', '4s', '6s', 'innings', 'strike_rate', 'bat_avg', 'boundary_pct', 'avg_ball_faced',
+    'batting_position', 'runs_conceded', 'wickets', 'economy', 'bowling_sr', 'bowling_avg', 'dot_pct',
+    'balls_bowled', 'innings_bowled', 'overs', 'maiden', 'dot_balls', 'max_spell_balls',
+    'fielding_dismissals', 'catches', 'stumpings', 'run_outs', 'img_name'))
+
+def new_ids():
+    # {kind: {key: id}}; ids are dense and in first-seen order, so
+    # list(ids['player'])[i] is the name behind player id i
+    return {'player': {}, 'team': {}, 'match': {}}
+
+def assign_id(table, key):
+    i = table.get(key)
+    if i is None:
+        i = table[sys.intern(key)] = len(table)
+    return i
+
+def _row(cls, r, ids, match_id, name_field, team_field):
+    row = r if type(r) is cls else cls(r)
+    row.player_id = assign_id(ids['player'], (row.get(name_field) or '').strip())
+    row.team_id = assign_id(ids['team'], row.get(team_field) or '')
+    row.match_id = assign_id(ids['match'], match_id)
+    return row
+
+def batting_row(r, ids, match_id):
+    return _row(BattingRow, r, ids, match_id, 'batsmanName', 'teamInnings')
+
+def bowling_row(r, ids, match_id):
+    return _row(BowlingRow, r, ids, match_id, 'bowlerName', 'bowlingTeam')
+
+def json_default(o):
+    # for json.dumps(..., default=records.json_default)
+    if isinstance(o, Record):
+        return dict(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
@@ -0,0 +1,208 @@
+import json
+import re
+
+import numpy as np
+
+# Category rule engine. Categories live in data/category_rules.json as lists of
+# [stat, operator, threshold] conditions; they are compiled once into
+# vectorized predicates over per-stat numpy columns (one entry per player).
+# The same compiler backs the ad-hoc /api/query endpoint. compile_sql and
+# sql_order give the same filter and ordering as SQL for the SQLite backend.
+
+NUMERIC_OPS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '=': np.equal,
+    '==': np.equal,
+    '!=': np.not_equal
+}
+STRING_OPS = ('contains', '~', '=', '==', '!=')
+WHERE_RE = re.compile(r'^\s*([A-Za-z0-9_]+)\s*(>=|<=|!=|==|=|>|<|~)\s*(.*?)\s*$')
+
+def build_columns(rows, keys=None):
+    # numeric stats become float arrays (None -> NaN, so every comparison on a
+    # missing value is False); text fields become lowercased object arrays.
+    # `keys` limits the rebuild to some fields (incremental refresh).
+    numeric = {}
+    text = {}
+    if keys is None:
+        keys = set()
+        for p in rows:
+            keys.update(p.keys())
+    for key in keys:
+        values = [p.get(key) for p in rows]
+        present = [v for v in values if v is not None and v != '']
+        if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+            numeric[key] = np.array([np.nan if v is None or v == '' else float(v) for v in values], dtype=float)
+        elif all(v is None or isinstance(v, str) for v in values):
+            text[key] = np.array([(v or '').lower() for v in values], dtype=object)
+    return {'numeric': numeric, 'text': text, 'size': len(rows)}
+
+def compile_condition(cond):
+    # cond: [stat, op, value] or {"any": [cond, ...]} / {"all": [cond, ...]}
+    if isinstance(cond, dict):
+        if 'any' in cond:
+            parts = [compile_condition(c) for c in cond['any']]
+            return lambda cols: np.logical_or.reduce([f(cols) for f in parts]) if parts else np.zeros(cols['size'], dtype=bool)
+        if 'all' in cond:
+            parts = [compile_condition(c) for c in cond['all']]
+            return lambda cols: np.logical_and.reduce([f(cols) for f in parts]) if parts else np.ones(cols['size'], dtype=bool)
+        raise ValueError(f'bad condition: {cond}')
+    if not isinstance(cond, (list, tuple)) or len(cond) != 3:
+        raise ValueError(f'bad condition: {cond}')
+    stat, op, value = cond
+    if isinstance(value, str) or op in ('contains', '~'):
+        if op not in STRING_OPS:
+            raise ValueError(f'operator {op} does not apply to text')
+        needle = str(value).lower()
+        def text_pred(cols):
+            col = cols['text'].get(stat)
+            if col is None:
+                if stat in cols['numeric']:
+                    raise ValueError(f'{stat} is numeric')
+                raise ValueError(f'unknown field: {stat}')
+            if op in ('contains', '~'):
+                return np.char.find(col.astype(str), needle) >= 0
+            eq = col == needle
+            return ~eq if op == '!=' else eq
+        return text_pred
+    func = NUMERIC_OPS.get(op)
+    if func is None:
+        raise ValueError(f'unknown operator: {op}')
+    threshold = float(value)
+    def num_pred(cols):
+        col = cols['numeric'].get(stat)
+        if col is None:
+            raise ValueError(f'unknown numeric field: {stat}')
+        with np.errstate(invalid='ignore'):
+            return func(col, threshold) & ~np.isnan(col)
+    return num_pred
+
+def compile_rules(conditions):
+    return compile_condition({'all': conditions})
+
+def _quote(field):
+    return '"' + field + '"'
+
+def compile_sql(cond, numeric, text):
+    # Same semantics as compile_condition, as (where clause, params) over a
+    # table with one column per field: numbers NULL when missing (so every
+    # comparison on them is false), text lowercased. numeric/text: the
+    # field names available.
+    if isinstance(cond, dict):
+        if 'any' in cond or 'all' in cond:
+            joiner, empty = (' OR ', '0') if 'any' in cond else (' AND ', '1')
+            parts = [compile_sql(c, numeric, text) for c in cond.get('any', cond.get('all'))]
+            if not parts:
+                return empty, []
+            return '(' + joiner.join(p[0] for p in parts) + ')', [v for p in parts for v in p[1]]
+        raise ValueError(f'bad condition: {cond}')
+    if not isinstance(cond, (list, tuple)) or len(cond) != 3:
+        raise ValueError(f'bad condition: {cond}')
+    stat, op, value = cond
+    if isinstance(value, str) or op in ('contains', '~'):
+        if op not in STRING_OPS:
+            raise ValueError(f'operator {op} does not apply to text')
+        if stat not in text:
+            if stat in numeric:
+                raise ValueError(f'{stat} is numeric')
+            raise ValueError(f'unknown field: {stat}')
+        needle = str(value).lower()
+        if op in ('contains', '~'):
+            return f'instr({_quote(stat)}, ?) > 0', [needle]
+        return f"{_quote(stat)} {'!=' if op == '!=' else '='} ?", [needle]
+    if op not in NUMERIC_OPS:
+        raise ValueError(f'unknown operator: {op}')
+    if stat not in numeric:
+        raise ValueError(f'unknown numeric field: {stat}')
+    return f"{_quote(stat)} {'=' if op == '==' else op} ?", [float(value)]
+
+def compile_sql_rules(conditions, numeric, text):
+    return compile_sql({'all': conditions}, numeric, text)
+
+def sql_order(sort, numeric, text, tiebreak='row_index'):
+    # ORDER BY clause and params matching sort_order: ties keep roster
+    # order, missing values sort last.
+    if not sort:
+        return tiebreak, []
+    if isinstance(sort, dict):
+        terms = []
+        for stat in sort:
+            if stat not in numeric:
+                raise ValueError(f'unknown numeric field: {stat}')
+            terms.append(f'? * COALESCE({_quote(stat)}, 0)')
+        return '(' + ' + '.join(terms) + f') DESC, {tiebreak}', [float(w) for w in sort.values()]
+    keys = []
+    for part in [s.strip() for s in sort.split(',') if s.strip()]:
+        direction = 'DESC' if part.startswith('-') else 'ASC'
+        stat = part.lstrip('+-')
+        if stat in numeric:
+            keys.append(f'{_quote(stat)} IS NULL, {_quote(stat)} {direction}')
+        elif stat in text:
+            keys.append(f'{_quote(stat)} {direction}')
+        else:
+            raise ValueError(f'unknown field: {stat}')
+    return ', '.join(keys + [tiebreak]), []
+
+def sort_order(cols, mask, sort):
+    # sort: {"runs": 1} (descending by a weighted sum) or "-runs,name" style
+    # string. Returns indices of the matching rows in display order; ties keep
+    # roster order, missing values sort last.
+    idx = np.flatnonzero(mask)
+    if not sort:
+        return idx
+    if isinstance(sort, dict):
+        score = np.zeros(len(idx))
+        for stat, w in sort.items():
+            col = cols['numeric'].get(stat)
+            if col is None:
+                raise ValueError(f'unknown numeric field: {stat}')
+            score += w * np.nan_to_num(col[idx], nan=0.0)
+        return idx[np.argsort(-score, kind='stable')]
+    keys = []
+    for part in reversed([s.strip() for s in sort.split(',') if s.strip()]):
+        desc = part.startswith('-')
+        stat = part.lstrip('+-')
+        if stat in cols['numeric']:
+            col = cols['numeric'][stat][idx]
+            key = np.where(np.isnan(col), np.inf, -col if desc else col)
+        elif stat in cols['text']:
+            codes = np.unique(cols['text'][stat][idx], return_inverse=True)[1]
+            key = -codes if desc else codes
+        else:
+            raise ValueError(f'unknown field: {stat}')
+        keys.append(key)
+    return idx[np.lexsort(keys)] if keys else idx
+
+def parse_where(where):
+    # "strike_rate>140,innings>3,bowlingStyle~fast" -> [[stat, op, value], ...]
+    conditions = []
+    for part in (where or '').split(','):
+        if not part.strip():
+            continue
+        m = WHERE_RE.match(part)
+        if not m:
+            raise ValueError(f'cannot parse condition: {part.strip()}')
+        stat, op, raw = m.groups()
+        try:
+            value = float(raw)
+        except ValueError:
+            value = raw
+        conditions.append([stat, op, value])
+    return conditions
+
+def load_category_rules(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+    compiled = {}
+    for cat, rule in spec.items():
+        compiled[cat] = {
+            'rules': rule.get('rules', []),
+            'fallback_rules': rule.get('fallback'),
+            'match': compile_rules(rule.get('rules', [])),
+            'fallback': compile_rules(rule['fallback']) if rule.get('fallback') else None,
+            'sort': rule.get('sort')
+        }
+    return compiled
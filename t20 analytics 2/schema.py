@@ -0,0 +1,231 @@
+import re
+from operator import getitem, itemgetter
+
+import records
+
+# Typed parsing for scorecard rows. Each file has a schema of
+# (source field, output field, type, required); compile_schema turns it into
+# a parser for a block of raw rows that converts each field with its type's
+# converter and reports every value that doesn't fit its type, with the row
+# it came from.
+# A bad or missing value still becomes the type's default (0 for counts), as
+# the aggregates always treated it, but it is now reported.
+#
+# Parsed rows are plain dicts keyed by output field, plus 'row' (the source
+# row, kept for the scorecards /api/match returns).
+#
+# Most rows are valid, so a row is first parsed from per-field Tables, which
+# hold the (output field, value) pair for each raw value seen; reading the
+# fields and looking them up takes no Python call per field. A row with a
+# value the tables don't take is parsed again field by field, which reports
+# what is wrong with it.
+
+COUNT_RE = re.compile(r'^[0-9]+$')
+OVERS_RE = re.compile(r'^([0-9]+)(?:\.([0-5]))?$')
+DECIMAL_RE = re.compile(r'^[0-9]+(?:\.[0-9]+)?$')
+
+def _count(v):
+    if type(v) is int and v >= 0:
+        return v
+    if type(v) is str and COUNT_RE.match(v):
+        return int(v)
+    raise ValueError('expected a whole number')
+
+def _overs(v):
+    # "3.4" (3 overs 4 balls) -> 22 balls
+    if type(v) is int and v >= 0:
+        return 6 * v
+    m = OVERS_RE.match(v) if type(v) is str else None
+    if not m:
+        raise ValueError('expected overs as O or O.B with B from 0 to 5')
+    return 6 * int(m.group(1)) + int(m.group(2) or 0)
+
+def _rate(v):
+    # strike rate / economy; "-" when there were no balls
+    if v == '-':
+        return None
+    if type(v) in (int, float) and v >= 0:
+        return float(v)
+    if type(v) is str and DECIMAL_RE.match(v):
+        return float(v)
+    raise ValueError('expected a decimal number or "-"')
+
+def _position(v):
+    n = _count(v)
+    if not 1 <= n <= 11:
+        raise ValueError('expected a batting position from 1 to 11')
+    return n
+
+def _text(v):
+    if type(v) is not str:
+        raise ValueError('expected text')
+    return v
+
+def _name(v):
+    return _text(v).strip()
+
+# Lookup tables for the usual values: reading "82" from COUNTS is several
+# times cheaper than checking and converting it. Numbers may also arrive as
+# ints (battingPos does).
+COUNTS = {k: n for n in range(1000) for k in (n, str(n))}
+POSITIONS = {k: n for n in range(1, 12) for k in (n, str(n))}
+# every overs figure up to 50 overs ("3", "3.4", ...) -> balls
+OVERS = {f'{o}.{b}' if b else str(o): 6 * o + b for o in range(51) for b in range(6)}
+
+# type: (converter, default, table). A value found in the type's table is
+# taken from it; anything else goes through the converter, which reports why
+# a value is invalid.
+TYPES = {
+    'count': (_count, 0, COUNTS),
+    'overs': (_overs, 0, OVERS),
+    'rate': (_rate, None, None),
+    'position': (_position, None, POSITIONS),
+    'text': (_text, '', None),
+    'name': (_name, '', None)
+}
+
+BATTING_SCHEMA = [
+    ('batsmanName', 'name', 'name', True),
+    ('teamInnings', 'team', 'text', True),
+    ('match', 'match', 'text', False),
+    ('battingPos', 'position', 'position', False),
+    ('dismissal', 'dismissal', 'text', False),
+    ('runs', 'runs', 'count', True),
+    ('balls', 'balls', 'count', True),
+    ('4s', '4s', 'count', False),
+    ('6s', '6s', 'count', False),
+    ('SR', 'strike_rate', 'rate', False)
+]
+
+BOWLING_SCHEMA = [
+    ('bowlerName', 'name', 'name', True),
+    ('bowlingTeam', 'team', 'text', True),
+    ('match', 'match', 'text', False),
+    ('overs', 'balls', 'overs', True),
+    ('maiden', 'maiden', 'count', False),
+    ('runs', 'runs', 'count', True),
+    ('wickets', 'wickets', 'count', True),
+    ('economy', 'economy', 'rate', False),
+    ('0s', 'dot_balls', 'count', False),
+    ('4s', '4s', 'count', False),
+    ('6s', '6s', 'count', False),
+    ('wides', 'wides', 'count', False),
+    ('noBalls', 'no_balls', 'count', False)
+]
+
+# values kept per Table; past that, new values are parsed but not kept
+TABLE_SIZE = 100000
+
+class Table(dict):
+    # raw value -> (output field, parsed value) for one field, filled in as
+    # values are looked up. A missing value is only in it (as the default)
+    # for optional fields; raises KeyError for any value that doesn't parse.
+    def __init__(self, dst, type_name, required):
+        self.dst = dst
+        self.convert, default, self.table = TYPES[type_name]
+        self.required = required
+        if not required:
+            self[None] = self[''] = (dst, default)
+
+    def __missing__(self, v):
+        if self.table is not None and v in self.table:
+            pair = (self.dst, self.table[v])
+        else:
+            if v is None or v == '':
+                raise KeyError(v)
+            try:
+                out = self.convert(v)
+            except ValueError:
+                raise KeyError(v) from None
+            if self.required and out == '':
+                raise KeyError(v)
+            pair = (self.dst, out)
+            if type(v) is not str:
+                # not kept: 1, 1.0 and True are the same key, but the
+                # converters tell them apart
+                return pair
+        if len(self) < TABLE_SIZE:
+            self[v] = pair
+        return pair
+
+def _getter(cls, srcs):
+    # getter(row) -> the values of srcs, for rows of type cls (itemgetter
+    # and attrgetter return a bare value for a single field)
+    if len(srcs) > 1:
+        if issubclass(cls, records.Record) and all(src in cls._fields for src in srcs):
+            return records.field_getter(cls, srcs)
+        if issubclass(cls, dict):
+            return itemgetter(*srcs)
+    return lambda row: tuple(map(row.get, srcs))
+
+def _convert(field, v, errors, location):
+    source, src, convert, default, required = field
+    if v is None or v == '':
+        if required:
+            errors.append(dict(location, source=source, field=src, value=v, error='missing'))
+        return default
+    try:
+        out = convert(v)
+    except ValueError as e:
+        errors.append(dict(location, source=source, field=src, value=v, error=str(e)))
+        return default
+    if required and out == '':
+        # e.g. a name of only spaces
+        errors.append(dict(location, source=source, field=src, value=v, error='missing'))
+    return out
+
+def compile_schema(schema, source):
+    # source names the file in error reports ('batting' / 'bowling').
+    # Returns parse(rows, errors, location) -> the parsed rows; location is a
+    # dict such as {'block': 3, 'match_id': '1826'} copied into each error,
+    # with the index of the row.
+    fields = []
+    tables = []
+    for src, dst, type_name, required in schema:
+        if type_name not in TYPES:
+            raise ValueError(f'unknown type {type_name} for {src}')
+        convert, default, table = TYPES[type_name]
+        fields.append((src, dst, table, (source, src, convert, default, required)))
+        tables.append(Table(dst, type_name, required))
+    srcs = [src for src, dst, type_name, required in schema]
+    getters = {}
+
+    def parse(rows, errors, location):
+        out = []
+        append = out.append
+        cls = getter = None
+        for i, row in enumerate(rows):
+            if type(row) is not cls:
+                cls = type(row)
+                getter = getters.get(cls)
+                if getter is None:
+                    getter = getters[cls] = _getter(cls, srcs)
+            parsed = {'row': row}
+            try:
+                parsed.update(map(getitem, tables, getter(row)))
+            except (KeyError, TypeError, AttributeError):
+                parsed = parse_checked(row, errors, dict(location, row=i))
+            append(parsed)
+        return out
+
+    def parse_checked(row, errors, location):
+        out = {'row': row}
+        get = row.get
+        for src, dst, table, field in fields:
+            v = get(src)
+            if table is not None:
+                try:
+                    out[dst] = table[v]
+                    continue
+                except (KeyError, TypeError):
+                    pass
+            out[dst] = _convert(field, v, errors, location)
+        return out
+    return parse
+
+parse_batting = compile_schema(BATTING_SCHEMA, 'batting')
+parse_bowling = compile_schema(BOWLING_SCHEMA, 'bowling')
+
+def format_error(e):
+    return (f"{e['source']} block {e.get('block')} row {e.get('row')} (match {e.get('match_id')}): "
+            f"{e['field']}={e['value']!r}: {e['error']}")
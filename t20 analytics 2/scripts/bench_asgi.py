@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Player-page load test: the sync WSGI app against the ASGI entry point
+# (asgi.py) with the same number of page threads, when every page waits on
+# the outbound Wikipedia call.
+#
+#   python scripts/bench_asgi.py [latency_s] [threads] [clients] [requests]
+#       in-process: the Wikipedia call is replaced by a fixed delay and the
+#       response cache and rate limits are off, so every request pays it;
+#       no server needed
+#   python scripts/bench_asgi.py http://127.0.0.1:8000 [clients] [requests]
+#       against a running server, e.g. gunicorn -w 4 app:app versus
+#       uvicorn asgi:app --workers 4
+#
+# Run from the project root.
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+def report(label, latencies, elapsed):
+    print(f"{label:<28}{len(latencies):>6}{elapsed:>9.2f}{len(latencies) / elapsed:>9.1f}"
+          f"{1000 * percentile(latencies, 0.5):>10.0f}{1000 * percentile(latencies, 0.95):>10.0f}")
+
+def header():
+    print(f"{'':<28}{'reqs':>6}{'secs':>9}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}")
+
+def closed_loop(paths, clients, fetch):
+    # `clients` threads, each sending its next request when the last returns
+    latencies = []
+    lock = threading.Lock()
+    queue = list(reversed(paths))
+
+    def client():
+        while True:
+            with lock:
+                if not queue:
+                    return
+                path = queue.pop()
+            start = time.perf_counter()
+            fetch(path)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as ex:
+        for _ in range(clients):
+            ex.submit(client)
+    return latencies, time.perf_counter() - start
+
+def run_http(base, clients, total):
+    with urllib.request.urlopen(base + '/api/players', timeout=30) as r:
+        names = [p['name'] for p in json.load(r)]
+    paths = ['/player/' + urllib.parse.quote(names[i % len(names)]) for i in range(total)]
+
+    def fetch(path):
+        with urllib.request.urlopen(base + path, timeout=60) as r:
+            r.read()
+
+    header()
+    report(base, *closed_loop(paths, clients, fetch))
+
+def run_in_process(latency, threads, clients, total):
+    os.environ['CACHE_URL'] = 'off'
+    os.environ['RATE_LIMIT_URL'] = 'off'
+    # no admission gate, so both modes serve every request
+    os.environ['MAX_IN_FLIGHT'] = '0'
+    os.environ['ASYNC_PAGE_THREADS'] = str(threads)
+    import app as wsgi
+    import asgi
+
+    class StubResponse:
+        status_code = 200
+
+        @staticmethod
+        def json():
+            return {'extract': 'stub summary'}
+
+    def slow_get(*args, **kwargs):
+        time.sleep(latency)
+        return StubResponse()
+
+    wsgi.requests.get = slow_get
+    names = list(wsgi.players)
+    paths = ['/player/' + names[i % len(names)] for i in range(total)]
+
+    # sync: `threads` request threads (as gunicorn -k gthread --threads N,
+    # or N sync workers), each busy for the whole request
+    workers = threading.BoundedSemaphore(threads)
+
+    def sync_fetch(path):
+        with workers:
+            r = wsgi.app.test_client().get(path)
+            assert r.status_code == 200, r.status_code
+
+    # async: one event loop in front of the same number of page threads
+    async def asgi_fetch(path):
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'headers': [],
+                 'http_version': '1.1', 'scheme': 'http', 'server': ('localhost', 8000), 'client': ('127.0.0.1', 1)}
+        await asgi.app(scope, receive, send)
+        assert sent[0]['status'] == 200, sent[0]['status']
+
+    async def asgi_closed_loop():
+        latencies = []
+        queue = list(reversed(paths))
+
+        async def client():
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                await asgi_fetch(path)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[client() for _ in range(clients)])
+        return latencies, time.perf_counter() - start
+
+    print(f"{total} player pages, {clients} clients, {threads} page threads, outbound call {latency * 1000:.0f}ms")
+    header()
+    report('sync (app:app)', *closed_loop(paths, clients, sync_fetch))
+    report('async (asgi:app)', *asyncio.run(asgi_closed_loop()))
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1].startswith('http'):
+        run_http(sys.argv[1].rstrip('/'), int(sys.argv[2]) if len(sys.argv) > 2 else 32,
+                 int(sys.argv[3]) if len(sys.argv) > 3 else 256)
+    else:
+        args = sys.argv[1:]
+        run_in_process(float(args[0]) if len(args) > 0 else 0.5, int(args[1]) if len(args) > 1 else 4,
+                       int(args[2]) if len(args) > 2 else 32, int(args[3]) if len(args) > 3 else 128)
+
+if __name__ == '__main__':
+    main()
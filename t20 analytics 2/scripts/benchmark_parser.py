@@ -0,0 +1,114 @@
+import json
+import sys
+import time
+from pathlib import Path
+
+# Times the schema-driven row parser (schema.py) against the per-field
+# coercion the aggregators used before it, over every scorecard row, one
+# block (match) at a time as the app parses them, both on the parsed JSON
+# dicts and on the compact records the app keeps. After the first repeat
+# the parser's tables hold every value in the files; the "cold" lines start
+# each repeat from empty tables, as the app's single pass at startup does.
+# Run from the project root: python scripts/benchmark_parser.py [repeats]
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import records
+import schema
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+REPEATS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+def legacy_overs_to_balls(overs_str):
+    try:
+        if '.' in overs_str:
+            o, s = overs_str.split('.')
+            return int(o) * 6 + int(s)
+        return int(float(overs_str)) * 6
+    except:
+        return 0
+
+def legacy_batting(r):
+    # the fields add_batting_row, innings_total and the dismissal index read
+    name = r.get('batsmanName', '').strip()
+    runs = int(r.get('runs', '0')) if r.get('runs', '0').isdigit() else 0
+    balls = int(r.get('balls', '0')) if str(r.get('balls', '0')).isdigit() else 0
+    _4s = int(r.get('4s', '0')) if str(r.get('4s', '0')).isdigit() else 0
+    _6s = int(r.get('6s', '0')) if str(r.get('6s', '0')).isdigit() else 0
+    pos = r.get('battingPos', None)
+    try:
+        pos = int(pos) if pos is not None else None
+    except:
+        pos = None
+    team = r.get('teamInnings', '')
+    dismissal = (r.get('dismissal') or '').strip()
+    batter_runs = int(r.get('runs', '0')) if str(r.get('runs', '0')).isdigit() else 0
+    return name, team, runs, balls, _4s, _6s, pos, dismissal, batter_runs, r.get('match', '')
+
+def legacy_bowling(r):
+    name = r.get('bowlerName', '').strip()
+    runs = int(r.get('runs', '0')) if str(r.get('runs', '0')).isdigit() else 0
+    wickets = int(r.get('wickets', '0')) if str(r.get('wickets', '0')).isdigit() else 0
+    balls = legacy_overs_to_balls(r.get('overs', '0'))
+    maiden = int(r.get('maiden', '0')) if str(r.get('maiden', '0')).isdigit() else 0
+    zeros = int(r.get('0s', '0')) if str(r.get('0s', '0')).isdigit() else 0
+    team = r.get('bowlingTeam', '')
+    total_balls = legacy_overs_to_balls(r.get('overs', '0'))
+    total_runs = int(r.get('runs', '0')) if str(r.get('runs', '0')).isdigit() else 0
+    return name, team, runs, wickets, balls, maiden, zeros, total_balls, total_runs, r.get('match', '')
+
+def blocks_of(blocks, key, row_type=None):
+    return [[row_type(r) if row_type else r for r in b.get(key, [])] for b in blocks]
+
+def timed(fn):
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def bench(label, batting, bowling, cold=False):
+    errors = []
+    location = {'block': 0}
+    n = sum(map(len, batting + bowling)) * REPEATS
+
+    def legacy():
+        for _ in range(REPEATS):
+            for block in batting:
+                for r in block:
+                    legacy_batting(r)
+            for block in bowling:
+                for r in block:
+                    legacy_bowling(r)
+
+    def parsed():
+        parse_batting, parse_bowling = schema.parse_batting, schema.parse_bowling
+        for _ in range(REPEATS):
+            if cold:
+                parse_batting = schema.compile_schema(schema.BATTING_SCHEMA, 'batting')
+                parse_bowling = schema.compile_schema(schema.BOWLING_SCHEMA, 'bowling')
+            for block in batting:
+                parse_batting(block, errors, location)
+            for block in bowling:
+                parse_bowling(block, errors, location)
+
+    old, new = timed(legacy), timed(parsed)
+    print(f"{label:<16}{1e6 * old / n:>14.2f}{1e6 * new / n:>14.2f}{old / new:>10.2f}x")
+
+batting_json = load_json('data/t20_wc_batting_summary.json')
+bowling_json = load_json('data/t20_wc_bowling_summary.json')
+batting = blocks_of(batting_json, 'battingSummary')
+bowling = blocks_of(bowling_json, 'bowlingSummary')
+batting_records = blocks_of(batting_json, 'battingSummary', records.BattingRow)
+bowling_records = blocks_of(bowling_json, 'bowlingSummary', records.BowlingRow)
+print(f"{sum(map(len, batting))} batting + {sum(map(len, bowling))} bowling rows, "
+      f"{REPEATS} repeats (best of 3)")
+print(f"{'rows':<16}{'legacy us/row':>14}{'schema us/row':>14}{'speedup':>11}")
+bench('dicts', batting, bowling)
+bench('records', batting_records, bowling_records)
+bench('dicts (cold)', batting, bowling, cold=True)
+bench('records (cold)', batting_records, bowling_records, cold=True)
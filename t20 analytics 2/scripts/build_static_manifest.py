@@ -0,0 +1,49 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+# Fingerprint static assets into content-hashed copies under static/dist and
+# write static/manifest.json mapping the original path to the hashed one.
+# app.py reads the manifest at startup; asset_url() in the templates emits the
+# hashed URLs and send_static serves them with an immutable Cache-Control.
+# Run from the project root (same as the other scripts): python scripts/build_static_manifest.py
+
+static_dir = Path('static')
+dist_dir = static_dir / 'dist'
+manifest_path = static_dir / 'manifest.json'
+
+# Only fingerprint what the pages actually reference
+ASSET_DIRS = ['css', 'js', 'images']
+ASSET_EXTS = {'.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.webp', '.gif', '.ico'}
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+if dist_dir.exists():
+    shutil.rmtree(dist_dir)
+
+manifest = {}
+for sub in ASSET_DIRS:
+    for root, _, files in os.walk(static_dir / sub):
+        for fname in sorted(files):
+            src = Path(root) / fname
+            if src.suffix.lower() not in ASSET_EXTS:
+                continue
+            rel = src.relative_to(static_dir).as_posix()
+            hashed = f"{src.stem}.{file_hash(src)}{src.suffix}"
+            dest = dist_dir / src.parent.relative_to(static_dir) / hashed
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(src, dest)
+            manifest[rel] = dest.relative_to(static_dir).as_posix()
+
+with open(manifest_path, 'w', encoding='utf-8') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+
+print(f"Fingerprinted {len(manifest)} files into {dist_dir}")
+print(f"Wrote {manifest_path}")
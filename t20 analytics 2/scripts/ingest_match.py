@@ -0,0 +1,46 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+# Add a played match to the running app: validates the match and appends it
+# to the ingest log (ingest_log.py), which every app worker reads before its
+# next request and replays at startup.
+#   python scripts/ingest_match.py match.json
+# match.json: {"summary": {...}, "batting": [...], "bowling": [...]}, with the
+# summary and rows in the format of data/t20_wc_match_results.json,
+# t20_wc_batting_summary.json and t20_wc_bowling_summary.json.
+# Run from the project root (same as the other scripts). DATA_DIR and
+# INGEST_LOG_PATH are read as in app.py.
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import ingest_log
+
+data_dir = os.environ.get('DATA_DIR', 'data')
+log_path = os.environ.get('INGEST_LOG_PATH', os.path.join(data_dir, 'ingested_matches.jsonl'))
+
+def loaded_scorecards():
+    with open(os.path.join(data_dir, 't20_wc_match_results.json'), 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    known = {m.get('scorecard') for block in results for m in block.get('matchSummary', [])}
+    logged, _ = ingest_log.read_from(log_path, 0)
+    return known | {e['summary'].get('scorecard') for e in logged}
+
+if len(sys.argv) != 2:
+    print('usage: python scripts/ingest_match.py match.json')
+    sys.exit(1)
+
+with open(sys.argv[1], 'r', encoding='utf-8') as f:
+    entry = json.load(f)
+try:
+    ingest_log.validate(entry)
+except ValueError as e:
+    print(f"Invalid match: {e}")
+    sys.exit(1)
+scorecard = entry['summary'].get('scorecard')
+if scorecard and scorecard in loaded_scorecards():
+    print(f"{scorecard} is already loaded")
+    sys.exit(1)
+ingest_log.append(log_path, entry)
+print(f"{entry['summary']['team1']} v {entry['summary']['team2']} appended to {log_path}")
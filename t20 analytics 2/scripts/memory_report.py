@@ -0,0 +1,60 @@
+import json
+import sys
+from pathlib import Path
+
+# Memory used by the loaded dataset: the scorecard rows and the player
+# records as parsed dicts versus the compact records (records.py) the app
+# keeps after ingest. Sizes are deep sizes in which every object, e.g. a
+# string shared by many rows, is counted once.
+# Run from the project root: python scripts/memory_report.py
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import records
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def deep_size(obj):
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, records.Record):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+            if o._extra is not None:
+                total += sys.getsizeof(o._extra)
+        elif isinstance(o, (list, tuple, set)):
+            stack.extend(o)
+    return total
+
+def report(label, before, after):
+    b, a = deep_size(before), deep_size(after)
+    print(f"{label:<18}{b / 1024:>12.1f}{a / 1024:>12.1f}{100 * (b - a) / b:>9.1f}%")
+    return b, a
+
+raw_batting = load_json('data/t20_wc_batting_summary.json')
+raw_bowling = load_json('data/t20_wc_bowling_summary.json')
+
+import app  # loads and ingests the same files
+
+print(f"{'':<18}{'dicts KB':>12}{'records KB':>12}{'saved':>10}")
+totals = [
+    report('batting rows', raw_batting, app.batting_json),
+    report('bowling rows', raw_bowling, app.bowling_json),
+    report('player records', [dict(p) for p in app.players.values()], list(app.players.values()))
+]
+before = sum(b for b, _ in totals)
+after = sum(a for _, a in totals)
+print(f"{'total':<18}{before / 1024:>12.1f}{after / 1024:>12.1f}{100 * (before - after) / before:>9.1f}%")
+ids = app.ingest_state['ids']
+print(f"ids: {len(ids['player'])} players, {len(ids['team'])} teams, {len(ids['match'])} matches")
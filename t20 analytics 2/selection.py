@@ -0,0 +1,274 @@
+import math
+import time
+
+import numpy as np
+
+# Best XI selection engine used by /api/best11.
+# Picks the XI that maximizes a weighted sum of player stats subject to role
+# counts, a wicketkeeper, minimum bowling overs and a max-per-team cap, using
+# an exact dynamic program over a pruned candidate pool.
+
+XI_SIZE = 11
+ROLES = ('batter', 'allrounder', 'bowler')
+MAX_OVERS_PER_BOWLER = 4.0
+NEG = -1e18
+
+DEFAULT_WEIGHTS = {'runs': 1.0, 'wickets': 20.0}
+
+DEFAULT_CONSTRAINTS = {
+    'min_batter': 4, 'max_batter': 6,
+    'min_allrounder': 1, 'max_allrounder': 4,
+    'min_bowler': 3, 'max_bowler': 5,
+    'min_keepers': 1,
+    'min_bowling_overs': 20.0,
+    'max_per_team': 4,
+    'team': None
+}
+
+# Squads rarely split 4/1/3 the way a tournament XI would, so a single-team XI
+# only asks for a balanced side by default.
+TEAM_XI_CONSTRAINTS = {
+    'min_batter': 3, 'max_batter': 7,
+    'min_allrounder': 0, 'max_allrounder': 7,
+    'min_bowler': 2, 'max_bowler': 6
+}
+
+def effective_constraints(constraints=None):
+    # the defaults (a balanced side for a single team) with `constraints` on top
+    constraints = constraints or {}
+    cons = dict(DEFAULT_CONSTRAINTS)
+    if constraints.get('team'):
+        cons.update(TEAM_XI_CONSTRAINTS)
+    cons.update(constraints)
+    return cons
+
+def check_constraints(cons):
+    # Raises ValueError unless every bound can be met by some XI shape; the
+    # DP table grows with min_keepers and min_bowling_overs, so they are
+    # capped at what 11 players can reach.
+    for r in ROLES:
+        if not 0 <= int(cons[f'min_{r}']) <= int(cons[f'max_{r}']) <= XI_SIZE:
+            raise ValueError(f'need 0 <= min_{r} <= max_{r} <= {XI_SIZE}')
+    if not 0 <= int(cons['min_keepers']) <= XI_SIZE:
+        raise ValueError(f'min_keepers must be between 0 and {XI_SIZE}')
+    if int(cons['max_per_team']) < 1:
+        raise ValueError('max_per_team must be at least 1')
+    max_overs = XI_SIZE * MAX_OVERS_PER_BOWLER
+    if not 0 <= float(cons['min_bowling_overs']) <= max_overs:
+        raise ValueError(f'min_bowling_overs must be between 0 and {max_overs:g}')
+    return cons
+
+def role_bucket(playing_role):
+    role = (playing_role or '').lower()
+    if 'allrounder' in role:
+        return 'allrounder'
+    if 'bowler' in role:
+        return 'bowler'
+    return 'batter'
+
+def bowling_capacity(p):
+    # Overs a player can be trusted with in an innings: their longest spell of
+    # the tournament, rounded down to half an over and capped at 4.
+    longest = (p.get('max_spell_balls') or 0) / 6
+    return min(MAX_OVERS_PER_BOWLER, math.floor(longest * 2 + 1e-9) / 2)
+
+def eligible(p):
+    return bool(p.get('innings') or p.get('innings_bowled'))
+
+def candidate(p):
+    return {
+        'name': p['name'],
+        'team': p.get('team') or '',
+        'role': role_bucket(p.get('playingRole')),
+        'keeper': 'wicketkeeper' in (p.get('playingRole') or '').lower(),
+        'bowl_cap': bowling_capacity(p),
+        'player': p
+    }
+
+def build_candidate_pool(players):
+    return [candidate(p) for p in players.values() if eligible(p)]
+
+def update_candidate_pool(pool, players, names):
+    # Refreshes the entries of `names` in place after an ingest. A player who
+    # becomes eligible is placed where build_candidate_pool would put them.
+    entries = {c['name']: c for c in pool}
+    added = False
+    for name in names:
+        p = players[name]
+        if name in entries:
+            entries[name].update(candidate(p))
+        elif eligible(p):
+            entries[name] = candidate(p)
+            added = True
+    if added:
+        pool[:] = [entries[n] for n in players if n in entries]
+
+def player_value(p, weights):
+    total = 0.0
+    for stat, w in weights.items():
+        v = p.get(stat)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            total += w * v
+    return total
+
+def prune_dominated(cands, per_team_limit):
+    # Drop candidates that can never be needed. q dominates c when it has the
+    # same role and keeper flag, at least the value and at least the bowling
+    # capacity. If c is in an XI, some dominator can replace it unless every
+    # dominator is already picked (at most 10) or sits on a team that is full
+    # (at most 10 // per_team_limit other teams). So c is safe to drop when
+    # its dominators outnumber that worst case.
+    n = len(cands)
+    if n == 0:
+        return cands
+    value = np.array([c['value'] for c in cands])
+    cap = np.array([c['bowl_cap'] for c in cands])
+    group = np.array([hash((c['role'], c['keeper'])) for c in cands])
+    team_ids = {}
+    team = np.array([team_ids.setdefault(c['team'], len(team_ids)) for c in cands])
+    order = np.arange(n)
+    # dom[i, j]: j dominates i (ties broken by position so it is never mutual)
+    dom = ((group[None, :] == group[:, None]) & (value[None, :] >= value[:, None]) & (cap[None, :] >= cap[:, None])
+           & ((value[None, :] > value[:, None]) | (cap[None, :] > cap[:, None]) | (order[None, :] < order[:, None])))
+    full_teams = (XI_SIZE - 1) // per_team_limit
+    kept = []
+    for i, c in enumerate(cands):
+        doms = team[dom[i]]
+        if len(doms) < per_team_limit:
+            kept.append(c)
+            continue
+        same_team = int((doms == team[i]).sum())
+        if same_team >= per_team_limit:
+            continue
+        other = np.bincount(doms[doms != team[i]], minlength=len(team_ids))
+        blocked = XI_SIZE - 1 + (int(np.sort(other)[::-1][:full_teams].sum()) if full_teams else 0)
+        if len(doms) > blocked:
+            continue
+        kept.append(c)
+    return kept
+
+def _step(arr, axes):
+    # Shift `arr` up by one along each of `axes`, dropping what falls off the end
+    out = np.full_like(arr, NEG)
+    dst = [slice(None)] * arr.ndim
+    src = [slice(None)] * arr.ndim
+    for axis in axes:
+        dst[axis] = slice(1, None)
+        src[axis] = slice(0, -1)
+    out[tuple(dst)] = arr[tuple(src)]
+    return out
+
+def _shift(arr, axis, k, saturate):
+    # Shift `arr` up by k along `axis`. Entries pushed past the end are dropped,
+    # or folded into the last slot when `saturate` is set ("at least N" counters);
+    # in that case also return which source index won each folded slot.
+    if k == 0:
+        return arr, None
+    n = arr.shape[axis]
+    out = np.full_like(arr, NEG)
+    if k < n:
+        dst = [slice(None)] * arr.ndim
+        src = [slice(None)] * arr.ndim
+        dst[axis] = slice(k, n)
+        src[axis] = slice(0, n - k)
+        out[tuple(dst)] = arr[tuple(src)]
+    rec = None
+    if saturate:
+        lo = max(0, n - 1 - k)
+        tail = [slice(None)] * arr.ndim
+        tail[axis] = slice(lo, n)
+        block = arr[tuple(tail)]
+        last = [slice(None)] * arr.ndim
+        last[axis] = n - 1
+        out[tuple(last)] = block.max(axis=axis)
+        rec = block.argmax(axis=axis) + lo
+    return out, rec
+
+def _drop(state, axis):
+    return state[:axis] + state[axis + 1:]
+
+def select_xi(pool, weights=None, constraints=None):
+    weights = weights or DEFAULT_WEIGHTS
+    cons = check_constraints(effective_constraints(constraints))
+    started = time.perf_counter()
+
+    team = (cons.get('team') or '').lower()
+    max_per_team = XI_SIZE if team else min(XI_SIZE, int(cons['max_per_team']))
+    role_min = {r: int(cons[f'min_{r}']) for r in ROLES}
+    role_max = {r: min(XI_SIZE, int(cons[f'max_{r}'])) for r in ROLES}
+    min_keepers = int(cons['min_keepers'])
+    min_half_overs = int(math.ceil(float(cons['min_bowling_overs']) * 2 - 1e-9))
+
+    cands = [dict(c, value=player_value(c['player'], weights), half_overs=int(c['bowl_cap'] * 2 + 1e-9))
+             for c in pool if not team or c['team'].lower() == team]
+    cands = prune_dominated(cands, max_per_team)
+    cands.sort(key=lambda c: (c['team'], -c['value'], c['name']))
+
+    # Exact DP over the candidate pool. State axes: batters, allrounders,
+    # bowlers, picks from the current team, keepers (capped at the minimum) and
+    # half-overs of bowling (capped at the minimum). Candidates are processed
+    # team by team so the team axis only has to count one team at a time. The
+    # capped axes come last so folding them stays on contiguous memory.
+    use_team_axis = max_per_team < XI_SIZE
+    shape = (role_max['batter'] + 1, role_max['allrounder'] + 1, role_max['bowler'] + 1,
+             max_per_team + 1 if use_team_axis else 1, min_keepers + 1, max(0, min_half_overs) + 1)
+    T_AXIS, K_AXIS, O_AXIS = 3, 4, 5
+    dp = np.full(shape, NEG)
+    dp[0, 0, 0, 0, 0, 0] = 0.0
+    steps = []
+    prev_team = None
+    for c in cands:
+        team_rec = None
+        if use_team_axis and prev_team is not None and c['team'] != prev_team:
+            team_rec = dp.argmax(axis=T_AXIS)
+            collapsed = dp.max(axis=T_AXIS)
+            dp = np.full(shape, NEG)
+            dp[:, :, :, 0] = collapsed
+        prev_team = c['team']
+        moved = _step(dp, (ROLES.index(c['role']), T_AXIS) if use_team_axis else (ROLES.index(c['role']),))
+        moved, keep_rec = _shift(moved, K_AXIS, int(c['keeper']), True)
+        moved, overs_rec = _shift(moved, O_AXIS, c['half_overs'], True)
+        moved += c['value']
+        take = moved > dp
+        np.maximum(dp, moved, out=dp)
+        steps.append((take, keep_rec, overs_rec, team_rec))
+
+    # Final states: exactly 11 players, every minimum met
+    b, a, w = np.meshgrid(np.arange(shape[0]), np.arange(shape[1]), np.arange(shape[2]), indexing='ij')
+    ok = (b + a + w == XI_SIZE) & (b >= role_min['batter']) & (a >= role_min['allrounder']) & (w >= role_min['bowler'])
+    final = np.where(ok[..., None], dp[:, :, :, :, -1, -1], NEG)
+    best_idx = np.unravel_index(int(final.argmax()), final.shape)
+    best_value = float(final[best_idx])
+
+    picks = []
+    if best_value > NEG / 2:
+        state = [best_idx[0], best_idx[1], best_idx[2], best_idx[3], shape[K_AXIS] - 1, shape[O_AXIS] - 1]
+        for c, (take, keep_rec, overs_rec, team_rec) in zip(reversed(cands), reversed(steps)):
+            if take[tuple(state)]:
+                picks.append(c)
+                if overs_rec is not None and state[O_AXIS] == shape[O_AXIS] - 1:
+                    state[O_AXIS] = int(overs_rec[_drop(tuple(state), O_AXIS)])
+                else:
+                    state[O_AXIS] -= c['half_overs']
+                if keep_rec is not None and state[K_AXIS] == shape[K_AXIS] - 1:
+                    state[K_AXIS] = int(keep_rec[_drop(tuple(state), K_AXIS)])
+                else:
+                    state[K_AXIS] -= int(c['keeper'])
+                state[ROLES.index(c['role'])] -= 1
+                if use_team_axis:
+                    state[T_AXIS] -= 1
+            if team_rec is not None:
+                state[T_AXIS] = int(team_rec[_drop(tuple(state), T_AXIS)])
+        picks.sort(key=lambda c: (ROLES.index(c['role']), -c['value']))
+
+    return {
+        'feasible': bool(picks),
+        'objective': round(best_value, 2) if picks else None,
+        'players': [c['player'] for c in picks],
+        'roles': {c['name']: c['role'] + (' (wk)' if c['keeper'] else '') for c in picks},
+        'bowling_overs': round(sum(c['half_overs'] for c in picks) / 2, 1),
+        'weights': weights,
+        'constraints': cons,
+        'candidates': len(cands),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,116 @@
+import numpy as np
+
+# Player similarity: each player becomes a vector of z-scored batting and
+# bowling rates, shrunk towards the tournament average by sample size (a
+# 6-ball cameo says less than 150 balls). Neighbour lists are precomputed per
+# snapshot so /api/player/<name>/similar is a slice of an array.
+
+BATTING_FEATURES = ['strike_rate', 'bat_avg', 'boundary_pct', 'avg_ball_faced', 'batting_position']
+BOWLING_FEATURES = ['economy', 'wickets_per_over', 'dot_pct', 'overs_per_innings']
+# player fields the vectors are built from
+INPUTS = set(BATTING_FEATURES) | {'innings', 'balls', 'economy', 'dot_pct', 'wickets', 'balls_bowled', 'innings_bowled'}
+
+# balls at which a player's profile counts for half (shrinkage constant)
+BATTING_PRIOR_BALLS = 60
+BOWLING_PRIOR_BALLS = 60
+
+EXACT_LIMIT = 3000  # full distance matrix up to this many players
+K_MAX = 50          # neighbours stored per player
+
+def _bowling_value(p, feature):
+    balls = p.get('balls_bowled') or 0
+    if balls <= 0:
+        return np.nan
+    if feature == 'wickets_per_over':
+        return (p.get('wickets') or 0) / (balls / 6)
+    if feature == 'overs_per_innings':
+        return (balls / 6) / max(p.get('innings_bowled') or 1, 1)
+    v = p.get(feature)
+    return np.nan if v is None else float(v)
+
+def _zscore_block(raw, weight):
+    # z-score each column over players that have a value, then scale each
+    # row by its reliability weight; players without a value sit at 0 (average)
+    out = np.zeros_like(raw)
+    for j in range(raw.shape[1]):
+        col = raw[:, j]
+        ok = ~np.isnan(col)
+        if ok.sum() < 2:
+            continue
+        mu, sd = col[ok].mean(), col[ok].std()
+        if sd > 0:
+            out[ok, j] = (col[ok] - mu) / sd
+    return out * weight[:, None]
+
+def build_feature_matrix(rows):
+    bat_raw = np.array([[np.nan if (p.get('innings') or 0) <= 0 or p.get(f) is None else float(p.get(f))
+                         for f in BATTING_FEATURES] for p in rows], dtype=float).reshape(len(rows), len(BATTING_FEATURES))
+    bowl_raw = np.array([[_bowling_value(p, f) for f in BOWLING_FEATURES] for p in rows],
+                        dtype=float).reshape(len(rows), len(BOWLING_FEATURES))
+    bat_balls = np.array([p.get('balls') or 0 for p in rows], dtype=float)
+    bowl_balls = np.array([p.get('balls_bowled') or 0 for p in rows], dtype=float)
+    bat_w = bat_balls / (bat_balls + BATTING_PRIOR_BALLS)
+    bowl_w = bowl_balls / (bowl_balls + BOWLING_PRIOR_BALLS)
+    return np.hstack([_zscore_block(bat_raw, bat_w), _zscore_block(bowl_raw, bowl_w)])
+
+def _top_k(dist, k, exclude):
+    # smallest k distances per row, excluding each row's own index
+    dist[np.arange(len(exclude)), exclude] = np.inf
+    k = min(k, dist.shape[1] - 1)
+    if k <= 0:
+        return np.zeros((dist.shape[0], 0), dtype=np.int32), np.zeros((dist.shape[0], 0), dtype=np.float32)
+    part = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    pd = np.take_along_axis(dist, part, axis=1)
+    order = np.argsort(pd, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1).astype(np.int32), np.take_along_axis(pd, order, axis=1).astype(np.float32)
+
+def _sq_dists(a, b):
+    d = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2 * a @ b.T
+    return np.maximum(d, 0)
+
+def _kmeans(X, k, iters=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = X[rng.choice(len(X), k, replace=False)]
+    for _ in range(iters):
+        assign = _sq_dists(X, centroids).argmin(1)
+        for c in range(k):
+            members = X[assign == c]
+            if len(members):
+                centroids[c] = members.mean(0)
+    return centroids, _sq_dists(X, centroids).argmin(1)
+
+def build_neighbour_index(X, k_max=K_MAX, nprobe=8):
+    # Exact all-pairs distances for small rosters. Larger archives use an
+    # inverted-file index: k-means cells, each player only compared against
+    # members of its `nprobe` nearest cells (approximate but near-linear).
+    n = len(X)
+    if n <= EXACT_LIMIT:
+        dist = _sq_dists(X, X)
+        idx, d = _top_k(dist, k_max, np.arange(n))
+        return {'neighbours': idx, 'distances': np.sqrt(d), 'exact': True}
+    cells = max(1, int(np.sqrt(n)))
+    centroids, assign = _kmeans(X, cells)
+    members = [np.flatnonzero(assign == c) for c in range(cells)]
+    # each cell's own members first, then the closest other cells
+    near_cells = np.argsort(_sq_dists(centroids, centroids), axis=1)
+    near_cells = [[c] + [o for o in near_cells[c] if o != c][:nprobe - 1] for c in range(cells)]
+    idx = np.full((n, min(k_max, n - 1)), -1, dtype=np.int32)
+    dist_out = np.full(idx.shape, np.inf, dtype=np.float32)
+    for c in range(cells):
+        rows = members[c]
+        if not len(rows):
+            continue
+        pool = np.concatenate([members[o] for o in near_cells[c]])
+        dist = _sq_dists(X[rows], X[pool])
+        # own cell comes first in the pool, so row i of the cell is column i
+        local_idx, local_d = _top_k(dist, idx.shape[1], np.arange(len(rows)))
+        found = local_idx.shape[1]
+        idx[rows, :found] = pool[local_idx]
+        dist_out[rows, :found] = np.sqrt(local_d)
+    return {'neighbours': idx, 'distances': dist_out, 'exact': False}
+
+def similar(index, row, k):
+    ids = index['neighbours'][row, :k]
+    ds = index['distances'][row, :k]
+    keep = ids >= 0
+    return ids[keep].tolist(), ds[keep].tolist()
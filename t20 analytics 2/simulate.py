@@ -0,0 +1,257 @@
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Monte Carlo match / tournament simulator behind /api/simulate, built from
+# the per-player distributions in the aggregates. Each side plays its likely
+# XI (the eleven players with the most appearances, in their usual batting
+# order) unless an XI is given. An innings walks down the batting order:
+# every batter's innings is a (runs, balls faced) pair drawn from their own
+# innings in the tournament - mixed with the innings of everyone who batted
+# in the same part of the order while they have only a few - until the 120
+# balls are used up or the order runs out. The fielding XI's economy and
+# wicket rate (per ball, shrunk towards the tournament rate) scale the draws:
+# a side that takes wickets more often shortens every innings, a tight one
+# lowers the scoring rate. All simulations of a match are drawn as one array,
+# in fixed-size chunks with their own child seeds, so a seed gives the same
+# answer whether the chunks run in-process or on the process pool.
+
+INNINGS_BALLS = 120
+XI = 11
+PRIOR_INNINGS = 3      # own innings at which a batter's draws are half their own
+PRIOR_BALLS = 240      # two innings worth of tournament-average bowling
+CHUNK_SIZE = 50000
+Z95 = 1.959964
+
+_pool = None
+
+def band(position):
+    # top (1-3), middle (4-7) and lower order (8-11)
+    return 0 if position <= 3 else 1 if position <= 7 else 2
+
+def likely_xi(squad):
+    # squad: player dicts of one team -> eleven names in batting order
+    # most appearances first, the most recently seen on a tie
+    by_name = sorted(squad, key=lambda p: p['name'])
+    picked = sorted(sorted(by_name, key=lambda p: p['last_seen'], reverse=True), key=lambda p: -p['appearances'])[:XI]
+    return [p['name'] for p in sorted(picked, key=lambda p: (p['position'], p['name']))]
+
+def build_model(players, fixtures, extras_rate):
+    # players: [{'name', 'team', 'appearances', 'last_seen', 'position', 'runs':
+    # [per innings], 'balls': [per innings], 'bowl_balls', 'bowl_runs',
+    # 'wickets'}]; fixtures: [{'match', 'id', 'team1', 'team2', 'winner',
+    # 'ground', 'date'}] in playing order
+    squads = {}
+    for p in players:
+        if p['team']:
+            squads.setdefault(p['team'], []).append(p)
+    for f in fixtures:
+        for team in (f['team1'], f['team2']):
+            if team:
+                squads.setdefault(team, [])
+    teams = sorted(squads)
+    balls = sum(p['bowl_balls'] for p in players)
+    pools = [[], [], []]
+    for p in players:
+        pools[band(p['position'])].append(p)
+    model = {
+        'teams': teams,
+        'index': {t.lower(): i for i, t in enumerate(teams)},
+        'players': {p['name'].lower(): p for p in players},
+        'xis': {t: likely_xi(squads[t]) for t in teams},
+        'pools': [([r for p in pool for r in p['runs']], [b for p in pool for b in p['balls']]) for pool in pools],
+        'runs_per_ball': sum(p['bowl_runs'] for p in players) / balls if balls else 1.0,
+        'wickets_per_ball': sum(p['wickets'] for p in players) / balls if balls else 1 / 20,
+        'extras_rate': extras_rate,
+        'fixtures': fixtures
+    }
+    model['tables'] = team_tables(model, model['xis'])
+    return model
+
+def resolve_xis(model, xis):
+    # xis: {team: [player names]} overriding the likely XIs -> {team: names}.
+    # Raises ValueError on an unknown team or player.
+    out = dict(model['xis'])
+    for team, names in (xis or {}).items():
+        i = model['index'].get(team.strip().lower())
+        if i is None:
+            raise ValueError(f'unknown team: {team}')
+        picked = []
+        for name in names:
+            p = model['players'].get(name.strip().lower())
+            if p is None:
+                raise ValueError(f'unknown player: {name}')
+            picked.append(p)
+        if not 1 <= len(picked) <= XI or len({p['name'] for p in picked}) != len(picked):
+            raise ValueError(f'an XI needs 1 to {XI} different players ({team})')
+        out[model['teams'][i]] = [p['name'] for p in picked]
+    return out
+
+def team_tables(model, xis):
+    # Flat arrays of every innings that can be drawn, and per team and batting
+    # slot where its batter's own innings and its band of the order sit
+    # (slots past a short XI draw from the band only).
+    runs = [r for pool_runs, _ in model['pools'] for r in pool_runs]
+    balls = [b for _, pool_balls in model['pools'] for b in pool_balls]
+    pool_start = np.cumsum([0] + [len(r) for r, _ in model['pools']])[:-1]
+    pool_count = [len(r) for r, _ in model['pools']]
+    shape = (len(model['teams']), XI)
+    tables = {k: np.zeros(shape, dtype=np.int64) for k in ('own_start', 'own_count', 'pool_start', 'pool_count')}
+    tables['weight'] = np.zeros(shape)
+    tables['econ'] = np.ones(len(model['teams']))
+    tables['survive'] = np.ones(len(model['teams']))
+    rpb, wpb = model['runs_per_ball'], model['wickets_per_ball']
+    for i, team in enumerate(model['teams']):
+        xi = [model['players'][n.lower()] for n in xis.get(team, [])]
+        for j in range(XI):
+            k = band(j + 1)
+            tables['pool_start'][i, j], tables['pool_count'][i, j] = pool_start[k], pool_count[k]
+            if j < len(xi) and xi[j]['runs']:
+                own = len(xi[j]['runs'])
+                tables['own_start'][i, j], tables['own_count'][i, j] = len(runs), own
+                tables['weight'][i, j] = own / (own + PRIOR_INNINGS)
+                runs += xi[j]['runs']
+                balls += xi[j]['balls']
+        bowled = sum(p['bowl_balls'] for p in xi)
+        tables['econ'][i] = (sum(p['bowl_runs'] for p in xi) + PRIOR_BALLS * rpb) / (bowled + PRIOR_BALLS) / rpb
+        tables['survive'][i] = wpb / ((sum(p['wickets'] for p in xi) + PRIOR_BALLS * wpb) / (bowled + PRIOR_BALLS))
+    tables['runs'] = np.asarray(runs, dtype=float)
+    tables['balls'] = np.asarray(balls, dtype=float)
+    tables['extras_rate'] = model['extras_rate']
+    return tables
+
+def _innings(rng, t, bat, bowl):
+    # bat, bowl: arrays of team indexes, one pair per simulation -> totals
+    u = rng.random((len(bat), XI))
+    own = rng.random((len(bat), XI)) < t['weight'][bat]
+    idx = np.where(own, t['own_start'][bat] + (u * t['own_count'][bat]).astype(np.int64),
+                   t['pool_start'][bat] + (u * t['pool_count'][bat]).astype(np.int64))
+    survive = t['survive'][bowl][:, None]
+    econ = t['econ'][bowl]
+    balls = t['balls'][idx] * survive
+    runs = t['runs'][idx] * survive * econ[:, None]
+    faced = np.cumsum(balls, axis=1)
+    # the share of each innings played before the 120 balls ran out
+    left = np.clip(INNINGS_BALLS - (faced - balls), 0, None)
+    share = np.clip(left / np.maximum(balls, 1e-9), 0, 1)
+    used = np.minimum(faced[:, -1], INNINGS_BALLS)
+    return np.rint((runs * share).sum(axis=1) + t['extras_rate'] * econ * used)
+
+def _play(rng, t, a, b):
+    # -> winner indexes, shaped like a; a tie goes to a coin flip (super over)
+    shape, a, b = a.shape, a.ravel(), b.ravel()
+    sa = _innings(rng, t, a, b)
+    sb = _innings(rng, t, b, a)
+    coin = rng.random(a.shape) < 0.5
+    return np.where(sa > sb, a, np.where(sb > sa, b, np.where(coin, a, b))).reshape(shape)
+
+def _run_chunk(args):
+    # 'bracket': plays `n` copies of the bracket and returns how often each
+    # team reached the final and won it. 'fixtures': plays every fixture `n`
+    # times and returns how often its first team won.
+    t, kind, payload, n, seed = args
+    rng = np.random.default_rng(seed)
+    if kind == 'fixtures':
+        return [np.array([np.count_nonzero(_play(rng, t, np.full(n, a), np.full(n, b)) == a)]) for a, b in payload]
+    field = np.tile(np.asarray(payload), (n, 1))
+    # the teams listed first get byes until the field is a power of two
+    byes = (1 << (field.shape[1] - 1).bit_length()) - field.shape[1]
+    while field.shape[1] > 2:
+        field = np.hstack([field[:, :byes], _play(rng, t, field[:, byes::2], field[:, byes + 1::2])])
+        byes = 0
+    won = _play(rng, t, field[:, 0], field[:, 1])
+    return [np.bincount(field.ravel(), minlength=len(t['econ'])), np.bincount(won, minlength=len(t['econ']))]
+
+def start_pool(workers):
+    # Called once at startup, before the web server starts its threads, so
+    # the worker processes are forked from a single-threaded process. Where
+    # fork is not available everything runs in-process.
+    global _pool
+    if _pool is None and workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        _pool.submit(int).result()  # forks all the workers now
+    return _pool
+
+def _run(tables, kind, payload, n, seed, use_pool):
+    sizes = [CHUNK_SIZE] * (n // CHUNK_SIZE) + ([n % CHUNK_SIZE] if n % CHUNK_SIZE else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(tables, kind, payload, size, s) for size, s in zip(sizes, seeds)]
+    pool = _pool if use_pool and len(jobs) > 1 else None
+    results = list(pool.map(_run_chunk, jobs)) if pool else [_run_chunk(job) for job in jobs]
+    return [sum(r[k] for r in results) for k in range(len(results[0]))]
+
+def wilson_interval(wins, n, z=Z95):
+    if n == 0:
+        return (0.0, 0.0)
+    p = wins / n
+    denom = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+def _team_index(model, name):
+    i = model['index'].get(name.strip().lower())
+    if i is None:
+        raise ValueError(f'unknown team: {name}')
+    return i
+
+def _tables(model, xis):
+    return model['tables'] if xis == model['xis'] else team_tables(model, xis)
+
+def simulate_bracket(model, bracket, n, seed, xis=None, use_pool=True):
+    # bracket: team names in playing order; (0 v 1), (2 v 3), ... then the
+    # winners meet in the same order. With a field that is not a power of two
+    # the first teams get byes into the second round.
+    idx = [_team_index(model, name) for name in bracket]
+    if len(idx) < 2:
+        raise ValueError('a simulation needs at least two teams')
+    if len(set(idx)) != len(idx):
+        raise ValueError('a team appears twice')
+    xis = resolve_xis(model, xis)
+    finals, wins = _run(_tables(model, xis), 'bracket', idx, n, seed, use_pool)
+    out = []
+    for i in idx:
+        entry = {'team': model['teams'][i], 'xi': xis[model['teams'][i]]}
+        lo, hi = wilson_interval(int(wins[i]), n)
+        entry['win_prob'] = round(int(wins[i]) / n, 4)
+        entry['ci95'] = [round(lo, 4), round(hi, 4)]
+        if len(idx) > 2:
+            entry['reach_final'] = round(int(finals[i]) / n, 4)
+        out.append(entry)
+    out.sort(key=lambda e: -e['win_prob'])
+    return out
+
+def simulate_fixtures(model, start, n, seed, xis=None, use_pool=True, points_win=2, points_no_result=1):
+    # Plays the fixtures from number `start` (1-based) on as scheduled and
+    # keeps the recorded results before it. Knockout fixtures keep their
+    # scheduled teams: the source has no stage information to re-seed them.
+    fixtures = model['fixtures']
+    if not 1 <= start <= len(fixtures):
+        raise ValueError(f'from must be between 1 and {len(fixtures)}')
+    xis = resolve_xis(model, xis)
+    played, ahead = fixtures[:start - 1], fixtures[start - 1:]
+    pairs = [(_team_index(model, f['team1']), _team_index(model, f['team2'])) for f in ahead]
+    counts = _run(_tables(model, xis), 'fixtures', pairs, n, seed, use_pool)
+    teams = {t: {'team': t, 'points': 0, 'expected_wins': 0.0} for t in model['teams']}
+    for f in played:
+        if f['winner'] in (f['team1'], f['team2']):
+            teams[f['winner']]['points'] += points_win
+        else:
+            for side in (f['team1'], f['team2']):
+                teams[side]['points'] += points_no_result
+    out = []
+    for f, (a, b), count in zip(ahead, pairs, counts):
+        wins = int(count[0])
+        lo, hi = wilson_interval(wins, n)
+        teams[model['teams'][a]]['expected_wins'] += wins / n
+        teams[model['teams'][b]]['expected_wins'] += 1 - wins / n
+        out.append(dict(f, team1_win_prob=round(wins / n, 4), ci95=[round(lo, 4), round(hi, 4)]))
+    table = []
+    for t in teams.values():
+        if t['points'] or any(t['team'] in (f['team1'], f['team2']) for f in ahead):
+            table.append({'team': t['team'], 'points': t['points'], 'expected_wins': round(t['expected_wins'], 3),
+                          'expected_points': round(t['points'] + points_win * t['expected_wins'], 3)})
+    table.sort(key=lambda t: (-t['expected_points'], t['team']))
+    return {'fixtures': out, 'table': table, 'xis': {t: xis[t] for t in model['teams']}}
@@ -13,7 +13,7 @@ async function loadTeamPage() {
     const imgName = p.name.toLowerCase().replace(/[^a-z0-9]+/g,'_');
     
     card.innerHTML = `
-      <img src="/static/images/${imgName}.jpg" alt="${p.name}" onerror="this.src='/static/images/placeholder.svg'">
+      <img src="${assetUrl(`images/${imgName}.jpg`)}" alt="${p.name}" onerror="this.src='${assetUrl('images/placeholder.svg')}'">
       <div class="info">
         <h3>${p.name}</h3>
         <div class="role">${p.playingRole || 'Player'} | ${p.battingStyle || ''}</div>
@@ -113,7 +113,7 @@ document.addEventListener('DOMContentLoaded', ()=>{
             <div style="color:#00bfae;">${p.playingRole||''}</div>
             <div style="margin-top:0.3em;font-size:0.95em;">Runs: <b>${p.runs}</b> | SR: <b>${p.strike_rate}</b> | Avg: <b>${p.bat_avg}</b></div>
           `;
-          const img = `/static/images/${name.toLowerCase().replace(/[^a-z0-9]+/g,'_')}.jpg`;
+          const img = assetUrl(`images/${name.toLowerCase().replace(/[^a-z0-9]+/g,'_')}.jpg`);
           document.getElementById('player-photo').src = img;
           hover.classList.remove('hidden');
           // position near mouse, but keep within viewport
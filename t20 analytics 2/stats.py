@@ -0,0 +1,104 @@
+import numpy as np
+
+# Vectorized percentile / rank tables for the player stat columns. Every stat
+# is ranked overall and within groups (role, team) in a single sort per
+# grouping; results are kept as compact float32/int16 matrices with one row
+# per player and one column per stat.
+
+def group_ranks(values, groups, higher_is_better=True):
+    # values: float array (NaN = no value); groups: int codes per row.
+    # Returns (percentile, rank, count) per row: percentile is 0..100 within the
+    # row's group with ties averaged, rank is competition style (1 = best) and
+    # count is how many rows in the group have a value. NaN rows get NaN / 0.
+    n = len(values)
+    pct = np.full(n, np.nan, dtype=np.float32)
+    rank = np.zeros(n, dtype=np.int16)
+    count = np.zeros(n, dtype=np.int16)
+    valid = np.flatnonzero(~np.isnan(values))
+    if len(valid) == 0:
+        return pct, rank, count
+    x = values[valid] if higher_is_better else -values[valid]
+    g = groups[valid]
+    order = np.lexsort((x, g))
+    xs, gs = x[order], g[order]
+    m = len(order)
+    pos = np.arange(m)
+    # start of each group and of each run of equal values within a group
+    new_group = np.r_[True, gs[1:] != gs[:-1]]
+    new_run = new_group | np.r_[True, xs[1:] != xs[:-1]]
+    group_start = np.maximum.accumulate(np.where(new_group, pos, 0))
+    run_start = np.maximum.accumulate(np.where(new_run, pos, 0))
+    run_end = np.r_[np.flatnonzero(new_run)[1:], m]
+    run_len = (run_end - np.flatnonzero(new_run))[np.cumsum(new_run) - 1]
+    group_end = np.r_[np.flatnonzero(new_group)[1:], m]
+    group_size = (group_end - np.flatnonzero(new_group))[np.cumsum(new_group) - 1]
+    below = run_start - group_start
+    above = group_size - below - run_len
+    denom = np.maximum(group_size - 1, 1)
+    sorted_pct = np.where(group_size > 1, 100.0 * (below + 0.5 * (run_len - 1)) / denom, 100.0)
+    target = valid[order]
+    pct[target] = sorted_pct
+    rank[target] = above + 1
+    count[target] = group_size
+    return pct, rank, count
+
+def build_percentiles(columns, groupings, stats, lower_is_better=(), qualifiers=None):
+    # groupings: {"overall": codes, "role": codes, "team": codes}
+    # qualifiers: {"strike_rate": "innings"} only ranks players whose
+    # qualifying column is > 0 (so non-batters don't drag batting percentiles).
+    table = {
+        'stats': list(stats),
+        'stat_index': {s: i for i, s in enumerate(stats)},
+        'groupings': groupings,
+        'lower_is_better': set(lower_is_better),
+        'qualifiers': dict(qualifiers or {})
+    }
+    n = columns['size']
+    for name in groupings:
+        table[name] = {
+            'pct': np.full((n, len(stats)), np.nan, dtype=np.float32),
+            'rank': np.zeros((n, len(stats)), dtype=np.int16),
+            'count': np.zeros((n, len(stats)), dtype=np.int16)
+        }
+    update_percentiles(table, columns, stats)
+    return table
+
+def update_percentiles(table, columns, stats):
+    # Recompute only the given stat columns (e.g. after an incremental ingest)
+    for stat in stats:
+        j = table['stat_index'].get(stat)
+        col = columns['numeric'].get(stat)
+        if j is None or col is None:
+            continue
+        qual = columns['numeric'].get(table['qualifiers'].get(stat))
+        if qual is not None:
+            with np.errstate(invalid='ignore'):
+                col = np.where(qual > 0, col, np.nan)
+        higher = stat not in table['lower_is_better']
+        for name, codes in table['groupings'].items():
+            pct, rank, count = group_ranks(col, codes, higher)
+            table[name]['pct'][:, j] = pct
+            table[name]['rank'][:, j] = rank
+            table[name]['count'][:, j] = count
+
+def player_percentiles(table, row):
+    out = {}
+    for stat, j in table['stat_index'].items():
+        entry = {}
+        for name in table['groupings']:
+            count = int(table[name]['count'][row, j])
+            if count == 0:
+                continue
+            entry[name] = {
+                'pct': round(float(table[name]['pct'][row, j]), 1),
+                'rank': int(table[name]['rank'][row, j]),
+                'of': count
+            }
+        if entry:
+            out[stat] = entry
+    return out
+
+def group_codes(labels):
+    # ["India", "Namibia", "India"] -> array([0, 1, 0])
+    lookup = {}
+    return np.array([lookup.setdefault(label, len(lookup)) for label in labels], dtype=np.int32)
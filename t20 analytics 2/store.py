@@ -0,0 +1,367 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import numpy as np
+
+import records
+
+# Optional SQLite backend (DATA_BACKEND=sqlite). app.py writes a snapshot of
+# the player records, the scorecard rows, the match results and the
+# biographies into one database file, with an index on every lookup and
+# ranking column and an FTS5 table over names and biographies. The team,
+# player, category, search, leaderboard, percentile and interval queries
+# then run as SQL over pooled read-only connections, so they don't need the
+# records in memory. An ingested match is applied to the file in place
+# (update_db): its scorecard rows are added and the rows of the players it
+# touched rewritten.
+#
+# players has one column per rule/leaderboard field, as in rules.build_columns
+# (numbers as REAL with NULL for missing, text lowercased), plus the record
+# itself as JSON. The player stats themselves are still aggregated by app.py.
+
+STORE_VERSION = 2
+POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+STATEMENT_CACHE = 256
+FIELD_RE = re.compile(r'^[A-Za-z0-9_]+$')
+
+# Constant statements; sqlite3 keeps them compiled per connection
+STATEMENTS = {
+    'version': "SELECT value FROM meta WHERE key = 'version'",
+    'teams': 'SELECT name FROM teams ORDER BY name',
+    'team': 'SELECT record FROM players WHERE team = ? ORDER BY team_order',
+    'player': 'SELECT record FROM players WHERE name = ? ORDER BY row_index DESC LIMIT 1',
+    'intervals': ('SELECT stat, value, n, boot_lo, boot_hi, analytic_lo, analytic_hi FROM intervals '
+                  'WHERE row_index = (SELECT row_index FROM players WHERE name = ? ORDER BY row_index DESC LIMIT 1) '
+                  'ORDER BY position'),
+    'bio': 'SELECT record FROM bios WHERE name = ?',
+    'batting_rows': 'SELECT record FROM batting WHERE name = ? ORDER BY block, row_order',
+    'bowling_rows': 'SELECT record FROM bowling WHERE name = ? ORDER BY block, row_order',
+    'player_infos': 'SELECT info FROM players WHERE info IS NOT NULL ORDER BY row_index',
+    'search_names': ("SELECT p.info FROM search_fts JOIN players p ON p.row_index = search_fts.rowid "
+                     "WHERE search_fts MATCH ? AND p.info IS NOT NULL "
+                     "ORDER BY bm25(search_fts, 10.0, 2.0, 1.0), p.row_index LIMIT ?")
+}
+
+def quote(field):
+    if not FIELD_RE.match(field):
+        raise ValueError(f'bad field name: {field}')
+    return f'"{field}"'
+
+def _sql_value(v):
+    return None if isinstance(v, float) and v != v else v
+
+def _layout(columns):
+    # -> (numeric fields, text fields) of the players table
+    return (sorted(columns['numeric']), sorted(f for f in columns['text'] if f not in ('name', 'team')))
+
+def _player_row(snapshot, i, numeric, text):
+    cols = snapshot['columns']
+    p = snapshot['rows'][i]
+    info = snapshot['info'].get(p['name'])
+    return ([i, cols['text']['name'][i], cols['text']['team'][i], snapshot['role_groups'][i],
+             snapshot['team_order'].get(p['name'], 0), json.dumps(p, default=records.json_default),
+             json.dumps(info, default=records.json_default) if info is not None else None]
+            + [_sql_value(float(cols['numeric'][f][i])) for f in numeric]
+            + [cols['text'][f][i] for f in text])
+
+def _interval_rows(snapshot, ids):
+    return [(i, position, stat, _sql_value(float(t['value'][i])), int(t['n'][i]),
+             _sql_value(float(t['boot_lo'][i])), _sql_value(float(t['boot_hi'][i])),
+             _sql_value(float(t['analytic_lo'][i])), _sql_value(float(t['analytic_hi'][i])))
+            for i in ids for position, (stat, t) in enumerate(snapshot['intervals'].items())]
+
+def _scorecard_rows(snapshot, table, blocks):
+    key, name_field, team_field = {'batting': ('battingSummary', 'batsmanName', 'teamInnings'),
+                                   'bowling': ('bowlingSummary', 'bowlerName', 'bowlingTeam')}[table]
+    return [(b, j, (r.get(name_field) or '').lower(), r.get(team_field, ''), json.dumps(r, default=records.json_default))
+            for b in blocks for j, r in enumerate(snapshot[table][b].get(key, []))]
+
+def _match_rows(snapshot, positions):
+    return [(m['id'], pos, m['team1'].lower(), m['team2'].lower(), m['winner'], m['ground'].lower(), m['date'],
+             json.dumps(m['summary'])) for pos in positions for m in [snapshot['matches'][pos]]]
+
+def build_db(path, snapshot):
+    # snapshot: rows (player records in row order), columns (numeric/text as
+    # from rules.build_columns), role_groups (selection.role_bucket per row),
+    # team_order {name: position in team listing}, info {name: player-info
+    # row}, bios (full player records), batting and bowling (scorecard
+    # blocks), matches (match index entries), intervals (intervals.py
+    # table), version. Written to a temporary file and moved into place, so
+    # readers never see a half-built database.
+    tmp = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    numeric, text = _layout(snapshot['columns'])
+    conn = sqlite3.connect(tmp)
+    with conn:
+        conn.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('CREATE TABLE teams (name TEXT PRIMARY KEY)')
+        fields = ', '.join([f'{quote(f)} REAL' for f in numeric] + [f'{quote(f)} TEXT' for f in text])
+        conn.execute('CREATE TABLE players (row_index INTEGER PRIMARY KEY, name TEXT, team TEXT, role_group TEXT, '
+                     f'team_order INTEGER, record TEXT, info TEXT, {fields})')
+        conn.execute('CREATE TABLE intervals (row_index INTEGER, position INTEGER, stat TEXT, value REAL, n INTEGER, '
+                     'boot_lo REAL, boot_hi REAL, analytic_lo REAL, analytic_hi REAL, PRIMARY KEY (row_index, stat))')
+        conn.execute('CREATE TABLE bios (name TEXT PRIMARY KEY, record TEXT)')
+        for table in ('batting', 'bowling'):
+            conn.execute(f'CREATE TABLE {table} (block INTEGER, row_order INTEGER, name TEXT, team TEXT, record TEXT)')
+        conn.execute('CREATE TABLE matches (id TEXT PRIMARY KEY, position INTEGER, team1 TEXT, team2 TEXT, '
+                     'winner TEXT, ground TEXT, date TEXT, record TEXT)')
+        conn.execute('CREATE VIRTUAL TABLE search_fts USING fts5(name, team, biography, '
+                     "tokenize = 'unicode61 remove_diacritics 2')")
+
+        conn.execute("INSERT INTO meta VALUES ('version', ?)", (snapshot['version'],))
+        conn.execute("INSERT INTO meta VALUES ('layout', ?)", (json.dumps(_layout(snapshot['columns'])),))
+        conn.executemany('INSERT INTO teams VALUES (?)', [(t,) for t in sorted(set(p.get('team', '') or '' for p in snapshot['rows']))])
+        placeholders = ', '.join('?' * (7 + len(numeric) + len(text)))
+        conn.executemany(f'INSERT INTO players VALUES ({placeholders})',
+                         [_player_row(snapshot, i, numeric, text) for i in range(len(snapshot['rows']))])
+        conn.executemany('INSERT INTO intervals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                         _interval_rows(snapshot, range(len(snapshot['rows']))))
+        bios = {}
+        for b in snapshot['bios']:
+            # first record wins, as on the player page
+            bios.setdefault((b.get('full_name') or '').lower(), b)
+        conn.executemany('INSERT INTO bios VALUES (?, ?)', [(k, json.dumps(v)) for k, v in bios.items()])
+        # the player-info description is the biography for most players
+        conn.executemany('INSERT INTO search_fts (rowid, name, team, biography) VALUES (?, ?, ?, ?)',
+                         [(i, p['name'], p.get('team', '') or '',
+                           ' '.join(filter(None, [(bios.get(p['name'].lower()) or {}).get('biography'),
+                                                  (snapshot['info'].get(p['name']) or {}).get('description')])))
+                          for i, p in enumerate(snapshot['rows'])])
+        for table in ('batting', 'bowling'):
+            conn.executemany(f'INSERT INTO {table} VALUES (?, ?, ?, ?, ?)',
+                             _scorecard_rows(snapshot, table, range(len(snapshot[table]))))
+        conn.executemany('INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         _match_rows(snapshot, range(len(snapshot['matches']))))
+
+        conn.execute('CREATE INDEX idx_players_name ON players (name)')
+        conn.execute('CREATE INDEX idx_players_team ON players (team, team_order)')
+        for j, f in enumerate(numeric):
+            conn.execute(f'CREATE INDEX idx_players_stat{j} ON players ({quote(f)}, row_index)')
+        for table in ('batting', 'bowling'):
+            conn.execute(f'CREATE INDEX idx_{table}_name ON {table} (name, block, row_order)')
+            conn.execute(f'CREATE INDEX idx_{table}_team ON {table} (team)')
+        for field in ('team1', 'team2', 'ground', 'date'):
+            conn.execute(f'CREATE INDEX idx_matches_{field} ON matches ({field})')
+    conn.execute('ANALYZE')
+    conn.close()
+    os.replace(tmp, path)
+
+def update_db(path, old_version, snapshot, ids, blocks):
+    # Applies an ingest to a database at old_version: rewrites the player rows
+    # `ids` (and the team order of their teams) and adds the scorecard blocks
+    # `blocks` and their matches. Returns False when the database is at
+    # neither version or the player columns changed; the caller rebuilds.
+    # Several workers apply the same ingest; the first one to get the write
+    # lock does it and the others find the new version.
+    numeric, text = _layout(snapshot['columns'])
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        meta = dict(conn.execute('SELECT key, value FROM meta'))
+        if meta.get('version') == snapshot['version']:
+            conn.execute('ROLLBACK')
+            return True
+        if meta.get('version') != old_version or json.loads(meta.get('layout', 'null')) != [numeric, text]:
+            conn.execute('ROLLBACK')
+            return False
+        assignments = ', '.join(f'{quote(f)} = ?' for f in numeric + text)
+        conn.executemany(f'UPDATE players SET name = ?, team = ?, role_group = ?, team_order = ?, record = ?, info = ?, '
+                         f'{assignments} WHERE row_index = ?',
+                         [row[1:] + row[:1] for row in (_player_row(snapshot, i, numeric, text) for i in ids)])
+        teams = {(snapshot['rows'][i].get('team') or '').lower() for i in ids}
+        conn.executemany('UPDATE players SET team_order = ? WHERE row_index = ?',
+                         [(snapshot['team_order'].get(p['name'], 0), i)
+                          for i, p in enumerate(snapshot['rows']) if (p.get('team') or '').lower() in teams])
+        conn.executemany('INSERT OR REPLACE INTO intervals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _interval_rows(snapshot, ids))
+        for table in ('batting', 'bowling'):
+            conn.executemany(f'INSERT INTO {table} VALUES (?, ?, ?, ?, ?)', _scorecard_rows(snapshot, table, blocks))
+        conn.executemany('INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?)', _match_rows(snapshot, blocks))
+        conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (snapshot['version'],))
+        conn.execute('COMMIT')
+        return True
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+def db_version(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            row = conn.execute(STATEMENTS['version']).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0] if row else None
+
+# Connection pool: one per worker process. Connections are read-only and
+# handed out one request at a time; a pool inherited across fork() is
+# discarded rather than shared, and bumping the generation after a rebuild
+# retires connections to the old file.
+
+def new_pool(path, size=POOL_SIZE):
+    return {'path': path, 'size': size, 'pid': os.getpid(), 'generation': 0, 'idle': queue.LifoQueue(maxsize=size)}
+
+def reset_pool(pool):
+    pool['generation'] += 1
+    while True:
+        try:
+            pool['idle'].get_nowait()[1].close()
+        except queue.Empty:
+            break
+
+def _connect(path):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE)
+    conn.execute('PRAGMA query_only = ON')
+    conn.execute('PRAGMA mmap_size = 268435456')
+    return conn
+
+@contextmanager
+def connection(pool):
+    if pool['pid'] != os.getpid():
+        pool.update({'pid': os.getpid(), 'idle': queue.LifoQueue(maxsize=pool['size'])})
+    try:
+        generation, conn = pool['idle'].get_nowait()
+        if generation != pool['generation']:
+            conn.close()
+            raise queue.Empty
+    except queue.Empty:
+        generation, conn = pool['generation'], _connect(pool['path'])
+    try:
+        yield conn
+    finally:
+        try:
+            pool['idle'].put_nowait((generation, conn))
+        except queue.Full:
+            conn.close()
+
+def _records(pool, sql, params=()):
+    with connection(pool) as conn:
+        return [json.loads(r[0]) for r in conn.execute(sql, params)]
+
+def teams(pool):
+    with connection(pool) as conn:
+        return [r[0] for r in conn.execute(STATEMENTS['teams'])]
+
+def team(pool, name):
+    return _records(pool, STATEMENTS['team'], ((name or '').lower(),))
+
+def player(pool, name):
+    found = _records(pool, STATEMENTS['player'], ((name or '').strip().lower(),))
+    return found[0] if found else None
+
+def bio(pool, name):
+    found = _records(pool, STATEMENTS['bio'], ((name or '').lower(),))
+    return found[0] if found else None
+
+def scorecard_rows(pool, name):
+    key = (name or '').lower()
+    return _records(pool, STATEMENTS['batting_rows'], (key,)), _records(pool, STATEMENTS['bowling_rows'], (key,))
+
+def select(pool, where, params, order, order_params, limit=None):
+    # where/order come from rules.compile_sql / rules.sql_order
+    sql = f'SELECT record FROM players WHERE {where} ORDER BY {order}'
+    params = list(params) + list(order_params)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(int(limit))
+    return _records(pool, sql, params)
+
+def leaderboard(pool, stat, order, limit, minimums=None, team=None):
+    # Rows (record, stat value), best first, ties in row order; the
+    # per-stat indexes serve the ORDER BY ... LIMIT directly.
+    col = quote(stat)
+    where = [f'{col} IS NOT NULL']
+    params = []
+    for field, minimum in (minimums or {}).items():
+        where.append(f'{quote(field)} >= ?')
+        params.append(float(minimum))
+    if team:
+        where.append('team = ?')
+        params.append(team.lower())
+    direction = 'DESC' if order == 'desc' else 'ASC'
+    sql = (f'SELECT record, {col} FROM players WHERE {" AND ".join(where)} '
+           f'ORDER BY {col} {direction}, row_index LIMIT ?')
+    with connection(pool) as conn:
+        return [(json.loads(r[0]), r[1]) for r in conn.execute(sql, params + [int(limit)])]
+
+def percentiles(pool, name, stats, lower_is_better=(), qualifiers=None):
+    # The player's percentile, rank and group size per stat, overall, by role
+    # and by team, as stats.player_percentiles has them. Each grouping is one
+    # query counting, per stat, the players with a value (and a qualifying
+    # column > 0), those below the player and those level with them.
+    qualifiers = qualifiers or {}
+    with connection(pool) as conn:
+        present = {d[0] for d in conn.execute('SELECT * FROM players LIMIT 0').description}
+        stats = [s for s in stats if s in present and qualifiers.get(s, s) in present]
+        fields = ', '.join(['team', 'role_group'] + [quote(s) for s in stats] + [quote(qualifiers.get(s, s)) for s in stats])
+        row = conn.execute(f'SELECT {fields} FROM players WHERE name = ? ORDER BY row_index DESC LIMIT 1',
+                           ((name or '').strip().lower(),)).fetchone()
+        if row is None:
+            return {}
+        values = dict(zip(stats, row[2:2 + len(stats)]))
+        quals = dict(zip(stats, row[2 + len(stats):]))
+        # stats the player has no (qualifying) value for are not ranked
+        ranked = [s for s in stats if values[s] is not None and (s not in qualifiers or (quals[s] or 0) > 0)]
+        if not ranked:
+            return {}
+        parts, params = [], []
+        for s in ranked:
+            valid = f'{quote(s)} IS NOT NULL' + (f' AND {quote(qualifiers[s])} > 0' if s in qualifiers else '')
+            beaten = '>' if s in lower_is_better else '<'
+            parts += [f'SUM({valid})', f'SUM({valid} AND {quote(s)} {beaten} ?)', f'SUM({valid} AND {quote(s)} = ?)']
+            params += [values[s], values[s]]
+        counts = {}
+        for grouping, where, key in (('overall', '1', ()), ('role', 'role_group = ?', (row[1],)), ('team', 'team = ?', (row[0],))):
+            found = conn.execute(f'SELECT {", ".join(parts)} FROM players WHERE {where}', params + list(key)).fetchone()
+            counts[grouping] = [found[k:k + 3] for k in range(0, len(found), 3)]
+    out = {}
+    for j, s in enumerate(ranked):
+        entry = {}
+        for grouping in ('overall', 'role', 'team'):
+            size, below, level = counts[grouping][j]
+            pct = 100.0 * (below + 0.5 * (level - 1)) / max(size - 1, 1) if size > 1 else 100.0
+            entry[grouping] = {'pct': round(float(np.float32(pct)), 1), 'rank': size - below - level + 1, 'of': size}
+        out[s] = entry
+    return out
+
+def intervals(pool, name):
+    # The player's rows of the intervals table, as intervals.player_intervals
+    # has them; None for an unknown player
+    found = {}
+    with connection(pool) as conn:
+        for stat, value, n, boot_lo, boot_hi, analytic_lo, analytic_hi in conn.execute(
+                STATEMENTS['intervals'], ((name or '').strip().lower(),)):
+            found[stat] = {'value': _round(value), 'innings': n, 'bootstrap': [_round(boot_lo), _round(boot_hi)],
+                           'analytic': [_round(analytic_lo), _round(analytic_hi)]}
+    return found or None
+
+def _round(v):
+    # as intervals._num: NULL (NaN) and infinite bounds are None
+    return round(v, 2) if v is not None and np.isfinite(v) else None
+
+def fts_query(text):
+    # "virat koh" -> '"virat"* "koh"*' (every token, as a prefix)
+    tokens = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+def search_players(pool, text, limit=5, names_only=True):
+    # Player-info rows matching every query token as a prefix, in the name
+    # only or anywhere (name, team, biography), best match first
+    match = fts_query(text)
+    if not match:
+        return []
+    return _records(pool, STATEMENTS['search_names'], (f'name : ({match})' if names_only else match, limit))
+
+def player_infos(pool):
+    return _records(pool, STATEMENTS['player_infos'])
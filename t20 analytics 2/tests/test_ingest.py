@@ -0,0 +1,141 @@
+import importlib.util
+import json
+import os
+import shutil
+import sys
+
+import pytest
+
+import ingest_log
+import records
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(ROOT, 'data')
+TOKEN = 'test-token'
+PLAYER_PAGES = ['', '/form', '/dismissals', '/venues', '/intervals', '/similar']
+
+def load_app(name, data_dir, log_path, **settings):
+    # a separate copy of app.py, as a worker started with these settings.
+    # The record types are shared with the copies loaded before, which froze
+    # them at the end of their startup.
+    env = {'DATA_DIR': data_dir, 'INGEST_LOG_PATH': log_path, 'INGEST_TOKEN': TOKEN, 'DATA_BACKEND': 'memory',
+           'CACHE_URL': 'off', 'RATE_LIMIT_URL': 'off', 'METRICS_URL': 'off', 'SIM_WORKERS': '1'}
+    env.update(settings)
+    types = (records.PlayerRecord, records.BattingRow, records.BowlingRow)
+    with pytest.MonkeyPatch.context() as mp, records.writable(*types):
+        for k, v in env.items():
+            mp.setenv(k, v)
+        spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return module
+
+def hold_back_last_match(data_dir):
+    # copies data/ without its last match -> that match as an ingest log entry
+    for fname in os.listdir(DATA):
+        if fname.endswith(('.json', '.csv')):
+            shutil.copy(os.path.join(DATA, fname), data_dir)
+    sources = {'t20_wc_match_results.json': None, 't20_wc_batting_summary.json': None, 't20_wc_bowling_summary.json': None}
+    for fname in sources:
+        with open(os.path.join(data_dir, fname), 'r', encoding='utf-8') as f:
+            sources[fname] = json.load(f)
+    entry = {
+        'summary': sources['t20_wc_match_results.json'][0]['matchSummary'].pop(),
+        'batting': sources['t20_wc_batting_summary.json'].pop()['battingSummary'],
+        'bowling': sources['t20_wc_bowling_summary.json'].pop()['bowlingSummary']
+    }
+    for fname, obj in sources.items():
+        with open(os.path.join(data_dir, fname), 'w', encoding='utf-8') as f:
+            json.dump(obj, f, ensure_ascii=False)
+    return entry
+
+@pytest.fixture(scope='module')
+def apps(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('data'))
+    log_path = os.path.join(data_dir, 'ingested_matches.jsonl')
+    entry = hold_back_last_match(data_dir)
+    ingested = load_app('app_ingested', data_dir, log_path)
+    full = load_app('app_full', DATA, os.path.join(data_dir, 'no_log.jsonl'))
+    return {'ingested': ingested, 'full': full, 'entry': entry, 'data_dir': data_dir, 'log_path': log_path}
+
+def snapshot(module, names):
+    client = module.app.test_client()
+    urls = ['/api/teams', '/api/players', '/api/standings', '/api/venues', '/api/matches', '/api/match/1879',
+            '/api/best11', '/api/leaderboard/runs', '/api/leaderboard/economy?min_overs=5',
+            '/api/leaderboard/strike_rate?order=asc', '/api/leaderboard/fielding', '/api/cube?dims=team',
+            '/api/cube?dims=playingRole,batting_position', '/api/query?where=strike_rate>120&sort=-runs',
+            '/api/simulate?n=500&seed=1', '/api/simulate?from=40&n=200&seed=1']
+    urls += [f'/api/team/{t}/summary' for t in module.query_teams()]
+    urls += [f'/api/category/{k}' for k in module.CATEGORY_RULES]
+    urls += [f'/api/player/{n}{page}' for n in names for page in PLAYER_PAGES]
+    out = {}
+    for url in urls:
+        r = client.get(url)
+        body = r.get_json()
+        if url.startswith('/api/simulate'):
+            body.pop('elapsed_ms')
+        out[url] = (r.status_code, body)
+    return out
+
+def test_ingest_route_requires_token(apps):
+    client = apps['ingested'].app.test_client()
+    assert client.post('/api/ingest', json=apps['entry']).status_code == 401
+    r = client.post('/api/ingest', json={'summary': {}}, headers={'Authorization': 'Bearer ' + TOKEN})
+    assert r.status_code == 400
+
+def test_ingested_match_equals_full_build(apps):
+    ingested, full = apps['ingested'], apps['full']
+    assert len(ingested.match_summaries) == len(full.match_summaries) - 1
+    r = ingested.app.test_client().post('/api/ingest', json=apps['entry'], headers={'Authorization': 'Bearer ' + TOKEN})
+    assert r.status_code == 201
+    assert r.get_json()['match']['id'] == '1879'
+    # the players of the match, and a spread of the others
+    teams = {apps['entry']['summary']['team1'], apps['entry']['summary']['team2']}
+    names = sorted(n for n, p in full.players.items() if p['team'] in teams) + sorted(full.players)[::8]
+    assert set(ingested.players) == set(full.players)
+    for name in full.players:
+        assert dict(ingested.players[name]) == dict(full.players[name]), name
+    expected = snapshot(full, names)
+    got = snapshot(ingested, names)
+    assert [u for u in expected if got[u] != expected[u]] == []
+
+def test_ingest_log_is_replayed(apps):
+    # a worker started later (or one that missed the POST) ends up the same
+    ingested = apps['ingested']
+    assert ingest_log.size(apps['log_path']) > 0
+    replayed = load_app('app_replayed', apps['data_dir'], apps['log_path'])
+    assert len(replayed.match_summaries) == len(ingested.match_summaries)
+    assert replayed.cache_version == ingested.cache_version
+    r = replayed.app.test_client().post('/api/ingest', json=apps['entry'], headers={'Authorization': 'Bearer ' + TOKEN})
+    assert r.status_code == 409
+    names = sorted(ingested.players)[::8]
+    assert snapshot(replayed, names) == snapshot(ingested, names)
+
+def test_ingest_updates_sqlite_store(apps, tmp_path):
+    # the same match applied to the SQLite backend in place
+    data_dir = str(tmp_path / 'data')
+    os.mkdir(data_dir)
+    entry = hold_back_last_match(data_dir)
+    db_path = str(tmp_path / 't20.db')
+    ingested = load_app('app_sqlite', data_dir, str(tmp_path / 'log.jsonl'), DATA_BACKEND='sqlite', SQLITE_PATH=db_path)
+    assert ingested.db_pool is not None
+    inode = os.stat(db_path).st_ino
+    r = ingested.app.test_client().post('/api/ingest', json=entry, headers={'Authorization': 'Bearer ' + TOKEN})
+    assert r.status_code == 201
+    assert os.stat(db_path).st_ino == inode
+    full = apps['full']
+    names = sorted(full.players)[::4]
+    assert snapshot(ingested, names) == snapshot(full, names)
+
+def test_read_from_leaves_partial_line(tmp_path):
+    path = str(tmp_path / 'log.jsonl')
+    entry = {'summary': {'team1': 'A', 'team2': 'B'}, 'batting': [{}], 'bowling': [{}]}
+    ingest_log.append(path, entry)
+    with open(path, 'ab') as f:
+        f.write(b'{"summary"')
+    entries, offset = ingest_log.read_from(path, 0)
+    assert entries == [entry]
+    assert ingest_log.read_from(path, offset) == ([], offset)
+    with pytest.raises(ValueError):
+        ingest_log.validate({'summary': {'team1': 'A', 'team2': 'B'}, 'batting': [], 'bowling': [{}]})
@@ -0,0 +1,97 @@
+import random
+import sqlite3
+
+import numpy as np
+import pytest
+
+import rules
+
+STYLES = ['Right arm Fast', 'Left arm Fast medium', 'Right arm Offbreak', 'Slow Left arm Orthodox',
+          'Right arm Medium pace', '', None]
+
+def make_rows(rng, n):
+    rows = []
+    for i in range(n):
+        rows.append({
+            'name': f'Player {i}',
+            'team': rng.choice(['India', 'England', 'Pakistan']),
+            'bowlingStyle': rng.choice(STYLES),
+            'innings': rng.randint(0, 8),
+            'innings_bowled': rng.randint(0, 8),
+            'runs': rng.randint(0, 400),
+            'wickets': rng.randint(0, 15),
+            # rate stats are missing for some players, as for players who
+            # never batted or bowled
+            'bat_avg': rng.choice([None, round(rng.uniform(0, 60), 2)]),
+            'strike_rate': rng.choice([None, round(rng.uniform(60, 200), 2)]),
+            'boundary_pct': rng.choice([None, round(rng.uniform(0, 80), 2)]),
+            'avg_ball_faced': rng.choice([None, round(rng.uniform(0, 40), 2)]),
+            'batting_position': rng.randint(1, 11),
+            'economy': rng.choice([None, round(rng.uniform(4, 12), 2)]),
+            'bowling_sr': rng.choice([None, round(rng.uniform(8, 40), 2)]),
+            'bowling_avg': rng.choice([None, round(rng.uniform(8, 50), 2)]),
+            'dot_pct': rng.choice([None, round(rng.uniform(20, 60), 2)])
+        })
+    return rows
+
+def sql_table(cols):
+    # one column per field as in store.build_db: REAL with NULL for
+    # missing numbers, lowercased text
+    numeric, text = sorted(cols['numeric']), sorted(cols['text'])
+    conn = sqlite3.connect(':memory:')
+    fields = ', '.join([f'"{f}" REAL' for f in numeric] + [f'"{f}" TEXT' for f in text])
+    conn.execute(f'CREATE TABLE players (row_index INTEGER PRIMARY KEY, {fields})')
+    conn.executemany(f"INSERT INTO players VALUES ({', '.join('?' * (1 + len(numeric) + len(text)))})",
+                     [[i] + [None if np.isnan(cols['numeric'][f][i]) else float(cols['numeric'][f][i]) for f in numeric]
+                      + [cols['text'][f][i] for f in text] for i in range(cols['size'])])
+    return conn
+
+def both(rows, conditions, sort):
+    cols = rules.build_columns(rows)
+    mask = rules.compile_rules(conditions)(cols)
+    expected = [int(i) for i in rules.sort_order(cols, mask, sort)]
+    where, params = rules.compile_sql_rules(conditions, cols['numeric'], cols['text'])
+    order, order_params = rules.sql_order(sort, cols['numeric'], cols['text'])
+    conn = sql_table(cols)
+    got = [r[0] for r in conn.execute(f'SELECT row_index FROM players WHERE {where} ORDER BY {order}',
+                                      list(params) + list(order_params))]
+    return expected, got
+
+CATEGORY_RULES = rules.load_category_rules('data/category_rules.json')
+
+@pytest.mark.parametrize('category', sorted(CATEGORY_RULES))
+@pytest.mark.parametrize('seed', range(3))
+def test_category_rules_sql_matches_numpy(category, seed):
+    rows = make_rows(random.Random(seed), 5000)
+    spec = CATEGORY_RULES[category]
+    for conditions in filter(None, [spec['rules'], spec['fallback_rules']]):
+        expected, got = both(rows, conditions, spec['sort'])
+        assert got == expected
+
+@pytest.mark.parametrize('where, sort', [
+    ('strike_rate>140,innings>3', '-runs'),
+    ('bowlingStyle~fast,economy<8', 'economy,-wickets'),
+    ('bowlingStyle=right arm offbreak', None),
+    ('bowlingStyle!=right arm offbreak,wickets>=5', '-bat_avg,name'),
+    ('bat_avg>=30', {'runs': 1, 'wickets': 20}),
+    ('batting_position==1', '-team,strike_rate'),
+    ('', '-boundary_pct')
+])
+def test_adhoc_queries_sql_matches_numpy(where, sort):
+    for seed in range(5):
+        expected, got = both(make_rows(random.Random(seed), 300), rules.parse_where(where), sort)
+        assert got == expected
+
+def test_any_and_empty_groups():
+    rows = make_rows(random.Random(1), 100)
+    for cond in ([{'any': []}], [{'all': []}], [{'any': [['wickets', '>', 10], ['runs', '>', 300]]}]):
+        expected, got = both(rows, cond, None)
+        assert got == expected
+
+def test_type_errors_agree():
+    cols = rules.build_columns(make_rows(random.Random(0), 10))
+    for cond in (['runs', 'contains', 'x'], ['nope', '>', 1], ['bowlingStyle', '>', 1]):
+        with pytest.raises(ValueError):
+            rules.compile_rules([cond])(cols)
+        with pytest.raises(ValueError):
+            rules.compile_sql_rules([cond], cols['numeric'], cols['text'])
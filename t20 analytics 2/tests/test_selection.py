@@ -0,0 +1,104 @@
+import itertools
+import random
+from collections import Counter
+
+import pytest
+
+import selection
+
+ROLES = ['Batter', 'Top order Batter', 'Wicketkeeper Batter', 'Batting Allrounder', 'Bowling Allrounder',
+         'Bowler', 'Bowler', 'Bowler']
+TEAMS = ['India', 'England', 'Pakistan', 'Australia']
+
+def make_players(rng, n, teams=TEAMS):
+    players = {}
+    for i in range(n):
+        name = f'Player {i}'
+        players[name] = {
+            'name': name,
+            'team': rng.choice(teams),
+            'playingRole': rng.choice(ROLES),
+            'innings': rng.randint(0, 6) or 1,
+            'innings_bowled': rng.randint(0, 6),
+            'runs': rng.randint(0, 300),
+            'wickets': rng.randint(0, 15),
+            'max_spell_balls': rng.choice([0, 6, 12, 21, 24, 24, 30])
+        }
+    return players
+
+def brute_force(pool, weights, constraints):
+    cons = dict(selection.DEFAULT_CONSTRAINTS)
+    if constraints.get('team'):
+        cons.update(selection.TEAM_XI_CONSTRAINTS)
+    cons.update(constraints)
+    team = (cons.get('team') or '').lower()
+    cands = [c for c in pool if not team or c['team'].lower() == team]
+    best = None
+    for xi in itertools.combinations(cands, selection.XI_SIZE):
+        if not valid_xi(xi, cons):
+            continue
+        value = sum(selection.player_value(c['player'], weights) for c in xi)
+        if best is None or value > best:
+            best = value
+    return best
+
+def valid_xi(xi, cons):
+    roles = Counter(c['role'] for c in xi)
+    if any(not cons[f'min_{r}'] <= roles[r] <= cons[f'max_{r}'] for r in selection.ROLES):
+        return False
+    if sum(c['keeper'] for c in xi) < cons['min_keepers']:
+        return False
+    if sum(int(c['bowl_cap'] * 2 + 1e-9) for c in xi) < cons['min_bowling_overs'] * 2 - 1e-9:
+        return False
+    if not cons.get('team') and max(Counter(c['team'] for c in xi).values()) > cons['max_per_team']:
+        return False
+    return True
+
+@pytest.mark.parametrize('seed', range(40))
+def test_select_xi_matches_brute_force(seed):
+    rng = random.Random(seed)
+    pool = selection.build_candidate_pool(make_players(rng, rng.randint(13, 16)))
+    weights = {'runs': 1.0, 'wickets': rng.choice([5.0, 20.0, 40.0])}
+    constraints = rng.choice([
+        {},
+        {'max_per_team': 3},
+        {'min_bowling_overs': 12, 'min_keepers': 0},
+        {'min_batter': 3, 'min_bowler': 2, 'min_allrounder': 0, 'max_per_team': 5, 'min_bowling_overs': 8}
+    ])
+    expected = brute_force(pool, weights, constraints)
+    result = selection.select_xi(pool, weights, constraints)
+    if expected is None:
+        assert not result['feasible']
+        return
+    assert result['feasible']
+    assert result['objective'] == pytest.approx(expected)
+    picked = {p['name'] for p in result['players']}
+    xi = [c for c in pool if c['name'] in picked]
+    assert len(xi) == selection.XI_SIZE
+    assert valid_xi(xi, result['constraints'])
+
+@pytest.mark.parametrize('seed', range(10))
+def test_team_xi_matches_brute_force(seed):
+    rng = random.Random(100 + seed)
+    pool = selection.build_candidate_pool(make_players(rng, rng.randint(12, 15), teams=['India']))
+    constraints = {'team': 'india', 'min_bowling_overs': 10}
+    expected = brute_force(pool, selection.DEFAULT_WEIGHTS, constraints)
+    result = selection.select_xi(pool, None, constraints)
+    assert result['feasible'] == (expected is not None)
+    if expected is not None:
+        assert result['objective'] == pytest.approx(expected)
+
+def test_infeasible_constraints():
+    rng = random.Random(7)
+    pool = selection.build_candidate_pool(make_players(rng, 30))
+    result = selection.select_xi(pool, None, {'min_keepers': 11})
+    assert not result['feasible']
+    assert result['players'] == []
+
+def test_out_of_range_constraints():
+    rng = random.Random(7)
+    pool = selection.build_candidate_pool(make_players(rng, 30))
+    for cons in ({'min_keepers': 12}, {'min_keepers': -1}, {'max_per_team': 0}, {'max_batter': -1},
+                 {'min_batter': 7, 'max_batter': 6}, {'min_bowling_overs': 45}, {'min_bowling_overs': float('nan')}):
+        with pytest.raises(ValueError):
+            selection.select_xi(pool, None, cons)